@@ -1,9 +1,12 @@
 """PSA Connected Car Client."""
 from __future__ import annotations
 
+from concurrent.futures import Executor
 from pathlib import Path
 
+from httpx import AsyncBaseTransport
 from httpx import AsyncClient
+from httpx import AsyncHTTPTransport
 
 from psa_ccc.apk_parser import ConfigInfo
 from psa_ccc.apk_parser import first_launch
@@ -12,7 +15,9 @@ from psa_ccc.auth import oauth_factory
 from psa_ccc.brand_config import BRAND_CONFIG_MAP
 from psa_ccc.client import PSAClient
 from psa_ccc.memory_token_storage import MemoryTokenStorage
-from psa_ccc.storage import CacheStorage
+from psa_ccc.rate_limit import RateLimiter
+from psa_ccc.retry import RetryPolicy
+from psa_ccc.storage import AnyCacheStorage
 from psa_ccc.storage import SimpleCacheStorage
 
 __version__ = "v0.1.2"
@@ -23,13 +28,24 @@ async def create_psa_client(
     country_code: str,
     email: str,
     password: str,
-    cache_storage: CacheStorage | None = None,
+    cache_storage: AnyCacheStorage | None = None,
     token_storage: TokenStorage | None = None,
+    transport: AsyncBaseTransport | None = None,
+    executor: Executor | None = None,
+    remote_apk: bool = False,
+    retry: RetryPolicy | None = None,
+    rate_limiter: RateLimiter | None = None,
 ) -> PSAClient:
     cache_storage = cache_storage or SimpleCacheStorage(Path("."))
     token_storage = token_storage or MemoryTokenStorage()
-    config = await get_config(brand, email, password, country_code, cache_storage)
+    config = await get_config(
+        brand, email, password, country_code, cache_storage, executor, remote_apk
+    )
     brand_config = BRAND_CONFIG_MAP[brand]
+    if rate_limiter is not None:
+        transport = rate_limiter.wrap(
+            transport or AsyncHTTPTransport(), account=f"{brand}:{email}"
+        )
     oauth_client = await oauth_factory(
         config.client_id,
         config.client_secret,
@@ -38,15 +54,29 @@ async def create_psa_client(
         brand_config.access_token_url,
         brand_config.realm,
         token_storage,
+        transport=transport,
     )
-    return PSAClient(client=oauth_client)
+    return PSAClient(client=oauth_client, retry=retry)
 
 
 async def get_config(
-    brand: str, email: str, password: str, country_code: str, storage: CacheStorage
+    brand: str,
+    email: str,
+    password: str,
+    country_code: str,
+    storage: AnyCacheStorage,
+    executor: Executor | None = None,
+    remote_apk: bool = False,
 ) -> ConfigInfo:
     """Retrieve the configuration for the first-time launch."""
     async with AsyncClient() as http_client:
         return await first_launch(
-            http_client, brand, email, password, country_code, storage
+            http_client,
+            brand,
+            email,
+            password,
+            country_code,
+            storage,
+            executor,
+            remote_apk,
         )
@@ -1,8 +1,15 @@
 """Android APK parser."""
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import logging
+from concurrent.futures import Executor
+from pathlib import Path
 from typing import Any
+from typing import Callable
+from typing import Iterable
 
 import httpx
 from cryptography.hazmat.backends import default_backend
@@ -12,18 +19,30 @@ from httpx import AsyncClient
 from msgspec import Struct
 from msgspec.json import decode
 from msgspec.json import encode
+from msgspec.structs import replace
 from pyaxmlparser.core import APK
 
+from psa_ccc.apk_reader import RESOURCES_PATH
+from psa_ccc.apk_reader import ApkReader
 from psa_ccc.brand_config import BRAND_CONFIG_MAP
+from psa_ccc.brand_config import BrandConfig
 from psa_ccc.github import GitHubUrlsBuilder
 from psa_ccc.github import download_github_file
-from psa_ccc.storage import CacheStorage
+from psa_ccc.github import get_github_sha
+from psa_ccc.remote_zip import RemoteZip
+from psa_ccc.storage import AnyCacheStorage
+from psa_ccc.storage import ensure_async_storage
 
 APP_VERSION = "1.33.0"
 GITHUB_OWNER = "flobz"
 GITHUB_REPO = "psa_apk"
 PFX_PASSWORD = b"y5Y2my5B"
 
+_CULTURES_PATH = "res/raw/cultures.json"
+_PFX_PATH = "assets/MWPMYMA1.pfx"
+
+logger = logging.getLogger(__name__)
+
 
 class ConfigInfo(Struct):
     """Information extracted from the Android app."""
@@ -43,13 +62,119 @@ class ConfigInfo(Struct):
         return f"{self.brand_id}/GetAccessToken"
 
 
+class AccountConfig(Struct):
+    """Configuration of an account, on top of the one of the app."""
+
+    country_code: str
+    apk_sha: str
+    user_id: str
+
+
+class ConfigCache:
+    """
+    Cache of the configurations extracted from the Android apps.
+
+    The configuration of each country is stored once per brand and APK
+    version, with the certificates shared by all the countries; accounts
+    only store their user ID and the APK version they were set up with.
+    """
+
+    def __init__(self, storage: AnyCacheStorage) -> None:
+        """Initialize the cache on the given storage."""
+        self.storage = ensure_async_storage(storage)
+
+    async def load(
+        self, brand: str, country_code: str, apk_sha: str
+    ) -> ConfigInfo | None:
+        """
+        Returns the configuration of a country, if in the cache.
+
+        Args:
+            brand: car brand
+            country_code: country code
+            apk_sha: git SHA of the APK the configuration was extracted from
+
+        Returns:
+            Configuration data for the PSA client, None if not in the cache.
+        """
+        path = f"{self._directory(brand, apk_sha)}/{country_code}.json"
+        if not await self.storage.exists(path):
+            return None
+        config = decode(await self.storage.read(path), type=ConfigInfo)
+        directory = self._directory(brand, apk_sha)
+        return replace(
+            config,
+            public_certificate=await self._read_optional(f"{directory}/public.pem"),
+            private_key=await self._read_optional(f"{directory}/private.pem"),
+        )
+
+    async def save(
+        self, brand: str, apk_sha: str, configs: dict[str, ConfigInfo]
+    ) -> None:
+        """
+        Stores the configurations of the countries extracted from an APK.
+
+        Args:
+            brand: car brand
+            apk_sha: git SHA of the APK the configurations were extracted from
+            configs: configurations by country code
+        """
+        directory = self._directory(brand, apk_sha)
+        for country_code, config in configs.items():
+            if config.public_certificate:
+                await self.storage.save(
+                    config.public_certificate, f"{directory}/public.pem"
+                )
+            if config.private_key:
+                await self.storage.save(config.private_key, f"{directory}/private.pem")
+            shared = replace(
+                config, public_certificate=None, private_key=None, user_id=""
+            )
+            await self.storage.save(encode(shared), f"{directory}/{country_code}.json")
+
+    def cert_paths(self, brand: str, apk_sha: str) -> tuple[str, str]:
+        """Returns the paths of the public and private keys of the APK."""
+        directory = self._directory(brand, apk_sha)
+        return str(self.storage.get_full_path(f"{directory}/public.pem")), str(
+            self.storage.get_full_path(f"{directory}/private.pem")
+        )
+
+    async def load_account(self, brand: str, email: str) -> AccountConfig | None:
+        """Returns the configuration of an account, if in the cache."""
+        path = self._account_path(brand, email)
+        if not await self.storage.exists(path):
+            return None
+        return decode(await self.storage.read(path), type=AccountConfig)
+
+    async def save_account(
+        self, brand: str, email: str, account: AccountConfig
+    ) -> None:
+        """Stores the configuration of an account."""
+        await self.storage.save(encode(account), self._account_path(brand, email))
+
+    async def _read_optional(self, filename: str) -> bytes | None:
+        if await self.storage.exists(filename):
+            return await self.storage.read(filename)
+        return None
+
+    @staticmethod
+    def _directory(brand: str, apk_sha: str) -> str:
+        return f"configs/{brand}/{apk_sha}"
+
+    @staticmethod
+    def _account_path(brand: str, email: str) -> str:
+        # don't leak the email address in the file names
+        digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+        return f"accounts/{brand}/{digest[:32]}.json"
+
+
 async def download_apk(
     client: AsyncClient,
     filename: str,
-    storage: CacheStorage,
-) -> APK:
+    storage: AnyCacheStorage,
+) -> Path:
     """
-    Returns the needed information from the APK.
+    Downloads the APK, if not already in the storage.
 
     Args:
         client: async http client
@@ -57,48 +182,134 @@ async def download_apk(
         storage: file storage handler
 
     Returns:
-        Configuration data for the PSA client
+        Path of the APK file.
     """
     url_builder = GitHubUrlsBuilder(GITHUB_OWNER, GITHUB_REPO, "", filename)
     await download_github_file(client, storage, url_builder)
-    apk_bytes = storage.read(filename)
-    return APK(apk_bytes, raw=True)
+    return storage.get_full_path(filename)
+
+
+def parse_apk_configs(
+    apk_path: Path,
+    brand_config: BrandConfig,
+    country_codes: list[str] | None = None,
+) -> dict[str, ConfigInfo]:
+    """
+    Parses the APK and returns the configuration of many countries.
 
+    Args:
+        apk_path: path of the APK file
+        brand_config: configuration of the brand of the app
+        country_codes: country codes, all the countries of the app if None
 
-def get_config_from_apk(apk: APK, country_code: str, site_code: str) -> ConfigInfo:
+    Returns:
+        Configuration data for the PSA client, by country code.
+    """
+    with ApkReader.open(apk_path) as apk:
+        return get_configs_from_apk(apk, brand_config, country_codes)
+
+
+async def _fetch_remote_apk(
+    client: AsyncClient, url: str, country_codes: list[str] | None
+) -> ApkReader:
+    """Downloads the entries with the configuration of the given countries."""
+    remote_zip = await RemoteZip.open(client, url)
+    cultures_data = await remote_zip.read(_CULTURES_PATH)
+    cultures = json.loads(cultures_data)
+    paths = {
+        _get_parameters_path(_get_culture(cultures, country_code))
+        for country_code in (cultures if country_codes is None else country_codes)
+    }
+    if country_codes is None:
+        paths &= set(remote_zip.namelist())
+    entries = await remote_zip.read_many([*sorted(paths), _PFX_PATH, RESOURCES_PATH])
+    entries[_CULTURES_PATH] = cultures_data
+    logger.debug("downloaded %d bytes of %s", remote_zip.downloaded, url)
+    return ApkReader(entries.__getitem__)
+
+
+def get_config_from_apk(
+    apk: APK | ApkReader, country_code: str, site_code: str
+) -> ConfigInfo:
     """
     Return the configuration information from an APK file.
 
     Args:
-        apk: APK
+        apk: APK, either the full pyaxmlparser one or the lightweight reader
         country_code: country code
         site_code: site code
 
     Returns:
         Configuration data for the PSA client.
     """
+    return _get_configs(apk, lambda _: site_code, [country_code])[country_code]
+
+
+def get_configs_from_apk(
+    apk: APK | ApkReader,
+    brand_config: BrandConfig,
+    country_codes: Iterable[str] | None = None,
+) -> dict[str, ConfigInfo]:
+    """
+    Return the configuration information of many countries from an APK file.
+
+    The APK is read only once, whatever the number of countries.
+
+    Args:
+        apk: APK, either the full pyaxmlparser one or the lightweight reader
+        brand_config: configuration of the brand of the app
+        country_codes: country codes; all the countries listed in the app
+            are returned if None, skipping the ones without parameters
+
+    Returns:
+        Configuration data for the PSA client, by country code.
+    """
+    return _get_configs(apk, brand_config.site_code, country_codes)
+
+
+def _get_configs(
+    apk: APK | ApkReader,
+    site_code: Callable[[str], str],
+    country_codes: Iterable[str] | None,
+) -> dict[str, ConfigInfo]:
     package_name = apk.get_package()
     resources = apk.get_android_resources()
-    culture = _get_cultures_code(apk.get_file("res/raw/cultures.json"), country_code)
-    parameters = json.loads(apk.get_file(_get_parameters_path(culture)))
+    cultures = json.loads(apk.get_file(_CULTURES_PATH))
 
-    pfx_cert = apk.get_file("assets/MWPMYMA1.pfx")
+    pfx_cert = apk.get_file(_PFX_PATH)
     public, private = get_keys(pfx_cert, PFX_PASSWORD)
 
-    brand_id_url = resources.get_string(package_name, "HOST_BRANDID_PROD")[1]
-    return ConfigInfo(
-        client_id=parameters["cvsClientId"],
-        client_secret=parameters["cvsSecret"],
-        site_code=site_code,
-        brand_id=brand_id_url,
-        culture=culture,
-        public_certificate=public,
-        private_key=private,
-    )
+    brand_id = resources.get_string(package_name, "HOST_BRANDID_PROD")
+    if brand_id is None:
+        raise ValueError("HOST_BRANDID_PROD not found in the APK resources")
+    brand_id_url = brand_id[1]
+    parameters: dict[str, dict[str, Any]] = {}
+    configs = {}
+    for country_code in cultures if country_codes is None else country_codes:
+        culture = _get_culture(cultures, country_code)
+        if culture not in parameters:
+            try:
+                parameters[culture] = json.loads(
+                    apk.get_file(_get_parameters_path(culture))
+                )
+            except (KeyError, FileNotFoundError):
+                if country_codes is not None:
+                    raise
+                logger.warning("no parameters for %s in the APK", culture)
+                continue
+        configs[country_code] = ConfigInfo(
+            client_id=parameters[culture]["cvsClientId"],
+            client_secret=parameters[culture]["cvsSecret"],
+            site_code=site_code(country_code),
+            brand_id=brand_id_url,
+            culture=culture,
+            public_certificate=public,
+            private_key=private,
+        )
+    return configs
 
 
-def _get_cultures_code(file: bytes, country_code: str) -> str:
-    cultures = json.loads(file)
+def _get_culture(cultures: dict[str, Any], country_code: str) -> str:
     return cultures[country_code]["languages"][0]
 
 
@@ -144,11 +355,17 @@ async def first_launch(
     email: str,
     password: str,
     country_code: str,
-    storage: CacheStorage,
+    storage: AnyCacheStorage,
+    executor: Executor | None = None,
+    remote_apk: bool = False,
 ) -> ConfigInfo:
     """
     Retrieves the configuration for the API client from the Android app.
 
+    The configuration is cached by brand, country and APK version, so the
+    APK is parsed again only when a new version is released; an account
+    already set up doesn't need any request at all.
+
     Args:
         client: async http client
         brand: car brand
@@ -156,26 +373,119 @@ async def first_launch(
         password: user password
         country_code: country code
         storage: cache storage
+        executor: thread or process pool executor for the APK parsing,
+            which blocks for a while; the default executor of the event
+            loop is used if None
+        remote_apk: download only the needed parts of the APK, instead of
+            keeping the whole file in the storage
 
     Returns:
         Configuration from the Android app.
     """
-    config_path = "config.json"
-    if storage.exists(config_path):
-        return decode(storage.read(config_path), type=ConfigInfo)
+    storage = ensure_async_storage(storage)
+    cache = ConfigCache(storage)
+    account = await cache.load_account(brand, email)
+    if account is not None and account.country_code == country_code:
+        apk_info = await cache.load(brand, country_code, account.apk_sha)
+        if apk_info is not None:
+            apk_info.user_id = account.user_id
+            return apk_info
     brand_config = BRAND_CONFIG_MAP[brand]
-    site_code = brand_config.site_code(country_code)
-    apk = await download_apk(client, brand_config.apk_name, storage)
-    apk_info = get_config_from_apk(apk, country_code, site_code)
+    apk_sha = await _get_apk_sha(client, brand_config, storage, remote_apk)
+    apk_info = await cache.load(brand, country_code, apk_sha)
+    if apk_info is None:
+        configs = await _extract_configs(
+            client, brand_config, storage, [country_code], executor, remote_apk
+        )
+        await cache.save(brand, apk_sha, configs)
+        apk_info = configs[country_code]
     token = await _get_access_token(client, apk_info, email, password)
-    cert = _save_certs(apk_info, storage)
+    cert = cache.cert_paths(brand, apk_sha)
     res_dict = await _get_user(brand_config.user_url, apk_info, token, cert)
     # this is used in mqtt paths with brand code
     apk_info.user_id = res_dict["id"]
-    storage.save(encode(apk_info), config_path)
+    await cache.save_account(
+        brand, email, AccountConfig(country_code, apk_sha, apk_info.user_id)
+    )
     return apk_info
 
 
+async def precompute_configs(
+    client: AsyncClient,
+    brand: str,
+    storage: AnyCacheStorage,
+    executor: Executor | None = None,
+    remote_apk: bool = False,
+) -> dict[str, ConfigInfo]:
+    """
+    Extracts the configuration of all the countries from the Android app.
+
+    The APK is read once and the configurations are stored in the cache,
+    so that setting up any account of the brand doesn't parse the APK.
+
+    Args:
+        client: async http client
+        brand: car brand
+        storage: cache storage
+        executor: executor for the APK parsing, see `first_launch`
+        remote_apk: download only the needed parts of the APK, instead of
+            keeping the whole file in the storage
+
+    Returns:
+        Configuration from the Android app, by country code.
+    """
+    storage = ensure_async_storage(storage)
+    brand_config = BRAND_CONFIG_MAP[brand]
+    apk_sha = await _get_apk_sha(client, brand_config, storage, remote_apk)
+    configs = await _extract_configs(
+        client, brand_config, storage, None, executor, remote_apk
+    )
+    await ConfigCache(storage).save(brand, apk_sha, configs)
+    return configs
+
+
+def _apk_url_builder(brand_config: BrandConfig) -> GitHubUrlsBuilder:
+    return GitHubUrlsBuilder(GITHUB_OWNER, GITHUB_REPO, "", brand_config.apk_name)
+
+
+async def _get_apk_sha(
+    client: AsyncClient,
+    brand_config: BrandConfig,
+    storage: AnyCacheStorage,
+    remote_apk: bool,
+) -> str:
+    url_builder = _apk_url_builder(brand_config)
+    try:
+        return await get_github_sha(client, storage, url_builder)
+    except ValueError:
+        if remote_apk:
+            raise
+    # use the version of the APK we have, or can download
+    await download_github_file(client, storage, url_builder)
+    return await ensure_async_storage(storage).get_sha(url_builder.filename)
+
+
+async def _extract_configs(
+    client: AsyncClient,
+    brand_config: BrandConfig,
+    storage: AnyCacheStorage,
+    country_codes: list[str] | None,
+    executor: Executor | None,
+    remote_apk: bool,
+) -> dict[str, ConfigInfo]:
+    loop = asyncio.get_running_loop()
+    if remote_apk:
+        url = _apk_url_builder(brand_config).raw_url
+        apk = await _fetch_remote_apk(client, url, country_codes)
+        return await loop.run_in_executor(
+            executor, get_configs_from_apk, apk, brand_config, country_codes
+        )
+    apk_path = await download_apk(client, brand_config.apk_name, storage)
+    return await loop.run_in_executor(
+        executor, parse_apk_configs, apk_path, brand_config, country_codes
+    )
+
+
 async def _get_access_token(
     client: AsyncClient, apk_info: ConfigInfo, email: str, password: str
 ) -> str:
@@ -225,13 +535,3 @@ async def _get_user(
             },
         )
         return res.json()["success"]
-
-
-def _save_certs(apk_info: ConfigInfo, storage: CacheStorage) -> tuple[str, str]:
-    if apk_info.public_certificate:
-        storage.save(apk_info.public_certificate, "public.pem")
-    if apk_info.private_key:
-        storage.save(apk_info.private_key, "private.pem")
-    return str(storage.get_full_path("public.pem")), str(
-        storage.get_full_path("private.pem")
-    )
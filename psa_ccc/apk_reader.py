@@ -0,0 +1,227 @@
+"""Lightweight APK reader."""
+from __future__ import annotations
+
+import struct
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+from typing import Iterator
+
+from pyaxmlparser.arscparser import ARSCParser
+
+RESOURCES_PATH = "resources.arsc"
+
+_RES_STRING_POOL_TYPE = 0x0001
+_RES_TABLE_TYPE = 0x0002
+_RES_TABLE_PACKAGE_TYPE = 0x0200
+_RES_TABLE_TYPE_TYPE = 0x0201
+
+_UTF8_FLAG = 1 << 8
+_NO_ENTRY = 0xFFFFFFFF
+_NO_ENTRY16 = 0xFFFF
+_FLAG_SPARSE = 0x01
+_FLAG_OFFSET16 = 0x02
+_ENTRY_FLAG_COMPLEX = 0x0001
+_ENTRY_FLAG_COMPACT = 0x0008
+_TYPE_STRING = 0x03
+
+_CHUNK = struct.Struct("<HHI")
+
+
+class _StringPool:
+    """String pool chunk of a resource table, decoding strings on demand."""
+
+    def __init__(self, data: memoryview, offset: int) -> None:
+        _, header_size, _ = _CHUNK.unpack_from(data, offset)
+        count, _, flags, strings_start, _ = struct.unpack_from("<5I", data, offset + 8)
+        self.data = data
+        self.count = count
+        self.utf8 = bool(flags & _UTF8_FLAG)
+        self.offsets = offset + header_size
+        self.strings = offset + strings_start
+
+    def __getitem__(self, index: int) -> str:
+        (start,) = struct.unpack_from("<I", self.data, self.offsets + index * 4)
+        position = self.strings + start
+        if self.utf8:
+            _, position = self._utf8_length(position)  # length in UTF-16 units
+            length, position = self._utf8_length(position)
+            return bytes(self.data[position : position + length]).decode("utf-8")
+        (length,) = struct.unpack_from("<H", self.data, position)
+        position += 2
+        if length & 0x8000:
+            (low,) = struct.unpack_from("<H", self.data, position)
+            length = ((length & 0x7FFF) << 16) | low
+            position += 2
+        return bytes(self.data[position : position + length * 2]).decode("utf-16-le")
+
+    def index(self, value: str) -> int | None:
+        """Returns the index of the given string, None if not in the pool."""
+        return next((i for i in range(self.count) if self[i] == value), None)
+
+    def _utf8_length(self, position: int) -> tuple[int, int]:
+        length = self.data[position]
+        if length & 0x80:
+            return ((length & 0x7F) << 8) | self.data[position + 1], position + 2
+        return length, position + 1
+
+
+class ResourceTable:
+    """
+    Lookup of string resources in a compiled resource table (resources.arsc).
+
+    Only the chunks needed to resolve the requested string are decoded;
+    anything more complex than a plain string value is delegated to the
+    full pyaxmlparser resource parser.
+    """
+
+    def __init__(self, data: bytes | memoryview) -> None:
+        """Initialize the resource table."""
+        self.data = memoryview(data)
+        chunk_type, header_size, _ = _CHUNK.unpack_from(self.data, 0)
+        if chunk_type != _RES_TABLE_TYPE:
+            raise ValueError("not a resource table")
+        self.strings: _StringPool | None = None
+        self.packages: dict[str, int] = {}
+        for offset, chunk_type in self._chunks(header_size, len(self.data)):
+            if chunk_type == _RES_STRING_POOL_TYPE and self.strings is None:
+                self.strings = _StringPool(self.data, offset)
+            elif chunk_type == _RES_TABLE_PACKAGE_TYPE:
+                name = bytes(self.data[offset + 12 : offset + 268])
+                self.packages[name.decode("utf-16-le").split("\x00")[0]] = offset
+
+    def get_packages_names(self) -> list[str]:
+        """Returns the names of the packages in the table."""
+        return list(self.packages)
+
+    def get_string(self, package_name: str, name: str) -> list[str] | None:
+        """
+        Returns the value of a string resource.
+
+        Args:
+            package_name: package of the resource
+            name: name of the resource
+
+        Returns:
+            The name and the value of the resource, as pyaxmlparser does.
+        """
+        value = self._find_string(package_name, name)
+        if value is not None:
+            return [name, value]
+        return ARSCParser(bytes(self.data)).get_string(package_name, name)
+
+    def _chunks(self, start: int, end: int) -> Iterator[tuple[int, int]]:
+        offset = start
+        while offset < end:
+            chunk_type, _, size = _CHUNK.unpack_from(self.data, offset)
+            yield offset, chunk_type
+            offset += size
+
+    def _find_string(self, package_name: str, name: str) -> str | None:
+        package = self.packages.get(package_name)
+        if package is None or self.strings is None:
+            return None
+        _, header_size, size = _CHUNK.unpack_from(self.data, package)
+        type_strings, _, key_strings = struct.unpack_from(
+            "<3I", self.data, package + 268
+        )
+        type_id = _StringPool(self.data, package + type_strings).index("string")
+        key = _StringPool(self.data, package + key_strings).index(name)
+        if type_id is None or key is None:
+            return None
+        fallback = None
+        for offset, chunk_type in self._chunks(package + header_size, package + size):
+            if (
+                chunk_type != _RES_TABLE_TYPE_TYPE
+                or self.data[offset + 8] != type_id + 1
+            ):
+                continue
+            value = self._find_entry(offset, key)
+            if value is None:
+                continue
+            if self._is_default_config(offset):
+                return value
+            fallback = fallback or value
+        return fallback
+
+    def _find_entry(self, chunk: int, key: int) -> str | None:
+        _, header_size, _ = _CHUNK.unpack_from(self.data, chunk)
+        flags = self.data[chunk + 9]
+        entry_count, entries_start = struct.unpack_from("<2I", self.data, chunk + 12)
+        offsets = chunk + header_size
+        for index in range(entry_count):
+            if flags & _FLAG_SPARSE:
+                (offset,) = struct.unpack_from("<H", self.data, offsets + index * 4 + 2)
+                offset *= 4
+            elif flags & _FLAG_OFFSET16:
+                (offset,) = struct.unpack_from("<H", self.data, offsets + index * 2)
+                if offset == _NO_ENTRY16:
+                    continue
+                offset *= 4
+            else:
+                (offset,) = struct.unpack_from("<I", self.data, offsets + index * 4)
+                if offset == _NO_ENTRY:
+                    continue
+            entry = chunk + entries_start + offset
+            size_or_key, entry_flags, data = struct.unpack_from(
+                "<HHI", self.data, entry
+            )
+            if entry_flags & _ENTRY_FLAG_COMPACT:
+                if size_or_key == key and entry_flags >> 8 == _TYPE_STRING:
+                    return self.strings[data] if self.strings else None
+                continue
+            if data != key or entry_flags & _ENTRY_FLAG_COMPLEX:
+                continue
+            data_type = self.data[entry + size_or_key + 3]
+            if data_type != _TYPE_STRING:
+                return None
+            (value,) = struct.unpack_from("<I", self.data, entry + size_or_key + 4)
+            return self.strings[value] if self.strings else None
+        return None
+
+    def _is_default_config(self, chunk: int) -> bool:
+        (config_size,) = struct.unpack_from("<I", self.data, chunk + 20)
+        config = self.data[chunk + 24 : chunk + 20 + config_size]
+        return not any(config)
+
+
+class ApkReader:
+    """
+    Reads the entries of an APK file on demand.
+
+    Unlike pyaxmlparser's APK, nothing is parsed upfront: only the requested
+    entries are read from the file and decompressed.
+    """
+
+    def __init__(self, read: Callable[[str], bytes]) -> None:
+        """
+        Initialize the reader.
+
+        Args:
+            read: returns the contents of an entry of the APK,
+                raising KeyError if missing
+        """
+        self.read = read
+        self._resources: ResourceTable | None = None
+
+    @classmethod
+    @contextmanager
+    def open(cls, path: Path | str) -> Iterator[ApkReader]:
+        """Opens the APK file at the given path."""
+        with zipfile.ZipFile(path) as archive:
+            yield cls(archive.read)
+
+    def get_file(self, filename: str) -> bytes:
+        """Returns the contents of the entry."""
+        return self.read(filename)
+
+    def get_android_resources(self) -> ResourceTable:
+        """Returns the resource table of the APK."""
+        if self._resources is None:
+            self._resources = ResourceTable(self.get_file(RESOURCES_PATH))
+        return self._resources
+
+    def get_package(self) -> str:
+        """Returns the name of the application package."""
+        return self.get_android_resources().get_packages_names()[0]
@@ -1,12 +1,25 @@
 """OAuth session factory."""
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
 from typing import Any
+from typing import AsyncContextManager
+from typing import Callable
 from typing import Protocol
+from typing import runtime_checkable
 
 from authlib.common.urls import add_params_to_uri
+from authlib.integrations.base_client import InvalidTokenError
+from authlib.integrations.base_client import OAuthError
 from authlib.integrations.httpx_client import AsyncOAuth2Client
 from authlib.oauth2.rfc6749 import OAuth2Token
+from httpx import AsyncBaseTransport
+from httpx import HTTPStatusError
+
+logger = logging.getLogger(__name__)
 
 
 class TokenStorage(Protocol):
@@ -21,13 +34,166 @@ class TokenStorage(Protocol):
         """Save the token."""
 
 
+@runtime_checkable
+class LockingTokenStorage(TokenStorage, Protocol):
+    """Token storage shared between processes, locked while refreshing."""
+
+    def lock(self) -> AsyncContextManager[None]:
+        """Holds the lock of the stored token, blocking other processes."""
+
+
+def _expires_at(token: OAuth2Token | None) -> float:
+    return float(token.get("expires_at") or 0) if token else 0.0
+
+
+class TokenRefresher:
+    """
+    Refreshes the token of an OAuth session.
+
+    At most one refresh is in flight at any time: concurrent requests with an
+    expiring token wait for it and then reuse the new token.
+    The token is refreshed `leeway` seconds before it expires, either on the
+    first request after that moment or, once `start` is called, by a
+    background task.
+    With a `LockingTokenStorage`, the storage stays locked from loading the
+    stored token to saving the new one, so processes sharing it refresh a
+    token once, even with rotating refresh tokens.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOAuth2Client,
+        token_storage: TokenStorage,
+        leeway: float = 60,
+        retry_interval: float = 30,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Initialize the token refresher.
+
+        Args:
+            client: OAuth session
+            token_storage: token storage handler
+            leeway: seconds before the expiration to refresh the token
+            retry_interval: seconds to wait before retrying a failed
+                background refresh
+            clock: time source, in seconds since the epoch
+        """
+        self.client = client
+        self.token_storage = token_storage
+        self.leeway = leeway
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.refresh_count = 0
+        self._refreshing: asyncio.Future[OAuth2Token] | None = None
+        self._renewal: asyncio.Task[None] | None = None
+
+    def seconds_to_refresh(self) -> float | None:
+        """Seconds until the token has to be refreshed, None if it never expires."""
+        token = self.client.token
+        expires_at = token.get("expires_at") if token else None
+        if not expires_at:
+            return None
+        return float(expires_at) - self.leeway - self.clock()
+
+    def needs_refresh(self) -> bool:
+        """Returns True if the token is expired or about to expire."""
+        delay = self.seconds_to_refresh()
+        return delay is not None and delay <= 0
+
+    async def ensure_active_token(self) -> None:
+        """Refreshes the token if it is about to expire."""
+        if self.needs_refresh():
+            await self.refresh()
+
+    async def refresh(self) -> OAuth2Token:
+        """Refreshes the token, or waits for the refresh already in flight."""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._refresh())
+            self._refreshing.add_done_callback(self._refresh_done)
+        return await asyncio.shield(self._refreshing)
+
+    def _refresh_done(self, _: asyncio.Future[OAuth2Token]) -> None:
+        self._refreshing = None
+
+    async def _refresh(self) -> OAuth2Token:
+        storage = self.token_storage
+        lock = storage.lock() if isinstance(storage, LockingTokenStorage) else None
+        async with lock or nullcontext():
+            return await self._refresh_stored()
+
+    async def _refresh_stored(self) -> OAuth2Token:
+        # another process sharing the storage may have refreshed it already
+        stored = await self.token_storage.load()
+        if _expires_at(stored) > _expires_at(self.client.token):
+            self.client.token = stored
+            if not self.needs_refresh():
+                return self.client.token
+        refresh_token = self.client.token.get("refresh_token")
+        url = self.client.metadata.get("token_endpoint")
+        if not refresh_token or not url:
+            raise InvalidTokenError()
+        token = await self.client.refresh_token(url, refresh_token=refresh_token)
+        self.refresh_count += 1
+        await self.token_storage.save(token)
+        return token
+
+    def start(self) -> None:
+        """Starts refreshing the token in the background, ahead of its expiration."""
+        if self._renewal is None or self._renewal.done():
+            self._renewal = asyncio.ensure_future(self._renew())
+
+    async def stop(self) -> None:
+        """Stops the background refresh."""
+        if self._renewal is None:
+            return
+        self._renewal.cancel()
+        try:
+            await self._renewal
+        except asyncio.CancelledError:
+            pass
+        self._renewal = None
+
+    async def _renew(self) -> None:
+        while (delay := self.seconds_to_refresh()) is not None:
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("can't refresh the token")
+                await asyncio.sleep(self.retry_interval)
+                continue
+            if self.needs_refresh():
+                # the token lives less than the leeway, don't spin
+                await asyncio.sleep(self.retry_interval)
+
+
+class PSAOAuth2Client(AsyncOAuth2Client):  # type: ignore[misc]
+    """OAuth session whose token refresh is coordinated by a TokenRefresher."""
+
+    refresher: TokenRefresher
+
+    async def ensure_active_token(self, token: OAuth2Token) -> None:
+        """Refreshes the token if it is about to expire."""
+        await self.refresher.ensure_active_token()
+
+    async def aclose(self) -> None:
+        """Stops the background token refresh and closes the session."""
+        await self.refresher.stop()
+        await super().aclose()
+
+
 async def create_client(
     client_id: str,
     client_secret: str,
     token_url: str,
     realm: str,
     token_storage: TokenStorage,
-) -> AsyncOAuth2Client:
+    leeway: float = 60,
+    transport: AsyncBaseTransport | None = None,
+) -> PSAOAuth2Client:
     """
     Create the OAuth session handler for the API client.
 
@@ -37,23 +203,13 @@ async def create_client(
         token_url: URL for token refresh
         realm: API realm
         token_storage: token storage handler
+        leeway: seconds before the expiration to refresh the token
+        transport: HTTP transport to use, instead of a new connection pool
 
     Returns:
         OAuth session
     """
 
-    async def update_token(
-        new_token: dict[str, Any],
-        refresh_token: str | None = None,
-        access_token: str | None = None,
-    ) -> None:
-        item = await token_storage.load(
-            access_token=access_token, refresh_token=refresh_token
-        )
-        item["access_token"] = new_token["access_token"]
-        item["refresh_token"] = new_token.get("refresh_token")
-        await token_storage.save(item)
-
     def _fix_request(
         url: str, headers: dict[str, Any], body: Any
     ) -> tuple[str, dict[str, Any], Any]:
@@ -65,15 +221,16 @@ async def create_client(
         return url, headers, body
 
     # authorize = "https://api.mpsa.com/api/connectedcar/v2/oauth/authorize"
-    client = AsyncOAuth2Client(
+    client = PSAOAuth2Client(
         client_id=client_id,
         client_secret=client_secret,
         scope="openid profile",
         token_endpoint=token_url,
-        update_token=update_token,
         base_url="https://api.groupe-psa.com/connectedcar/v4",
+        transport=transport,
     )
     client.register_compliance_hook("protected_request", _fix_request)
+    client.refresher = TokenRefresher(client, token_storage, leeway)
     return client
 
 
@@ -85,10 +242,15 @@ async def oauth_factory(
     token_url: str,
     realm: str,
     token_storage: TokenStorage,
-) -> AsyncOAuth2Client:  # pragma: no cover
+    transport: AsyncBaseTransport | None = None,
+) -> AsyncOAuth2Client:
     """
     Create the OAuth session handler for the API client.
 
+    The token in the storage is used if still valid, or refreshed if
+    expired; the user logs in with the password only if there is no
+    usable stored token.
+
     Args:
         client_id: client ID
         client_secret: client secret
@@ -97,20 +259,38 @@ async def oauth_factory(
         token_url: URL for token refresh
         realm: API realm
         token_storage: token storage handler
+        transport: HTTP transport to use, instead of a new connection pool
 
     Returns:
         OAuth session
     """
     client = await create_client(
-        client_id, client_secret, token_url, realm, token_storage
+        client_id, client_secret, token_url, realm, token_storage, transport=transport
     )
 
-    token = await client.fetch_token(
-        token_url,
-        username=username,
-        password=password,
-        grant_type="password",
-        realm=realm,
-    )
-    await token_storage.save(token)
+    if not await _resume_session(client, token_storage):
+        token = await client.fetch_token(
+            token_url,
+            username=username,
+            password=password,
+            grant_type="password",
+            realm=realm,
+        )
+        await token_storage.save(token)
+    client.refresher.start()
     return client
+
+
+async def _resume_session(client: PSAOAuth2Client, token_storage: TokenStorage) -> bool:
+    """Returns True if the client can use the token in the storage."""
+    token = await token_storage.load()
+    if not token or not token.get("access_token"):
+        return False
+    client.token = token
+    try:
+        await client.refresher.ensure_active_token()
+    except (OAuthError, HTTPStatusError) as err:
+        logger.info("can't refresh the stored token, logging in again: %s", err)
+        client.token = None
+        return False
+    return True
@@ -0,0 +1,183 @@
+"""Response cache for the API client."""
+from __future__ import annotations
+
+import inspect
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Hashable
+
+from psa_ccc.client import PSAClient
+
+DEFAULT_TTLS = {
+    "get_user": 3600.0,
+    "get_vehicle": 3600.0,
+    "get_vehicle_maintenance": 3600.0,
+}
+
+_MISSING = object()
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+@dataclass
+class CacheStats:
+    """Cache usage counters."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a given time."""
+
+    def __init__(
+        self, max_size: int = 1024, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: maximum number of entries; the least recently used
+                entries are evicted when it is exceeded
+            clock: monotonic time source, in seconds
+        """
+        self.max_size = max_size
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of entries, including the expired ones not yet purged."""
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value of the key, or default if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._entries[key]
+            self.stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        """Stores the value for ttl seconds."""
+        self._entries[key] = (self.clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None) -> int:
+        """
+        Removes the entries whose key satisfies the predicate.
+
+        Args:
+            predicate: entry key filter; all the entries are removed if None
+
+        Returns:
+            Number of removed entries.
+        """
+        if predicate is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+class CachedPSAClient:
+    """
+    PSAClient wrapper that caches the decoded responses.
+
+    Only the methods listed in `ttls` are cached, all the other attributes
+    are forwarded to the wrapped client untouched.
+    Since the decoded models are stored, a cache hit costs neither a request
+    nor a decode; don't mutate the returned objects.
+    """
+
+    def __init__(
+        self,
+        client: PSAClient,
+        ttls: dict[str, float] | None = None,
+        max_size: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Initialize the cached client.
+
+        Args:
+            client: API client to wrap
+            ttls: time to live in seconds of the responses of each method
+            max_size: maximum number of cached responses
+            clock: monotonic time source, in seconds
+        """
+        self.client = client
+        self.ttls = DEFAULT_TTLS.copy() if ttls is None else ttls
+        self.cache = TTLCache(max_size, clock)
+
+    @property
+    def stats(self) -> CacheStats:
+        """Cache usage counters."""
+        return self.cache.stats
+
+    def __getattr__(self, name: str) -> Any:
+        """Returns the cached version of the client method, if it has a TTL."""
+        attribute = getattr(self.client, name)
+        ttl = self.ttls.get(name)
+        if ttl is None or not inspect.iscoroutinefunction(attribute):
+            return attribute
+
+        async def cached(*args: Any, **kwargs: Any) -> Any:
+            key = (name, _freeze(args), _freeze(kwargs))
+            value = self.cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = await attribute(*args, **kwargs)
+                self.cache.set(key, value, ttl)
+            return value
+
+        return cached
+
+    def invalidate(self, method: str | None = None, *args: Any, **kwargs: Any) -> int:
+        """
+        Removes responses from the cache.
+
+        Args:
+            method: name of the method whose responses are removed;
+                all the responses are removed if None
+            args: positional arguments of the call to remove; all the
+                responses of the method are removed if no arguments are given
+            kwargs: keyword arguments of the call to remove
+
+        Returns:
+            Number of removed responses.
+        """
+        if method is None:
+            return self.cache.invalidate()
+        if args or kwargs:
+            target = (method, _freeze(args), _freeze(kwargs))
+            return self.cache.invalidate(lambda key: key == target)
+        return self.cache.invalidate(lambda key: key[0] == method)  # type: ignore[index]
+
+    def invalidate_vehicle(self, vehicle_id: str) -> int:
+        """Removes all the cached responses of the given vehicle."""
+
+        def of_vehicle(key: Any) -> bool:
+            _, args, kwargs = key
+            return args[:1] == (vehicle_id,) or ("vehicle_id", vehicle_id) in kwargs
+
+        return self.cache.invalidate(of_vehicle)
@@ -0,0 +1,174 @@
+"""Change detection over the vehicle status."""
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from dataclasses import field
+from enum import Enum
+from typing import Any
+from typing import Callable
+from typing import Generic
+from typing import List
+from typing import Tuple
+from typing import TypeVar
+
+import psa_ccc.models as mdl
+from psa_ccc.client import PSAClient
+from psa_ccc.client import get_decoder
+
+T = TypeVar("T")
+
+
+class StatusField(str, Enum):
+    """Fields of the vehicle status whose changes are detected."""
+
+    ODOMETER = "odometer"
+    ENERGY_LEVEL = "energy_level"
+    POSITION = "position"
+    DOORS = "doors"
+    IGNITION = "ignition"
+
+
+@dataclass(frozen=True, slots=True)
+class FieldChange(Generic[T]):
+    """Change of a field of the vehicle status; old is None at the first one."""
+
+    field: StatusField
+    old: T | None
+    new: T | None
+
+
+@dataclass(slots=True)
+class StatusDelta:
+    """Outcome of a status update: the current status and what changed."""
+
+    vehicle_id: str
+    status: mdl.VehicleStatus
+    changes: List[FieldChange[Any]] = field(default_factory=list)
+
+    def get(self, status_field: StatusField) -> FieldChange[Any] | None:
+        """Returns the change of the given field, None if unchanged."""
+        return next((c for c in self.changes if c.field == status_field), None)
+
+
+@dataclass
+class ChangeStats:
+    """Change detection counters."""
+
+    unchanged: int = 0
+    decoded: int = 0
+    changed: int = 0
+
+
+def _odometer(status: mdl.VehicleStatus) -> float:
+    return status.odometer.mileage
+
+
+def _energy_levels(status: mdl.VehicleStatus) -> Tuple[Tuple[str, float], ...]:
+    return tuple((energy.type, energy.level) for energy in status.energies)
+
+
+def _position(status: mdl.VehicleStatus) -> Tuple[float, ...]:
+    return tuple(status.last_position.geometry.coordinates)
+
+
+def _doors(status: mdl.VehicleStatus) -> mdl.DoorsState | None:
+    return status.doors_state
+
+
+def _ignition(status: mdl.VehicleStatus) -> str | None:
+    return status.ignition.type if status.ignition else None
+
+
+_FIELDS: dict[StatusField, Callable[[mdl.VehicleStatus], Any]] = {
+    StatusField.ODOMETER: _odometer,
+    StatusField.ENERGY_LEVEL: _energy_levels,
+    StatusField.POSITION: _position,
+    StatusField.DOORS: _doors,
+    StatusField.IGNITION: _ignition,
+}
+
+
+def diff_status(
+    old: mdl.VehicleStatus | None, new: mdl.VehicleStatus
+) -> List[FieldChange[Any]]:
+    """
+    Returns the changes of the tracked fields between two statuses.
+
+    Args:
+        old: previous status, None if this is the first one
+        new: current status
+
+    Returns:
+        The changed fields; all of them if there is no previous status.
+    """
+    changes = []
+    for status_field, getter in _FIELDS.items():
+        old_value = None if old is None else getter(old)
+        new_value = getter(new)
+        if old is None or old_value != new_value:
+            changes.append(FieldChange(status_field, old_value, new_value))
+    return changes
+
+
+class StatusChangeDetector:
+    """
+    Keeps the last status of every vehicle and detects what changed.
+
+    The raw response body is hashed before decoding: a vehicle that didn't
+    send anything new returns the very same body, so it is neither decoded
+    nor compared.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the detector."""
+        self.stats = ChangeStats()
+        self._snapshots: dict[str, tuple[bytes, mdl.VehicleStatus]] = {}
+
+    def __len__(self) -> int:
+        """Number of vehicles with a snapshot."""
+        return len(self._snapshots)
+
+    def get_status(self, vehicle_id: str) -> mdl.VehicleStatus | None:
+        """Returns the last status of the vehicle, None if unknown."""
+        snapshot = self._snapshots.get(vehicle_id)
+        return snapshot[1] if snapshot else None
+
+    def update(self, vehicle_id: str, body: bytes) -> StatusDelta:
+        """
+        Updates the status of the vehicle.
+
+        Args:
+            vehicle_id: ID of the vehicle
+            body: the raw vehicle status response
+
+        Returns:
+            The current status, with the changes since the last update;
+            no changes if the body is the same as the last one.
+        """
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        snapshot = self._snapshots.get(vehicle_id)
+        if snapshot is not None and snapshot[0] == digest:
+            self.stats.unchanged += 1
+            return StatusDelta(vehicle_id, snapshot[1])
+        status = get_decoder(mdl.VehicleStatus).decode(body)
+        self.stats.decoded += 1
+        changes = diff_status(snapshot[1] if snapshot else None, status)
+        if changes:
+            self.stats.changed += 1
+        self._snapshots[vehicle_id] = (digest, status)
+        return StatusDelta(vehicle_id, status, changes)
+
+    async def fetch(
+        self,
+        client: PSAClient,
+        vehicle_id: str,
+        extension: list[str] | None = None,
+    ) -> StatusDelta:
+        """Requests the status of the vehicle and updates it."""
+        body = await client.get_vehicle_status_body(vehicle_id, extension)
+        return self.update(vehicle_id, body)
+
+    def forget(self, vehicle_id: str) -> None:
+        """Drops the snapshot of the vehicle."""
+        self._snapshots.pop(vehicle_id, None)
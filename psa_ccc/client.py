@@ -1,18 +1,29 @@
 """API Client."""
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
 from typing import List
 from typing import TypeVar
+from typing import cast
 
+from httpx import URL
 from httpx import AsyncClient
+from httpx import HTTPError
 from httpx import QueryParams
 from httpx import Response
-from msgspec.json import decode
+from msgspec import DecodeError
+from msgspec.json import Decoder
 
 import psa_ccc.models as mdl
+from psa_ccc.retry import RetryPolicy
 
 
 class ApiError(BaseException):
@@ -21,13 +32,36 @@ class ApiError(BaseException):
     pass
 
 
+class NotFoundError(ApiError):
+    """The requested resource doesn't exist."""
+
+    pass
+
+
 T = TypeVar("T")
+P = TypeVar("P", bound=mdl.PaginatedResponse[Any])
+
+
+_DECODERS: dict[Any, Decoder[Any]] = {}
+
+
+def get_decoder(model: type[T]) -> Decoder[T]:
+    """Returns the JSON decoder for the given model, creating it only once."""
+    try:
+        return _DECODERS[model]
+    except KeyError:
+        decoder = _DECODERS[model] = Decoder(model)
+        return decoder
 
 
 def _handle_response(response: Response, model: type[T]) -> T:
+    if response.status_code == 404:
+        raise NotFoundError(response.text)
     if not 200 <= response.status_code < 300:
         raise ApiError(response.text)
-    return decode(response.text, type=model)
+    if model is bytes:
+        return cast(T, response.content)
+    return get_decoder(model).decode(response.content)
 
 
 def _query_params(other_params: dict[str, Any]) -> QueryParams | None:
@@ -35,18 +69,138 @@ def _query_params(other_params: dict[str, Any]) -> QueryParams | None:
     return QueryParams(to_add)
 
 
+def _next_page_token(page: mdl.PaginatedResponse[Any], token: str | None) -> str | None:
+    """
+    Returns the token of the page after the given one, None if it's the last.
+
+    Args:
+        page: the current page
+        token: the token of the current page, None for the first one
+
+    Raises:
+        ApiError: if pages are left but the token of the next one is unknown
+    """
+    if page.links and page.links.next:
+        return URL(page.links.next.href).params.get("pageToken")
+    if page.current_page >= page.total_page:
+        return None
+    # without a next link, only page numbers can be guessed, not opaque tokens
+    if token is not None and not token.isdigit():
+        raise ApiError(
+            f"page {page.current_page} of {page.total_page} has no next link"
+        )
+    return str(page.current_page + 1)
+
+
+async def _iter_pages(
+    fetch: Callable[[str | None], Awaitable[P | None]], prefetch: bool
+) -> AsyncIterator[P]:
+    """
+    Iterates over the pages of a paginated endpoint.
+
+    Args:
+        fetch: coroutine function returning the page for the given page token
+        prefetch: request the next page while the current one is processed
+
+    Yields:
+        The pages of the response.
+    """
+    pending: asyncio.Future[P | None] | None = None
+    token = None
+    page = await fetch(token)
+    try:
+        while page is not None:
+            token = _next_page_token(page, token)
+            if token is not None and prefetch:
+                pending = asyncio.ensure_future(fetch(token))
+            yield page
+            if token is None:
+                return
+            page = await (pending if pending is not None else fetch(token))
+            pending = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+@dataclass(slots=True)
+class _Flight:
+    """Request shared by concurrent identical calls."""
+
+    future: asyncio.Future[Any]
+    waiters: int = 0
+
+
+@dataclass(slots=True)
+class FleetStatusResult:
+    """Outcome of the status request of a single vehicle of the fleet."""
+
+    vehicle_id: str
+    status: mdl.VehicleStatus | None = None
+    error: BaseException | None = None
+
+
 @dataclass(kw_only=True, slots=True)
 class PSAClient:
-    """User API."""
+    """
+    User API.
+
+    Requests failed with a transient error are retried with the given
+    retry policy, if any.
+    """
 
     client: AsyncClient
+    retry: RetryPolicy | None = None
+    _in_flight: dict[tuple[str, ...], _Flight] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    async def _get(
+        self,
+        url: str,
+        model: type[T],
+        params: QueryParams | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> T:
+        """
+        Performs a GET request and decodes the response into the model.
 
-    # TODO: add a decoder cache for each schema do decode
+        Concurrent identical requests share a single in-flight request,
+        and all of them get the same decoded result (or error).
+        """
+        key = ("GET", url, str(params), str(headers), model.__qualname__)
+        flight = self._in_flight.get(key)
+        if flight is None:
+            future = asyncio.ensure_future(self._fetch(url, model, params, headers))
+            flight = self._in_flight[key] = _Flight(future)
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        flight.waiters += 1
+        try:
+            # shielded, so a cancelled caller doesn't cancel the others
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.future.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def _fetch(
+        self,
+        url: str,
+        model: type[T],
+        params: QueryParams | None,
+        headers: dict[str, str] | None,
+    ) -> T:
+        def send() -> Awaitable[Response]:
+            return self.client.get(url, params=params, headers=headers)
+
+        response = await (send() if self.retry is None else self.retry.send(send))
+        return _handle_response(response, model=model)
 
     async def get_user(self) -> mdl.User:
         """Get user information."""
-        response = await self.client.get("/user")
-        return _handle_response(response, model=mdl.User)
+        return await self._get("/user", mdl.User)
 
     async def get_vehicles(
         self,
@@ -56,19 +210,57 @@ class PSAClient:
         page_token: str | None = None,
     ) -> List[mdl.VehicleSummary]:
         """Get the vehicles associated with the User."""
+        page = await self.get_vehicles_page(index_range, page_size, locale, page_token)
+        return page.embedded.vehicles
+
+    async def get_vehicles_page(
+        self,
+        index_range: str | None = None,
+        page_size: int | None = None,
+        locale: str | None = None,
+        page_token: str | None = None,
+    ) -> mdl.PaginatedVehicles:
+        """Get a page of the vehicles associated with the User."""
         params = {
             "indexRange": index_range,
             "pageSize": page_size,
             "locale": locale,
             "pageToken": page_token,
         }
-        response = await self.client.get("/user/vehicles", params=_query_params(params))
-        return _handle_response(response, model=mdl.PaginatedVehicles).embedded.vehicles
+        return await self._get(
+            "/user/vehicles", mdl.PaginatedVehicles, params=_query_params(params)
+        )
+
+    async def iter_vehicles(
+        self,
+        page_size: int | None = None,
+        locale: str | None = None,
+        prefetch: bool = True,
+    ) -> AsyncIterator[mdl.VehicleSummary]:
+        """
+        Iterates over all the vehicles associated with the User.
+
+        Args:
+            page_size: number of vehicles per request
+            locale: locale of the response
+            prefetch: request the next page while the current one is processed
+
+        Yields:
+            The vehicles of the user, fetched one page at a time.
+        """
+
+        async def fetch(page_token: str | None) -> mdl.PaginatedVehicles:
+            return await self.get_vehicles_page(
+                page_size=page_size, locale=locale, page_token=page_token
+            )
+
+        async for page in _iter_pages(fetch, prefetch):
+            for vehicle in page.embedded.vehicles:
+                yield vehicle
 
     async def get_vehicle(self, vehicle_id: str) -> mdl.Vehicle:
         """Get the vehicles associated with the User."""
-        response = await self.client.get(f"/user/vehicles/{vehicle_id}")
-        return _handle_response(response, model=mdl.Vehicle)
+        return await self._get(f"/user/vehicles/{vehicle_id}", mdl.Vehicle)
 
     async def get_vehicle_alerts(
         self,
@@ -87,13 +279,43 @@ class PSAClient:
             "pageToken": page_token,
             "timestamps": timestamps,
         }
-        response = await self.client.get(
-            f"/user/vehicles/{vehicle_id}/alerts",
-            params=_query_params(params),
-        )
-        if response.status_code == 404:
+        try:
+            return await self._get(
+                f"/user/vehicles/{vehicle_id}/alerts",
+                mdl.Alerts,
+                params=_query_params(params),
+            )
+        except NotFoundError:
             return None
-        return _handle_response(response, model=mdl.Alerts)
+
+    async def iter_alerts(
+        self,
+        vehicle_id: str,
+        page_size: int | None = None,
+        locale: str | None = None,
+        prefetch: bool = True,
+    ) -> AsyncIterator[mdl.Alert]:
+        """
+        Iterates over all the alert messages for a Vehicle.
+
+        Args:
+            vehicle_id: ID of the vehicle
+            page_size: number of alerts per request
+            locale: locale of the response
+            prefetch: request the next page while the current one is processed
+
+        Yields:
+            The alerts of the vehicle, fetched one page at a time.
+        """
+
+        async def fetch(page_token: str | None) -> mdl.Alerts | None:
+            return await self.get_vehicle_alerts(
+                vehicle_id, page_size=page_size, locale=locale, page_token=page_token
+            )
+
+        async for page in _iter_pages(fetch, prefetch):
+            for alert in page.embedded.alerts:
+                yield alert
 
     async def get_vehicle_alerts_by_id(
         self,
@@ -102,32 +324,31 @@ class PSAClient:
         locale: str | None = None,
     ) -> mdl.Alert:
         """Returns information about a specific alert message for a Vehicle."""
-        response = await self.client.get(
+        return await self._get(
             f"/user/vehicles/{vehicle_id}/alerts/{alert_id}",
+            mdl.Alert,
             params=_query_params({"locale": locale}),
         )
-        return _handle_response(response, model=mdl.Alert)
 
     async def get_vehicle_last_position(
         self,
         vehicle_id: str,
     ) -> mdl.Position:
         """Returns the latest GPS Position of the Vehicle."""
-        response = await self.client.get(
+        return await self._get(
             f"/user/vehicles/{vehicle_id}/lastPosition",
+            mdl.Position,
             headers={"Accept": "application/vnd.geo+json"},
         )
-        return _handle_response(response, model=mdl.Position)
 
     async def get_vehicle_maintenance(
         self,
         vehicle_id: str,
     ) -> mdl.Maintenance:
         """Returns the latest GPS Position of the Vehicle."""
-        response = await self.client.get(
-            f"/user/vehicles/{vehicle_id}/maintenance",
+        return await self._get(
+            f"/user/vehicles/{vehicle_id}/maintenance", mdl.Maintenance
         )
-        return _handle_response(response, model=mdl.Maintenance)
 
     async def get_vehicle_status(
         self,
@@ -135,8 +356,69 @@ class PSAClient:
         extension: list[str] | None = None,  # odometer | kinetic
     ) -> mdl.VehicleStatus:
         """Returns the latest vehicle status."""
-        response = await self.client.get(
+        return await self._get(
+            f"/user/vehicles/{vehicle_id}/status",
+            mdl.VehicleStatus,
+            params=_query_params({"extension": extension}),
+        )
+
+    async def get_vehicle_status_body(
+        self,
+        vehicle_id: str,
+        extension: list[str] | None = None,
+    ) -> bytes:
+        """Returns the latest vehicle status, without decoding it."""
+        return await self._get(
             f"/user/vehicles/{vehicle_id}/status",
+            bytes,
             params=_query_params({"extension": extension}),
         )
-        return _handle_response(response, model=mdl.VehicleStatus)
+
+    async def get_fleet_status(
+        self,
+        vehicle_ids: Iterable[str],
+        concurrency: int = 10,
+        timeout: float | None = 30.0,
+        extension: list[str] | None = None,
+    ) -> AsyncIterator[FleetStatusResult]:
+        """
+        Returns the latest status of many vehicles, as soon as they arrive.
+
+        At most `concurrency` requests are in flight at any time; a failing
+        or slow vehicle is reported in its own result and doesn't affect the
+        others. Unexpected errors, e.g. bugs, are raised as usual.
+
+        Args:
+            vehicle_ids: IDs of the vehicles to query
+            concurrency: maximum number of concurrent requests
+            timeout: maximum time in seconds to wait for a single vehicle;
+                no limit if None
+            extension: status extensions to request (odometer | kinetic)
+
+        Yields:
+            The status or the error for each vehicle, in completion order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(vehicle_id: str) -> FleetStatusResult:
+            async with semaphore:
+                try:
+                    status = await asyncio.wait_for(
+                        self.get_vehicle_status(vehicle_id, extension), timeout
+                    )
+                except (
+                    ApiError,
+                    HTTPError,
+                    DecodeError,
+                    asyncio.TimeoutError,
+                ) as err:
+                    return FleetStatusResult(vehicle_id, error=err)
+            return FleetStatusResult(vehicle_id, status=status)
+
+        tasks = [asyncio.ensure_future(fetch(vehicle_id)) for vehicle_id in vehicle_ids]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,138 @@
+"""JSON file token storage."""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any
+from typing import AsyncIterator
+from typing import BinaryIO
+from typing import ContextManager
+from typing import Iterator
+
+from authlib.oauth2.rfc6749 import OAuth2Token
+
+from psa_ccc.storage import atomic_write
+
+if sys.platform == "win32":  # pragma: no cover
+    import msvcrt
+
+    def _lock(lock_file: BinaryIO, exclusive: bool) -> None:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock(lock_file: BinaryIO) -> None:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock(lock_file: BinaryIO, exclusive: bool) -> None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _unlock(lock_file: BinaryIO) -> None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _acquire(lock_path: Path, exclusive: bool) -> BinaryIO:
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_file = open(lock_path, "a+b")
+    try:
+        _lock(lock_file, exclusive)
+    except BaseException:
+        lock_file.close()
+        raise
+    return lock_file
+
+
+def _release(lock_file: BinaryIO) -> None:
+    with lock_file:
+        _unlock(lock_file)
+
+
+@contextmanager
+def file_lock(lock_path: Path, exclusive: bool = True) -> Iterator[None]:
+    """
+    Holds an advisory lock on the given file, shared between processes.
+
+    Args:
+        lock_path: path of the lock file, created if missing
+        exclusive: exclusive (write) lock if True, shared (read) lock otherwise
+    """
+    lock_file = _acquire(lock_path, exclusive)
+    try:
+        yield
+    finally:
+        _release(lock_file)
+
+
+class FileTokenStorage:
+    """
+    Store the tokens of many accounts in a JSON file.
+
+    Worker processes can share the same file: writes are atomic and the
+    read-modify-write cycle is serialized by a lock file next to it;
+    `lock` holds that lock while the token is refreshed.
+    """
+
+    def __init__(self, path: Path, account: str) -> None:
+        """
+        Initialize the token storage.
+
+        Args:
+            path: path of the JSON file
+            account: key of the account whose token is stored
+        """
+        self.path = path
+        self.account = account
+        self.lock_path = path.with_name(f"{path.name}.lock")
+        self._held = False
+        self._holder = asyncio.Lock()
+
+    async def load(
+        self, access_token: str | None = None, refresh_token: str | None = None
+    ) -> OAuth2Token:
+        """Load the token from storage."""
+        token = await asyncio.to_thread(self._load)
+        return None if token is None else OAuth2Token(token)
+
+    async def save(self, token: OAuth2Token) -> None:
+        """Save the token."""
+        await asyncio.to_thread(self._save, dict(token))
+
+    @asynccontextmanager
+    async def lock(self) -> AsyncIterator[None]:
+        """Holds the lock file, serializing the token refresh between processes."""
+        async with self._holder:
+            lock_file = await asyncio.to_thread(_acquire, self.lock_path, True)
+            self._held = True
+            try:
+                yield
+            finally:
+                self._held = False
+                await asyncio.to_thread(_release, lock_file)
+
+    def _locked(self, exclusive: bool) -> ContextManager[None]:
+        # a second flock of the same file would wait for the one held by `lock`
+        return nullcontext() if self._held else file_lock(self.lock_path, exclusive)
+
+    def _load(self) -> dict[str, Any] | None:
+        with self._locked(exclusive=False):
+            return self._read_all().get(self.account)
+
+    def _save(self, token: dict[str, Any]) -> None:
+        with self._locked(exclusive=True):
+            tokens = self._read_all()
+            tokens[self.account] = token
+            atomic_write(self.path, json.dumps(tokens).encode("utf-8"))
+
+    def _read_all(self) -> dict[str, Any]:
+        try:
+            return json.loads(self.path.read_bytes())
+        except FileNotFoundError:
+            return {}
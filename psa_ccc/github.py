@@ -2,14 +2,37 @@
 from __future__ import annotations
 
 import logging
+import time
 from dataclasses import dataclass
+from hashlib import sha1
+from typing import Any
 
 from httpx import AsyncClient
+from httpx import TransportError
+from msgspec import DecodeError
+from msgspec import Struct
+from msgspec.json import decode
+from msgspec.json import encode
 
-from psa_ccc.storage import CacheStorage
+from psa_ccc.storage import AnyCacheStorage
+from psa_ccc.storage import AsyncCacheStorage
+from psa_ccc.storage import ensure_async_storage
 
 logger = logging.getLogger(__name__)
 
+# seconds before checking a GitHub directory for changes again
+MIN_CHECK_INTERVAL = 300.0
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class _GitHubTree(Struct):
+    """Files of a GitHub directory, as of the last check."""
+
+    etag: str | None
+    checked_at: float
+    files: dict[str, dict[str, Any]]
+
 
 @dataclass
 class GitHubUrlsBuilder:
@@ -34,8 +57,9 @@ class GitHubUrlsBuilder:
 
 async def download_github_file(
     client: AsyncClient,
-    storage: CacheStorage,
+    storage: AnyCacheStorage,
     url_builder: GitHubUrlsBuilder,
+    min_interval: float = MIN_CHECK_INTERVAL,
 ) -> None:
     """
     Download a file from GitHub.
@@ -44,20 +68,82 @@ async def download_github_file(
         client: async http client
         storage: storage cache for downloaded files
         url_builder: GitHubUrlsBuilder
+        min_interval: seconds before checking the GitHub directory again
     """
+    storage = ensure_async_storage(storage)
     filename = url_builder.filename
-    if not await needs_download(client, storage, url_builder.dir_sha_url, filename):
+    try:
+        file_info = await _get_file_info(
+            client, storage, url_builder.dir_sha_url, filename, min_interval
+        )
+    except ValueError:
+        file_info = None
+    if (
+        file_info is not None
+        and await storage.exists(filename)
+        and await storage.get_sha(filename) == file_info["sha"]
+    ):
         return
-    response = await client.get(
+    await _stream_to_file(
+        client,
         url_builder.raw_url,
+        storage,
+        filename,
+        file_info.get("size") if file_info else None,
+        file_info["sha"] if file_info else None,
+    )
+
+
+async def _stream_to_file(
+    client: AsyncClient,
+    url: str,
+    storage: AsyncCacheStorage,
+    filename: str,
+    size: int | None,
+    sha: str | None,
+) -> None:
+    """
+    Downloads the file in chunks, verifying its git blob SHA while writing.
+
+    The file is streamed to the storage, which saves it only if the SHA
+    matches, so a broken download never replaces a good file.
+
+    Args:
+        client: async http client
+        url: URL of the file to download
+        storage: storage cache for downloaded files
+        filename: name of the file in the storage
+        size: size of the file, if known
+        sha: expected git blob SHA of the file; not verified if None
+
+    Raises:
+        ValueError: if the SHA of the downloaded file doesn't match.
+    """
+    async with client.stream(
+        "GET",
+        url,
         follow_redirects=True,
         headers={"Accept": "application/vnd.github.VERSION.raw"},
-    )
-    storage.save(response.content, filename)
+    ) as response:
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+        if (
+            size is None
+            and content_length
+            and "Content-Encoding" not in response.headers
+        ):
+            size = int(content_length)
+        await storage.save_stream(
+            response.aiter_bytes(_CHUNK_SIZE), filename, sha, size
+        )
 
 
 async def needs_download(
-    client: AsyncClient, storage: CacheStorage, sha_url: str, filename: str
+    client: AsyncClient,
+    storage: AnyCacheStorage,
+    sha_url: str,
+    filename: str,
+    min_interval: float = MIN_CHECK_INTERVAL,
 ) -> bool:
     """
     Returns True if the GitHub file needs to be downloaded.
@@ -67,38 +153,151 @@ async def needs_download(
         storage: storage cache for downloaded files
         sha_url: url of sha checksums for files in the parent directory
         filename: name of the file to check
+        min_interval: seconds before checking the GitHub directory again
 
     Returns:
         True if the GitHub file needs to be downloaded.
     """
-    if not storage.exists(filename):
+    storage = ensure_async_storage(storage)
+    if not await storage.exists(filename):
         return True
     try:
-        github_sha = await _get_sha(client, sha_url, filename)
+        github_sha = await _get_sha(client, storage, sha_url, filename, min_interval)
     except ValueError:
         return True
-    return storage.get_sha(filename) != github_sha
+    return await storage.get_sha(filename) != github_sha
 
 
-async def _get_sha(client: AsyncClient, sha_url: str, filename: str) -> str:
+async def get_github_sha(
+    client: AsyncClient,
+    storage: AnyCacheStorage,
+    url_builder: GitHubUrlsBuilder,
+    min_interval: float = MIN_CHECK_INTERVAL,
+) -> str:
+    """
+    Returns the git SHA of a file on GitHub, without downloading it.
+
+    Args:
+        client: async http client
+        storage: storage cache for the GitHub directory trees
+        url_builder: GitHubUrlsBuilder
+        min_interval: seconds before checking the GitHub directory again
+
+    Returns:
+        git SHA of the file on GitHub.
+
+    Raises:
+        ValueError: if the SHA can't be retrieved.
+    """
+    return await _get_sha(
+        client,
+        ensure_async_storage(storage),
+        url_builder.dir_sha_url,
+        url_builder.filename,
+        min_interval,
+    )
+
+
+async def _get_sha(
+    client: AsyncClient,
+    storage: AsyncCacheStorage,
+    sha_url: str,
+    filename: str,
+    min_interval: float,
+) -> str:
     """
     Returns the SHA1 sum of a file on GitHub.
 
     Args:
         client: async http client
+        storage: storage cache for the GitHub directory trees
         sha_url: url of sha checksums for files in the parent directory
         filename: name of the file to check
+        min_interval: seconds before checking the GitHub directory again
 
     Returns:
         SHA1 sum of the file on GitHub.
     """
-    res = await client.get(sha_url)
-    data = res.json()
+    file_info = await _get_file_info(client, storage, sha_url, filename, min_interval)
+    return file_info["sha"]
+
+
+async def _get_file_info(
+    client: AsyncClient,
+    storage: AsyncCacheStorage,
+    sha_url: str,
+    filename: str,
+    min_interval: float,
+) -> dict[str, Any]:
+    """
+    Returns the entry of a file in the tree of its GitHub directory.
+
+    Args:
+        client: async http client
+        storage: storage cache for the GitHub directory trees
+        sha_url: url of sha checksums for files in the parent directory
+        filename: name of the file to check
+        min_interval: seconds before checking the GitHub directory again
+
+    Returns:
+        Tree entry of the file, with its SHA and size.
+    """
+    files = await _get_tree(client, storage, sha_url, min_interval)
     try:
-        file_info = next(
-            file for file in data.get("tree", []) if file.get("path") == filename
-        )
-    except StopIteration as err:
-        logger.error("can't get SHA for github file: %s", res)
+        return files[filename]
+    except KeyError as err:
+        logger.error("can't get SHA for github file: %s", filename)
         raise ValueError from err
-    return file_info["sha"]
+
+
+async def _get_tree(
+    client: AsyncClient, storage: AsyncCacheStorage, sha_url: str, min_interval: float
+) -> dict[str, dict[str, Any]]:
+    """
+    Returns the files of a GitHub directory, with their SHA and size.
+
+    The tree is kept in the storage with its ETag: it is not checked again
+    for `min_interval` seconds, and then with a conditional request that
+    doesn't count against the GitHub API rate limit if it didn't change.
+    If GitHub can't be reached, the last known tree is used.
+    """
+    cache_path = f"github/{sha1(sha_url.encode('utf-8')).hexdigest()}.json"  # noqa S324
+    cached = await _load_tree(storage, cache_path)
+    now = time.time()
+    if cached is not None and now - cached.checked_at < min_interval:
+        return cached.files
+    headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+    try:
+        res = await client.get(sha_url, headers=headers)
+    except TransportError as err:
+        if cached is None:
+            raise
+        logger.warning("can't reach github, using the last tree: %s", err)
+        return cached.files
+    if res.status_code == 304 and cached is not None:
+        cached.checked_at = now
+    elif res.status_code == 200:
+        files = {
+            file["path"]: {"sha": file.get("sha"), "size": file.get("size")}
+            for file in res.json().get("tree", [])
+            if "path" in file
+        }
+        cached = _GitHubTree(res.headers.get("ETag"), now, files)
+    elif cached is not None:
+        logger.warning("can't check github directory, using the last tree: %s", res)
+        return cached.files
+    else:
+        logger.error("can't get github directory: %s", res)
+        raise ValueError(f"can't get {sha_url}")
+    await storage.save(encode(cached), cache_path)
+    return cached.files
+
+
+async def _load_tree(storage: AsyncCacheStorage, cache_path: str) -> _GitHubTree | None:
+    if not await storage.exists(cache_path):
+        return None
+    try:
+        return decode(await storage.read(cache_path), type=_GitHubTree)
+    except DecodeError:
+        logger.warning("ignoring invalid github tree cache %s", cache_path)
+        return None
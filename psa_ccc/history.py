@@ -0,0 +1,302 @@
+"""Compact history of the vehicle telemetry."""
+from __future__ import annotations
+
+import bisect
+import math
+import mmap
+import operator
+import struct
+import time
+from array import array
+from dataclasses import dataclass
+from functools import partial
+from itertools import filterfalse
+from pathlib import Path
+from typing import Iterable
+from typing import Sequence
+from urllib.parse import quote
+
+import psa_ccc.models as mdl
+from psa_ccc.storage import atomic_write
+
+COLUMNS = (
+    "timestamp",
+    "latitude",
+    "longitude",
+    "altitude",
+    "mileage",
+    "level",
+    "autonomy",
+    "speed",
+    "voltage",
+)
+_TIMESTAMP = 0
+
+# magic, version, number of columns, number of samples, first and last timestamp;
+# like the samples, in the byte order of the machine
+_HEADER = struct.Struct("=4sHHIdd4x")
+_MAGIC = b"PSAH"
+_VERSION = 1
+
+
+def get_sample(
+    status: mdl.VehicleStatus, timestamp: float | None = None
+) -> tuple[float, ...]:
+    """
+    Extracts the tracked metrics from a vehicle status.
+
+    Args:
+        status: the vehicle status
+        timestamp: time of the sample, in seconds since the epoch; the update
+            time of the status, or the current time, if None
+
+    Returns:
+        The values of the columns, NaN for the missing ones; the energy level
+        and autonomy are those of the first energy of the vehicle.
+    """
+    if timestamp is None:
+        updated_at = status.updated_at or status.created_at
+        timestamp = updated_at.timestamp() if updated_at else time.time()
+    coordinates = status.last_position.geometry.coordinates
+    longitude, latitude, *rest = coordinates
+    energy = status.energies[0] if status.energies else None
+    return (
+        timestamp,
+        latitude,
+        longitude,
+        rest[0] if rest else math.nan,
+        status.odometer.mileage,
+        energy.level if energy else math.nan,
+        energy.autonomy if energy else math.nan,
+        status.kinetic.speed,
+        status.battery.voltage,
+    )
+
+
+class HistoryFrame:
+    """Samples of a vehicle in a time range, one array per column."""
+
+    def __init__(self, columns: dict[str, array[float]]) -> None:
+        """Initialize the frame with the given columns."""
+        self.columns = columns
+
+    def __len__(self) -> int:
+        """Number of samples."""
+        return len(self.columns[COLUMNS[_TIMESTAMP]])
+
+    def __getitem__(self, name: str) -> array[float]:
+        """Returns the values of the column."""
+        return self.columns[name]
+
+    def min(self, name: str) -> float:
+        """Minimum of the column, ignoring the missing values."""
+        return min(self._valid(name), default=math.nan)
+
+    def max(self, name: str) -> float:
+        """Maximum of the column, ignoring the missing values."""
+        return max(self._valid(name), default=math.nan)
+
+    def mean(self, name: str) -> float:
+        """Mean of the column, ignoring the missing values."""
+        values = array("d", self._valid(name))
+        return math.fsum(values) / len(values) if values else math.nan
+
+    def duration(self) -> float:
+        """Seconds between the first and the last sample."""
+        timestamps = self.columns["timestamp"]
+        return timestamps[-1] - timestamps[0] if timestamps else 0.0
+
+    def distance(self) -> float:
+        """Kilometers driven, according to the odometer."""
+        mileage = array("d", self._valid("mileage"))
+        return mileage[-1] - mileage[0] if mileage else 0.0
+
+    def energy_used(self) -> float:
+        """Sum of the energy level drops, in percentage points."""
+        levels = array("d", self._valid("level"))
+        drops = map(operator.sub, levels, levels[1:])
+        return math.fsum(filter(partial(operator.lt, 0.0), drops))
+
+    def _valid(self, name: str) -> Iterable[float]:
+        return filterfalse(math.isnan, self.columns[name])
+
+
+def _vehicle_dir(directory: Path, vehicle_id: str) -> Path:
+    return directory / quote(vehicle_id, safe="")
+
+
+@dataclass(frozen=True)
+class _Segment:
+    path: Path
+    count: int
+    first: float
+    last: float
+
+
+class _VehicleHistory:
+    """Samples of a vehicle: the flushed segments, and a buffer in memory."""
+
+    def __init__(self, segments: list[_Segment]) -> None:
+        self.segments = segments
+        self.buffer = [array("d") for _ in COLUMNS]
+        self.last = segments[-1].last if segments else -math.inf
+
+
+def _read_segment(
+    mapped: mmap.mmap,
+    segment: _Segment,
+    start: float,
+    end: float,
+    columns: dict[str, array[float]],
+) -> None:
+    # the views are released on return, so that the segment can be unmapped
+    values = memoryview(mapped)[_HEADER.size :].cast("d")
+    timestamps = values[: segment.count]
+    first = bisect.bisect_left(timestamps, start)
+    last = bisect.bisect_left(timestamps, end)
+    for index, name in enumerate(COLUMNS):
+        offset = index * segment.count
+        columns[name].frombytes(values[offset + first : offset + last].cast("B"))
+
+
+class HistoryStore:
+    """
+    Columnar store of the telemetry history of many vehicles.
+
+    Every sample takes a few doubles (see `COLUMNS`), instead of a whole
+    status: the samples of each vehicle are appended to `array` columns,
+    and every `segment_size` samples they are written to a segment file,
+    which is memory mapped for the time of each query.
+    Without a directory, all the samples are kept in memory.
+    The aggregations run over the arrays with the builtin functions;
+    numpy is not a dependency of this library.
+    """
+
+    def __init__(self, directory: Path | None = None, segment_size: int = 4096) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            directory: where to write the segments; in memory only if None
+            segment_size: number of samples of each segment
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self._vehicles: dict[str, _VehicleHistory] = {}
+
+    def append(
+        self,
+        vehicle_id: str,
+        status: mdl.VehicleStatus,
+        timestamp: float | None = None,
+    ) -> bool:
+        """
+        Appends the metrics of a status to the history of the vehicle.
+
+        Args:
+            vehicle_id: ID of the vehicle
+            status: the vehicle status
+            timestamp: time of the sample; the update time of the status if None
+
+        Returns:
+            False if the sample is not newer than the last one, and was skipped.
+        """
+        return self.append_sample(vehicle_id, get_sample(status, timestamp))
+
+    def append_sample(self, vehicle_id: str, sample: Sequence[float]) -> bool:
+        """Appends the values of the columns, like `append` does."""
+        history = self._history(vehicle_id)
+        if sample[_TIMESTAMP] <= history.last:
+            return False
+        for column, value in zip(history.buffer, sample, strict=True):
+            column.append(value)
+        history.last = sample[_TIMESTAMP]
+        if self.directory and len(history.buffer[_TIMESTAMP]) >= self.segment_size:
+            self._flush(vehicle_id, history)
+        return True
+
+    def query(
+        self,
+        vehicle_id: str,
+        start: float | None = None,
+        end: float | None = None,
+    ) -> HistoryFrame:
+        """
+        Returns the samples of the vehicle in the given time range.
+
+        Args:
+            vehicle_id: ID of the vehicle
+            start: first timestamp, included; from the first sample if None
+            end: last timestamp, excluded; up to the last sample if None
+
+        Returns:
+            The samples, one array per column.
+        """
+        start = -math.inf if start is None else start
+        end = math.inf if end is None else end
+        history = self._vehicles.get(vehicle_id)
+        if history is None:
+            # not kept unless there are segments, not to grow on unknown IDs
+            history = _VehicleHistory(self._load_segments(vehicle_id))
+            if history.segments:
+                self._vehicles[vehicle_id] = history
+        columns = {name: array("d") for name in COLUMNS}
+        for segment in history.segments:
+            if segment.last < start or segment.first >= end:
+                continue
+            with segment.path.open("rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                _read_segment(mapped, segment, start, end, columns)
+        buffered = history.buffer[_TIMESTAMP]
+        first = bisect.bisect_left(buffered, start)
+        last = bisect.bisect_left(buffered, end)
+        for name, column in zip(COLUMNS, history.buffer, strict=True):
+            columns[name].extend(column[first:last])
+        return HistoryFrame(columns)
+
+    def flush(self) -> None:
+        """Writes the samples still in memory to new segments."""
+        if self.directory is None:
+            return
+        for vehicle_id, history in self._vehicles.items():
+            if history.buffer[_TIMESTAMP]:
+                self._flush(vehicle_id, history)
+
+    def close(self) -> None:
+        """Flushes the samples still in memory."""
+        self.flush()
+        self._vehicles.clear()
+
+    def _history(self, vehicle_id: str) -> _VehicleHistory:
+        history = self._vehicles.get(vehicle_id)
+        if history is None:
+            history = _VehicleHistory(self._load_segments(vehicle_id))
+            self._vehicles[vehicle_id] = history
+        return history
+
+    def _load_segments(self, vehicle_id: str) -> list[_Segment]:
+        if self.directory is None:
+            return []
+        segments = []
+        for path in _vehicle_dir(self.directory, vehicle_id).glob("*.seg"):
+            with path.open("rb") as file:
+                header = file.read(_HEADER.size)
+            magic, version, columns, count, first, last = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION or columns != len(COLUMNS):
+                raise ValueError(f"{path} is not a history segment")
+            segments.append(_Segment(path, count, first, last))
+        return sorted(segments, key=lambda segment: segment.first)
+
+    def _flush(self, vehicle_id: str, history: _VehicleHistory) -> None:
+        if self.directory is None:
+            return
+        timestamps = history.buffer[_TIMESTAMP]
+        count = len(timestamps)
+        first, last = timestamps[0], timestamps[-1]
+        header = _HEADER.pack(_MAGIC, _VERSION, len(COLUMNS), count, first, last)
+        data = b"".join([header, *(column.tobytes() for column in history.buffer)])
+        path = _vehicle_dir(self.directory, vehicle_id) / f"{first:020.6f}.seg"
+        atomic_write(path, data)
+        history.segments.append(_Segment(path, count, first, last))
+        history.buffer = [array("d") for _ in COLUMNS]
@@ -0,0 +1,131 @@
+"""In-memory cache layer over a storage cache."""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO
+from typing import Iterator
+from typing import NamedTuple
+
+from psa_ccc.cache import CacheStats
+from psa_ccc.storage import CacheStorage
+from psa_ccc.storage import open_writer
+
+
+class _FileKey(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+class LRUCacheStorage:
+    """
+    Storage cache wrapper that keeps the recently read files in memory.
+
+    Files smaller than `max_file_bytes` are kept in a LRU cache bounded to
+    `max_bytes`; bigger files, like the APK, are read through: the APK
+    parser opens them by path and only reads the entries it needs.
+    Every read checks the size and modification time of the file, so the
+    changes made by other processes are never hidden by the cache.
+    """
+
+    def __init__(
+        self,
+        storage: CacheStorage,
+        max_bytes: int = 8 * 1024 * 1024,
+        max_file_bytes: int = 1024 * 1024,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            storage: the wrapped storage cache; it must store the files
+                at the path returned by its `get_full_path`
+            max_bytes: maximum total size of the files kept in memory
+            max_file_bytes: size from which the files are not kept in memory
+        """
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.stats = CacheStats()
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[_FileKey, bytes]] = OrderedDict()
+        # reads can run concurrently in worker threads, see ThreadedCacheStorage
+        self._lock = threading.Lock()
+
+    def get_full_path(self, filename: str) -> Path:
+        """Returns the full path of the given filename."""
+        return self.storage.get_full_path(filename)
+
+    def exists(self, filename: str) -> bool:
+        """Returns True if the given filename exists."""
+        return self.storage.exists(filename)
+
+    def get_sha(self, filename: str) -> str:
+        """Returns the SHA of the given file."""
+        return self.storage.get_sha(filename)
+
+    def read(self, filename: str) -> bytes:
+        """Reads the contents of the file."""
+        key = self._stat(filename)
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(filename)
+                self.stats.hits += 1
+                return entry[1]
+            self.stats.misses += 1
+        data = self.storage.read(filename)
+        # don't keep the contents of a file changed while reading it
+        if key.size < self.max_file_bytes and self._stat(filename) == key:
+            self._store(filename, key, data)
+        return data
+
+    def save(self, data: bytes, filename: str) -> None:
+        """Save the data to the given file."""
+        self.storage.save(data, filename)
+        if len(data) < self.max_file_bytes:
+            self._store(filename, self._stat(filename), data)
+        else:
+            with self._lock:
+                self._drop(filename)
+
+    @contextmanager
+    def writer(self, filename: str) -> Iterator[IO[bytes]]:
+        """Opens the file for writing, saved when the block exits without errors."""
+        with open_writer(self.storage, filename) as file:
+            yield file
+        with self._lock:
+            self._drop(filename)
+
+    def clear(self) -> None:
+        """Drops all the files kept in memory."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _stat(self, filename: str) -> _FileKey:
+        try:
+            stat = self.storage.get_full_path(filename).stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(filename) from None
+        return _FileKey(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _store(self, filename: str, key: _FileKey, data: bytes) -> None:
+        with self._lock:
+            self._drop(filename)
+            if len(data) > self.max_bytes:
+                return
+            self._entries[filename] = (key, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats.evictions += 1
+
+    def _drop(self, filename: str) -> None:
+        old = self._entries.pop(filename, None)
+        if old is not None:
+            self.size -= len(old[1])
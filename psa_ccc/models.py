@@ -4,7 +4,6 @@ from __future__ import annotations
 import datetime
 from enum import Enum
 from re import sub
-from typing import Any
 from typing import Generic
 from typing import TypeVar
 
@@ -25,14 +24,26 @@ def rename(name: str) -> str | None:
 T = TypeVar("T")
 
 
+class Link(Struct, kw_only=True, rename=rename):
+    """HAL link."""
+
+    href: str
+
+
+class PaginationLinks(Struct, kw_only=True, rename=rename):
+    """Links of a paginated response."""
+
+    next: Link | None = None
+
+
 class PaginatedResponse(Struct, Generic[T], kw_only=True, rename=rename):
     """Generic wrapper for paginated responses."""
 
-    # links: Any
     total: int
     current_page: int
     total_page: int
     embedded: T
+    links: PaginationLinks | None = None
 
 
 class BaseEntity(Struct, kw_only=True, rename=rename):
@@ -135,8 +146,8 @@ class Opening(Struct, kw_only=True, rename=rename):
 class DoorsState(Struct, kw_only=True, rename=rename):
     """Doors state."""
 
-    locked_state: str  # enum...
-    opening: list[Opening]
+    locked_state: str | list[str]  # enum..., or a list of them
+    opening: list[Opening] = []
 
 
 class EVBatteryCharging(Struct, kw_only=True, rename=rename):
@@ -326,12 +337,18 @@ class VehicleStatus(BaseEntity, kw_only=True, rename=rename):
     preconditioning: Preconditioning
     energies: list[Energy]
     # links: Any  # self and vehicle
-    # doors_state: DoorsState
     # safety: Safety
     ignition: Ignition | None = None
+    doors_state: DoorsState | None = None
+
+
+class AlertList(Struct, kw_only=True, rename=rename):
+    """List of the alerts of a vehicle."""
+
+    alerts: list[Alert] = []
 
 
-class Alerts(PaginatedResponse[Any]):
+class Alerts(PaginatedResponse[AlertList]):
     """Alerts container."""
 
     pass
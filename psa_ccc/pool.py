@@ -0,0 +1,190 @@
+"""Pool of API clients for many accounts."""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import Callable
+
+from httpx import AsyncBaseTransport
+from httpx import AsyncHTTPTransport
+from httpx import Limits
+
+from psa_ccc import create_psa_client
+from psa_ccc.auth import PSAOAuth2Client
+from psa_ccc.auth import TokenStorage
+from psa_ccc.client import PSAClient
+from psa_ccc.lru_storage import LRUCacheStorage
+from psa_ccc.memory_token_storage import MemoryTokenStorage
+from psa_ccc.rate_limit import RateLimiter
+from psa_ccc.retry import RetryPolicy
+from psa_ccc.storage import AnyCacheStorage
+from psa_ccc.storage import SimpleCacheStorage
+
+
+@dataclass(frozen=True)
+class Account:
+    """Credentials of a user of the connected car service."""
+
+    brand: str
+    country_code: str
+    email: str
+    password: str = field(repr=False)
+
+    @property
+    def key(self) -> str:
+        """Unique identifier of the account."""
+        return f"{self.brand}:{self.email}"
+
+
+@dataclass
+class _Session:
+    client: PSAClient
+    last_used: float
+
+
+class PSAClientPool:
+    """
+    API clients of many accounts, sharing a single connection pool.
+
+    The client of an account is created the first time it is requested;
+    the least recently used clients are dropped when there are more than
+    `max_sessions`, or when they are idle for more than `max_idle` seconds.
+    The tokens are kept in the token storage of each account, so a dropped
+    client is recreated without logging in again.
+    """
+
+    def __init__(
+        self,
+        cache_storage: AnyCacheStorage | None = None,
+        token_storage_factory: Callable[[Account], TokenStorage] | None = None,
+        max_sessions: int = 100,
+        max_idle: float | None = None,
+        transport: AsyncBaseTransport | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        retry: RetryPolicy | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            cache_storage: storage of the configuration, shared by all accounts;
+                the current directory, with its files cached in memory, if None
+            token_storage_factory: returns the token storage of an account;
+                tokens are kept in memory if None
+            max_sessions: maximum number of clients kept alive
+            max_idle: seconds after which an unused client is dropped
+            transport: HTTP transport shared by all the clients; a new
+                connection pool is created if None
+            clock: monotonic time source, in seconds
+            retry: retry policy shared by all the clients, so its stats
+                cover the whole pool
+            rate_limiter: rate limits of the requests of all the clients,
+                per account and per host
+        """
+        self.cache_storage = cache_storage or LRUCacheStorage(
+            SimpleCacheStorage(Path("."))
+        )
+        self.token_storage_factory = token_storage_factory or self._memory_storage
+        self.max_sessions = max_sessions
+        self.max_idle = max_idle
+        self.transport = transport or AsyncHTTPTransport(
+            limits=Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self.clock = clock
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self._accounts: dict[str, Account] = {}
+        self._token_storages: dict[str, TokenStorage] = {}
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._pending: dict[str, asyncio.Future[PSAClient]] = {}
+
+    def __len__(self) -> int:
+        """Number of live clients."""
+        return len(self._sessions)
+
+    def add_account(self, account: Account) -> str:
+        """Registers an account, returning its key."""
+        self._accounts[account.key] = account
+        return account.key
+
+    async def remove_account(self, key: str) -> None:
+        """Unregisters an account, dropping its client."""
+        self._accounts.pop(key, None)
+        self._token_storages.pop(key, None)
+        if self.rate_limiter is not None:
+            self.rate_limiter.forget(key)
+        await self._drop(key)
+
+    async def get(self, key: str) -> PSAClient:
+        """
+        Returns the API client of the account.
+
+        Args:
+            key: key of a registered account
+
+        Returns:
+            API client of the account
+        """
+        await self.evict_idle()
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            session.last_used = self.clock()
+            return session.client
+        pending = self._pending.get(key)
+        if pending is None:
+            account = self._accounts[key]
+            pending = asyncio.ensure_future(self._create(account))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def evict_idle(self) -> None:
+        """Drops the clients unused for more than max_idle seconds."""
+        if self.max_idle is None:
+            return
+        deadline = self.clock() - self.max_idle
+        idle = [
+            key
+            for key, session in self._sessions.items()
+            if session.last_used < deadline
+        ]
+        for key in idle:
+            await self._drop(key)
+
+    async def aclose(self) -> None:
+        """Drops all the clients and closes the connection pool."""
+        for key in list(self._sessions):
+            await self._drop(key)
+        await self.transport.aclose()
+
+    async def _create(self, account: Account) -> PSAClient:
+        client = await create_psa_client(
+            account.brand,
+            account.country_code,
+            account.email,
+            account.password,
+            self.cache_storage,
+            self.token_storage_factory(account),
+            transport=self.transport,
+            retry=self.retry,
+            rate_limiter=self.rate_limiter,
+        )
+        self._sessions[account.key] = _Session(client, self.clock())
+        while len(self._sessions) > self.max_sessions:
+            await self._drop(next(iter(self._sessions)))
+        return client
+
+    async def _drop(self, key: str) -> None:
+        session = self._sessions.pop(key, None)
+        # don't close the client, it would close the shared transport
+        if session is not None and isinstance(session.client.client, PSAOAuth2Client):
+            await session.client.client.refresher.stop()
+
+    def _memory_storage(self, account: Account) -> TokenStorage:
+        return self._token_storages.setdefault(account.key, MemoryTokenStorage())
@@ -0,0 +1,247 @@
+"""Client side rate limiting of the requests."""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import Awaitable
+from typing import Callable
+from typing import Mapping
+
+from httpx import AsyncBaseTransport
+from httpx import Request
+from httpx import Response
+
+
+@dataclass(frozen=True)
+class Rate:
+    """Sustained rate and burst size of a token bucket."""
+
+    per_second: float
+    burst: int = 1
+
+
+# the hosts are shared by the whole fleet, the accounts by their vehicles
+DEFAULT_HOST_RATES: Mapping[str, Rate] = {
+    "api.groupe-psa.com": Rate(10.0, 20),
+    "idpcvs.*": Rate(1.0, 5),
+    "mw-*-m2c.*": Rate(1.0, 5),
+}
+DEFAULT_ACCOUNT_RATE = Rate(1.0, 5)
+
+
+@dataclass
+class RateLimitStats:
+    """Rate limiter counters."""
+
+    requests: int = 0
+    delayed: int = 0
+    waited: float = 0.0
+    max_wait: float = 0.0
+
+
+class TokenBucket:
+    """
+    Token bucket that queues the requests exceeding its rate.
+
+    Every request takes a token, and the tokens are refilled at
+    `rate.per_second` up to `rate.burst`.
+    A request finding the bucket empty books the next free token and waits
+    for it, so the queued requests are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate: Rate,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: refill rate and capacity of the bucket
+            clock: monotonic time source, in seconds
+            sleep: coroutine function waiting for the given seconds
+        """
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = RateLimitStats()
+        self.waiting = 0
+        self._tokens = float(rate.burst)
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """Takes a token, returning the seconds to wait before using it."""
+        now = self.clock()
+        elapsed = now - self._updated
+        self._tokens = min(
+            self.rate.burst, self._tokens + elapsed * self.rate.per_second
+        )
+        self._updated = now
+        self._tokens -= 1
+        return max(-self._tokens / self.rate.per_second, 0.0)
+
+    async def acquire(self) -> float:
+        """Waits for a token, returning the seconds waited."""
+        delay = self.reserve()
+        self.stats.requests += 1
+        if delay <= 0:
+            return 0.0
+        self.stats.delayed += 1
+        self.stats.waited += delay
+        self.stats.max_wait = max(self.stats.max_wait, delay)
+        self.waiting += 1
+        try:
+            await self.sleep(delay)
+        except asyncio.CancelledError:
+            # give back the token, the request won't be sent
+            self._tokens += 1
+            raise
+        finally:
+            self.waiting -= 1
+        return delay
+
+
+class RateLimiter:
+    """
+    Rate limits of the requests, per account and per upstream host.
+
+    The host buckets are shared by all the accounts; each account has its
+    own bucket too, so a single busy account can't starve the others.
+    The requests over the limits are queued, never rejected.
+    """
+
+    def __init__(
+        self,
+        account_rate: Rate | None = DEFAULT_ACCOUNT_RATE,
+        host_rates: Mapping[str, Rate] = DEFAULT_HOST_RATES,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        """
+        Initialize the rate limiter.
+
+        Args:
+            account_rate: rate of each account; unlimited if None
+            host_rates: rate of each host, by host name pattern (fnmatch);
+                each host has its own bucket, and the hosts not matching
+                any pattern are unlimited
+            clock: monotonic time source, in seconds
+            sleep: coroutine function waiting for the given seconds
+        """
+        self.account_rate = account_rate
+        self.host_rates = host_rates
+        self.clock = clock
+        self.sleep = sleep
+        self._accounts: dict[str, TokenBucket] = {}
+        self._hosts: dict[str, TokenBucket | None] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of requests waiting for a token."""
+        return sum(bucket.waiting for bucket in self._buckets())
+
+    @property
+    def stats(self) -> RateLimitStats:
+        """Counters of all the buckets."""
+        total = RateLimitStats()
+        for bucket in self._buckets():
+            total.requests += bucket.stats.requests
+            total.delayed += bucket.stats.delayed
+            total.waited += bucket.stats.waited
+            total.max_wait = max(total.max_wait, bucket.stats.max_wait)
+        return total
+
+    def account_bucket(self, account: str) -> TokenBucket | None:
+        """Returns the bucket of the account, None if unlimited."""
+        if self.account_rate is None:
+            return None
+        bucket = self._accounts.get(account)
+        if bucket is None:
+            bucket = TokenBucket(self.account_rate, self.clock, self.sleep)
+            self._accounts[account] = bucket
+        return bucket
+
+    def host_bucket(self, host: str) -> TokenBucket | None:
+        """Returns the bucket of the host, None if unlimited."""
+        try:
+            return self._hosts[host]
+        except KeyError:
+            pass
+        rate = next(
+            (
+                rate
+                for pattern, rate in self.host_rates.items()
+                if fnmatch(host, pattern)
+            ),
+            None,
+        )
+        bucket = None if rate is None else TokenBucket(rate, self.clock, self.sleep)
+        self._hosts[host] = bucket
+        return bucket
+
+    async def acquire(self, account: str | None, host: str) -> float:
+        """
+        Waits until a request of the account can be sent to the host.
+
+        Args:
+            account: the account sending the request, None if anonymous
+            host: the host receiving the request
+
+        Returns:
+            The seconds waited.
+        """
+        waited = 0.0
+        account_bucket = self.account_bucket(account) if account else None
+        for bucket in (account_bucket, self.host_bucket(host)):
+            if bucket is not None:
+                waited += await bucket.acquire()
+        return waited
+
+    def forget(self, account: str) -> None:
+        """Drops the bucket of an account no longer used."""
+        self._accounts.pop(account, None)
+
+    def wrap(
+        self, transport: AsyncBaseTransport, account: str | None = None
+    ) -> RateLimitedTransport:
+        """Returns the transport sending the requests of the account."""
+        return RateLimitedTransport(transport, self, account)
+
+    def _buckets(self) -> list[TokenBucket]:
+        hosts = [bucket for bucket in self._hosts.values() if bucket is not None]
+        return [*self._accounts.values(), *hosts]
+
+
+class RateLimitedTransport(AsyncBaseTransport):
+    """HTTP transport waiting for the rate limiter before each request."""
+
+    def __init__(
+        self,
+        transport: AsyncBaseTransport,
+        limiter: RateLimiter,
+        account: str | None = None,
+    ) -> None:
+        """
+        Initialize the transport.
+
+        Args:
+            transport: the transport sending the requests
+            limiter: the rate limiter, usually shared by many transports
+            account: the account sending the requests
+        """
+        self.transport = transport
+        self.limiter = limiter
+        self.account = account
+
+    async def handle_async_request(self, request: Request) -> Response:
+        """Sends the request as soon as the rate limits allow it."""
+        await self.limiter.acquire(self.account, request.url.host)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        """Closes the wrapped transport."""
+        await self.transport.aclose()
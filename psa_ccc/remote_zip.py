@@ -0,0 +1,213 @@
+"""Reader of single entries of a remote ZIP file, using HTTP range requests."""
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+import struct
+import zipfile
+import zlib
+from dataclasses import dataclass
+from typing import Iterable
+
+from httpx import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+_EOCD = struct.Struct("<4s4H2LH")
+_EOCD_SIGNATURE = b"PK\x05\x06"
+_CENTRAL_ENTRY = struct.Struct("<4s6H3L5H2L")
+_CENTRAL_SIGNATURE = b"PK\x01\x02"
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+# end of central directory record, plus the longest archive comment
+_TAIL_SIZE = _EOCD.size + 0xFFFF
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+
+class RangeNotSupportedError(Exception):
+    """The server ignored the Range header and sent the whole file."""
+
+    def __init__(self, content: bytes) -> None:
+        """Initialize the error with the contents of the whole file."""
+        super().__init__("range requests not supported")
+        self.content = content
+
+
+@dataclass
+class RemoteZipEntry:
+    """Location of an entry in the remote ZIP file."""
+
+    name: str
+    method: int
+    crc: int
+    compressed_size: int
+    size: int
+    header_offset: int
+    end_offset: int
+
+
+class RemoteZip:
+    """
+    ZIP file served over HTTP, whose entries are downloaded on demand.
+
+    Only the central directory and the byte ranges of the requested
+    entries are downloaded; if the server doesn't support range requests,
+    the whole file is downloaded once and the entries are read from memory.
+    Use `RemoteZip.open` to create it.
+    """
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        url: str,
+        entries: dict[str, RemoteZipEntry],
+        archive: zipfile.ZipFile | None = None,
+    ) -> None:
+        """
+        Initialize the reader.
+
+        Args:
+            client: async http client
+            url: URL of the ZIP file
+            entries: entries listed in the central directory
+            archive: whole ZIP file, if the server doesn't support ranges
+        """
+        self.client = client
+        self.url = url
+        self.entries = entries
+        self.archive = archive
+        self.downloaded = 0
+
+    @classmethod
+    async def open(cls, client: AsyncClient, url: str) -> RemoteZip:
+        """
+        Downloads the central directory of the remote ZIP file.
+
+        Args:
+            client: async http client
+            url: URL of the ZIP file
+
+        Returns:
+            The remote ZIP reader.
+        """
+        try:
+            tail, size = await _get_range(client, url, f"-{_TAIL_SIZE}")
+        except RangeNotSupportedError as err:
+            logger.warning("%s doesn't support range requests", url)
+            archive = zipfile.ZipFile(io.BytesIO(err.content))
+            remote_zip = cls(client, url, {}, archive)
+            remote_zip.downloaded = len(err.content)
+            return remote_zip
+        eocd = tail.rfind(_EOCD_SIGNATURE)
+        if eocd < 0:
+            raise zipfile.BadZipFile("end of central directory not found")
+        *_, count, directory_size, directory_offset, _ = _EOCD.unpack_from(tail, eocd)
+        if _ZIP64_LIMIT in (directory_size, directory_offset):
+            raise zipfile.BadZipFile("ZIP64 files are not supported")
+        downloaded = len(tail)
+        tail_offset = size - len(tail)
+        if size >= 0 and directory_offset >= tail_offset:
+            start = directory_offset - tail_offset
+            directory = tail[start : start + directory_size]
+        else:
+            last = directory_offset + directory_size - 1
+            directory, _ = await _get_range(client, url, f"{directory_offset}-{last}")
+            downloaded += len(directory)
+        entries = _parse_central_directory(directory, count, directory_offset)
+        remote_zip = cls(client, url, entries)
+        remote_zip.downloaded = downloaded
+        return remote_zip
+
+    def namelist(self) -> list[str]:
+        """Returns the names of the entries."""
+        if self.archive is not None:
+            return self.archive.namelist()
+        return list(self.entries)
+
+    async def read(self, name: str) -> bytes:
+        """
+        Downloads and decompresses an entry.
+
+        Args:
+            name: name of the entry
+
+        Returns:
+            Contents of the entry.
+        """
+        if self.archive is not None:
+            return self.archive.read(name)
+        entry = self.entries[name]
+        data, _ = await _get_range(
+            self.client, self.url, f"{entry.header_offset}-{entry.end_offset - 1}"
+        )
+        self.downloaded += len(data)
+        return _decompress(entry, data)
+
+    async def read_many(self, names: Iterable[str]) -> dict[str, bytes]:
+        """Downloads the given entries concurrently."""
+        names = list(names)
+        contents = await asyncio.gather(*(self.read(name) for name in names))
+        return dict(zip(names, contents, strict=True))
+
+
+async def _get_range(
+    client: AsyncClient, url: str, byte_range: str
+) -> tuple[bytes, int]:
+    """Returns the requested bytes and the total size of the file."""
+    response = await client.get(
+        url, headers={"Range": f"bytes={byte_range}"}, follow_redirects=True
+    )
+    response.raise_for_status()
+    if response.status_code != 206:
+        raise RangeNotSupportedError(response.content)
+    total = response.headers.get("Content-Range", "").rpartition("/")[2]
+    return response.content, int(total) if total.isdigit() else -1
+
+
+def _parse_central_directory(
+    directory: bytes, count: int, directory_offset: int
+) -> dict[str, RemoteZipEntry]:
+    entries = []
+    position = 0
+    for _ in range(count):
+        fields = _CENTRAL_ENTRY.unpack_from(directory, position)
+        if fields[0] != _CENTRAL_SIGNATURE:
+            raise zipfile.BadZipFile("bad central directory entry")
+        flags, method = fields[3:5]
+        crc, compressed_size, size, name_length, extra_length, comment_length = fields[
+            7:13
+        ]
+        header_offset = fields[16]
+        start = position + _CENTRAL_ENTRY.size
+        encoding = "utf-8" if flags & 0x800 else "cp437"
+        name = directory[start : start + name_length].decode(encoding)
+        entries.append(
+            RemoteZipEntry(name, method, crc, compressed_size, size, header_offset, 0)
+        )
+        position = start + name_length + extra_length + comment_length
+    # an entry ends where the next one begins
+    entries.sort(key=lambda entry: entry.header_offset)
+    ends = [entry.header_offset for entry in entries[1:]] + [directory_offset]
+    for entry, end in zip(entries, ends, strict=True):
+        entry.end_offset = end
+    return {entry.name: entry for entry in entries}
+
+
+def _decompress(entry: RemoteZipEntry, data: bytes) -> bytes:
+    fields = _LOCAL_HEADER.unpack_from(data)
+    if fields[0] != _LOCAL_SIGNATURE:
+        raise zipfile.BadZipFile(f"bad local header for {entry.name}")
+    start = _LOCAL_HEADER.size + fields[9] + fields[10]
+    compressed = data[start : start + entry.compressed_size]
+    if entry.method == zipfile.ZIP_STORED:
+        contents = compressed
+    elif entry.method == zipfile.ZIP_DEFLATED:
+        contents = zlib.decompressobj(-zlib.MAX_WBITS).decompress(compressed)
+    else:
+        raise zipfile.BadZipFile(
+            f"unsupported compression method {entry.method} for {entry.name}"
+        )
+    if zlib.crc32(contents) != entry.crc:
+        raise zipfile.BadZipFile(f"bad CRC for {entry.name}")
+    return contents
@@ -0,0 +1,149 @@
+"""Retry of the failed API requests."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable
+from typing import Callable
+from typing import FrozenSet
+
+from httpx import Response
+from httpx import TransportError
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass
+class RetryStats:
+    """Retry counters."""
+
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    waited: float = 0.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses the value of a Retry-After header.
+
+    Args:
+        value: number of seconds or HTTP date
+
+    Returns:
+        The seconds to wait, None if missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+@dataclass(kw_only=True)
+class RetryPolicy:
+    """
+    Retries the requests failed with a transient error.
+
+    The delays grow exponentially with "full jitter" (a random delay between
+    zero and the exponential backoff), so the clients of a fleet failing
+    together don't retry all at once.
+    A Retry-After header sent by the server is honoured, plus a small jitter.
+    No retry is attempted if it would end after the `deadline`.
+    Only use it for idempotent requests.
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    deadline: float | None = 60.0
+    retry_statuses: FrozenSet[int] = RETRY_STATUSES
+    retry_transport_errors: bool = True
+    stats: RetryStats = field(default_factory=RetryStats)
+    jitter: Callable[[], float] = field(default=random.random, repr=False)
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    sleep: Callable[[float], Awaitable[None]] = field(default=asyncio.sleep, repr=False)
+
+    def backoff(self, retry: int) -> float:
+        """Returns the jittered delay before the given retry (starting at 0)."""
+        return self.jitter() * min(self.max_delay, self.base_delay * 2**retry)
+
+    def get_delay(self, retry: int, response: Response) -> float:
+        """
+        Returns the delay before the given retry.
+
+        Args:
+            retry: number of retries already done
+            response: the failed response
+
+        Returns:
+            The Retry-After of the response, if any, or the backoff delay.
+        """
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return retry_after + self.jitter() * self.base_delay
+        return self.backoff(retry)
+
+    async def send(self, request: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        Sends the request, retrying it on transient errors.
+
+        Args:
+            request: sends the request and returns its response
+
+        Returns:
+            The first successful response, or the last failed one when giving up.
+
+        Raises:
+            TransportError: if the last attempt failed with a transport error
+        """
+        start = self.clock()
+        retry = 0
+        while True:
+            self.stats.requests += 1
+            try:
+                response = await request()
+            except TransportError:
+                delay = self.backoff(retry)
+                if not self.retry_transport_errors or not self._can_retry(
+                    retry, start, delay
+                ):
+                    self.stats.failures += 1
+                    raise
+                logger.debug("Retrying after a transport error in %.2fs", delay)
+            else:
+                if response.status_code not in self.retry_statuses:
+                    return response
+                delay = self.get_delay(retry, response)
+                if not self._can_retry(retry, start, delay):
+                    self.stats.failures += 1
+                    return response
+                logger.debug(
+                    "Retrying after status %d in %.2fs", response.status_code, delay
+                )
+            retry += 1
+            self.stats.retries += 1
+            self.stats.waited += delay
+            await self.sleep(delay)
+
+    def _can_retry(self, retry: int, start: float, delay: float) -> bool:
+        if retry + 1 >= self.max_attempts:
+            return False
+        return self.deadline is None or self.clock() + delay - start <= self.deadline
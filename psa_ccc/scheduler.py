@@ -0,0 +1,235 @@
+"""Adaptive polling of the vehicle status."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+
+import psa_ccc.models as mdl
+from psa_ccc.client import ApiError
+from psa_ccc.client import FleetStatusResult
+
+logger = logging.getLogger(__name__)
+
+_STARTED = {"Start", "StartUp"}
+_CHARGING = "InProgress"
+
+
+class VehicleActivity(str, Enum):
+    """What the vehicle is doing, as far as polling is concerned."""
+
+    DRIVING = "Driving"
+    CHARGING = "Charging"
+    STARTED = "Started"
+    PARKED = "Parked"
+
+
+def is_started(status: mdl.VehicleStatus) -> bool:
+    """Returns True if the ignition of the vehicle is on."""
+    return status.ignition is not None and status.ignition.type in _STARTED
+
+
+def get_activity(status: mdl.VehicleStatus) -> VehicleActivity:
+    """Returns the activity of the vehicle from its status."""
+    if status.kinetic.moving:
+        return VehicleActivity.DRIVING
+    for energy in status.energies:
+        electric = energy.extension.electric if energy.extension else None
+        if electric and electric.charging and electric.charging.status == _CHARGING:
+            return VehicleActivity.CHARGING
+    if is_started(status):
+        return VehicleActivity.STARTED
+    return VehicleActivity.PARKED
+
+
+@dataclass(frozen=True)
+class PollIntervals:
+    """Seconds between two status requests, by vehicle activity."""
+
+    driving: float = 30.0
+    charging: float = 120.0
+    started: float = 60.0
+    parked: float = 900.0
+    error: float = 300.0
+
+    def get(self, activity: VehicleActivity) -> float:
+        """Returns the interval for the given activity."""
+        return {
+            VehicleActivity.DRIVING: self.driving,
+            VehicleActivity.CHARGING: self.charging,
+            VehicleActivity.STARTED: self.started,
+            VehicleActivity.PARKED: self.parked,
+        }[activity]
+
+
+DEFAULT_INTERVALS = PollIntervals()
+
+
+class PollScheduler:
+    """
+    Polls the status of many vehicles, each at its own pace.
+
+    The interval of each vehicle is chosen from its last status: short while
+    driving or charging, long while parked.
+    The next polls are kept in a heap, so a single task serves thousands of
+    vehicles; the first polls are spread over `spread` seconds, and every
+    interval is shortened by a random `jitter` fraction, so the polls of
+    vehicles added together drift apart instead of coming in bursts.
+    The next poll of a vehicle is scheduled once `on_result` returns, so a
+    slow consumer slows down the polls instead of piling them up.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[mdl.VehicleStatus]],
+        on_result: Callable[[FleetStatusResult], Awaitable[None]],
+        intervals: PollIntervals = DEFAULT_INTERVALS,
+        concurrency: int = 10,
+        spread: float | None = None,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        """
+        Initialize the scheduler.
+
+        Args:
+            fetch: returns the status of the vehicle with the given ID,
+                e.g. `PSAClient.get_vehicle_status`
+            on_result: called with the status or the error of every poll
+            intervals: seconds between two polls, by vehicle activity
+            concurrency: maximum number of polls in flight
+            spread: seconds over which the first polls are spread;
+                the driving interval if None
+            jitter: maximum fraction by which an interval is shortened
+            clock: monotonic time source, in seconds
+            sleep: coroutine function waiting for the given seconds
+        """
+        self.fetch = fetch
+        self.on_result = on_result
+        self.intervals = intervals
+        self.concurrency = concurrency
+        self.spread = intervals.driving if spread is None else spread
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.activities: dict[str, VehicleActivity] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        # heap entry of each vehicle, None while polling
+        self._entries: dict[str, tuple[float, int, str] | None] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        """Number of vehicles polled."""
+        return len(self._entries)
+
+    def __contains__(self, vehicle_id: object) -> bool:
+        """Returns True if the vehicle is polled."""
+        return vehicle_id in self._entries
+
+    def add(self, vehicle_ids: Iterable[str]) -> None:
+        """Starts polling the vehicles, spreading their first polls."""
+        now = self.clock()
+        for vehicle_id in vehicle_ids:
+            if vehicle_id not in self._entries:
+                delay = random.random() * self.spread  # noqa S311
+                self._schedule(vehicle_id, now + delay)
+
+    def remove(self, vehicle_id: str) -> None:
+        """Stops polling the vehicle; its pending entry is skipped later."""
+        self._entries.pop(vehicle_id, None)
+        self.activities.pop(vehicle_id, None)
+
+    def poll_now(self, vehicle_id: str) -> None:
+        """Polls the vehicle as soon as possible, unless already in flight."""
+        if vehicle_id in self._entries and self._entries[vehicle_id] is not None:
+            self._schedule(vehicle_id, self.clock())
+
+    def next_poll(self, vehicle_id: str) -> float | None:
+        """Returns the time of the next poll of the vehicle, None if in flight."""
+        entry = self._entries[vehicle_id]
+        return None if entry is None else entry[0]
+
+    async def run(self) -> None:
+        """Polls the vehicles until cancelled."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while True:
+                self._wakeup.clear()
+                for vehicle_id in self._pop_due():
+                    await semaphore.acquire()
+                    task = asyncio.create_task(self._poll(vehicle_id, semaphore))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                await self._wait()
+        finally:
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _wait(self) -> None:
+        """Waits for the next due poll, or for an earlier one to be scheduled."""
+        wakeup = asyncio.ensure_future(self._wakeup.wait())
+        waiters: set[asyncio.Future[Any]] = {wakeup}
+        if self._heap:
+            delay = max(self._heap[0][0] - self.clock(), 0.0)
+            waiters.add(asyncio.ensure_future(self.sleep(delay)))
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def _schedule(self, vehicle_id: str, due: float) -> None:
+        entry = (due, next(self._counter), vehicle_id)
+        self._entries[vehicle_id] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def _pop_due(self) -> list[str]:
+        now = self.clock()
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            vehicle_id = entry[2]
+            # stale entries of removed or rescheduled vehicles
+            if self._entries.get(vehicle_id) is entry:
+                self._entries[vehicle_id] = None
+                due_ids.append(vehicle_id)
+        return due_ids
+
+    async def _poll(self, vehicle_id: str, semaphore: asyncio.Semaphore) -> None:
+        try:
+            try:
+                status = await self.fetch(vehicle_id)
+            except (Exception, ApiError) as err:
+                result = FleetStatusResult(vehicle_id, error=err)
+                interval = self.intervals.error
+            else:
+                result = FleetStatusResult(vehicle_id, status=status)
+                activity = get_activity(status)
+                interval = self.intervals.get(activity)
+                if vehicle_id in self._entries:
+                    self.activities[vehicle_id] = activity
+        finally:
+            semaphore.release()
+        try:
+            await self.on_result(result)
+        except Exception:
+            logger.exception("Error handling the status of %s", vehicle_id)
+        if vehicle_id in self._entries and self._entries[vehicle_id] is None:
+            interval *= 1 - random.random() * self.jitter  # noqa S311
+            self._schedule(vehicle_id, self.clock() + interval)
@@ -0,0 +1,124 @@
+"""SQLite token storage."""
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from contextlib import closing
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any
+from typing import AsyncIterator
+from typing import ContextManager
+
+from authlib.oauth2.rfc6749 import OAuth2Token
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    account TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class SQLiteTokenStorage:
+    """
+    Store the tokens of many accounts in a SQLite database.
+
+    Worker processes can share the same database, SQLite takes care of
+    the locking; `lock` holds a write transaction while the token is
+    refreshed.
+    """
+
+    def __init__(self, path: Path, account: str, timeout: float = 30) -> None:
+        """
+        Initialize the token storage.
+
+        Args:
+            path: path of the database file
+            account: key of the account whose token is stored
+            timeout: seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.account = account
+        self.timeout = timeout
+        self._initialized = False
+        # connection of the transaction held by `lock`
+        self._connection: sqlite3.Connection | None = None
+        self._holder = asyncio.Lock()
+
+    async def load(
+        self, access_token: str | None = None, refresh_token: str | None = None
+    ) -> OAuth2Token:
+        """Load the token from storage."""
+        token = await asyncio.to_thread(self._load)
+        return None if token is None else OAuth2Token(json.loads(token))
+
+    async def save(self, token: OAuth2Token) -> None:
+        """Save the token."""
+        await asyncio.to_thread(self._save, json.dumps(dict(token)))
+
+    @asynccontextmanager
+    async def lock(self) -> AsyncIterator[None]:
+        """Holds a write transaction, serializing the token refresh between processes."""
+        async with self._holder:
+            connection = await asyncio.to_thread(self._begin)
+            self._connection = connection
+            try:
+                yield
+            except BaseException:
+                await asyncio.to_thread(self._end, connection, "ROLLBACK")
+                raise
+            else:
+                await asyncio.to_thread(self._end, connection, "COMMIT")
+            finally:
+                self._connection = None
+
+    def _begin(self) -> sqlite3.Connection:
+        connection = self._connect(isolation_level=None, check_same_thread=False)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def _end(connection: sqlite3.Connection, statement: str) -> None:
+        with closing(connection):
+            connection.execute(statement)
+
+    def _connection_for(self) -> ContextManager[sqlite3.Connection]:
+        if self._connection is not None:
+            return nullcontext(self._connection)
+        return closing(self._connect())
+
+    def _connect(self, **kwargs: Any) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=self.timeout, **kwargs)
+        if not self._initialized:
+            with connection:
+                connection.execute(_SCHEMA)
+            self._initialized = True
+        return connection
+
+    def _load(self) -> str | None:
+        with self._connection_for() as connection:
+            row = connection.execute(
+                "SELECT token FROM tokens WHERE account = ?", (self.account,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def _save(self, token: str) -> None:
+        statement = (
+            "INSERT OR REPLACE INTO tokens (account, token, updated_at) "
+            "VALUES (?, ?, ?)"
+        )
+        if self._connection is not None:
+            # committed when `lock` is released
+            self._connection.execute(statement, (self.account, token, time.time()))
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.execute(statement, (self.account, token, time.time()))
@@ -1,9 +1,74 @@
 """Storage Handler."""
 from __future__ import annotations
 
+import asyncio
+import inspect
+import json
+import os
+from contextlib import contextmanager
+from contextlib import suppress
 from hashlib import sha1
 from pathlib import Path
+from tempfile import NamedTemporaryFile
+from tempfile import TemporaryFile
+from typing import IO
+from typing import Any
+from typing import AsyncIterable
+from typing import ContextManager
+from typing import Iterator
 from typing import Protocol
+from typing import Union
+from typing import cast
+from typing import runtime_checkable
+
+
+@contextmanager
+def atomic_writer(path: Path) -> Iterator[IO[bytes]]:
+    """
+    Opens a temporary file, moved over the given path on success.
+
+    The temporary file is in the same directory of the path, so the move
+    is atomic; it is deleted if the block raises an exception.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", delete=False)
+    try:
+        with tmp:
+            yield tmp
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp.name)
+        raise
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Writes the data to a temporary file, then moves it over the given path."""
+    with atomic_writer(path) as file:
+        file.write(data)
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _blob_digest(size: int) -> Any:
+    """Returns a SHA1 digest of a git blob of the given size, to be updated."""
+    return sha1(f"blob {size}\u0000".encode("utf-8"))  # noqa S324
+
+
+def git_blob_sha(path: Path, chunk_size: int = _CHUNK_SIZE) -> str:
+    """Returns the git blob SHA of a file, reading it in chunks."""
+    with path.open("rb") as file:
+        return _read_blob_sha(file, path.stat().st_size, chunk_size)
+
+
+def _read_blob_sha(file: IO[bytes], size: int, chunk_size: int = _CHUNK_SIZE) -> str:
+    digest = _blob_digest(size)
+    while chunk := file.read(chunk_size):
+        digest.update(chunk)
+    return str(digest.hexdigest())
 
 
 class CacheStorage(Protocol):
@@ -25,6 +90,39 @@ class CacheStorage(Protocol):
         """Save the data to the given file."""
 
 
+@runtime_checkable
+class StreamingCacheStorage(CacheStorage, Protocol):
+    """Storage cache whose files can be written in chunks."""
+
+    def writer(self, filename: str) -> ContextManager[IO[bytes]]:
+        """
+        Opens the file for writing, saved when the block exits without errors.
+
+        The file is open for reading too, so what was written can be read
+        back before saving it.
+        """
+
+
+def open_writer(storage: CacheStorage, filename: str) -> ContextManager[IO[bytes]]:
+    """
+    Opens a file of the storage for writing, like `StreamingCacheStorage.writer`.
+
+    Storages without a `writer` get a temporary file instead, whose contents
+    are passed to their `save` method when the block exits without errors.
+    """
+    if isinstance(storage, StreamingCacheStorage):
+        return storage.writer(filename)
+    return _spooled_writer(storage, filename)
+
+
+@contextmanager
+def _spooled_writer(storage: CacheStorage, filename: str) -> Iterator[IO[bytes]]:
+    with TemporaryFile() as file:
+        yield file
+        file.seek(0)
+        storage.save(file.read(), filename)
+
+
 class SimpleCacheStorage:
     """Simple file storage implementation."""
 
@@ -47,13 +145,164 @@ class SimpleCacheStorage:
         raise FileNotFoundError(filename)
 
     def get_sha(self, filename: str) -> str:
-        """Returns the SHA of the given file."""
-        data = self.read(filename)
-        prefix = f"blob {len(data)}\u0000"
-        return sha1(prefix.encode("utf-8") + data).hexdigest()  # noqa S324
+        """
+        Returns the SHA of the given file.
+
+        The SHA is remembered in a sidecar file along with the size, the
+        modification time and the inode of the file, so it is computed
+        again only if the file changes.
+        """
+        path = self.get_full_path(filename)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(filename) from None
+        key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        sidecar = self.cache_directory.joinpath(".sha", f"{filename}.json")
+        with suppress(FileNotFoundError, KeyError, TypeError, ValueError):
+            cached = json.loads(sidecar.read_bytes())
+            if cached["key"] == key:
+                return str(cached["sha"])
+        sha = git_blob_sha(path)
+        # don't remember the SHA of a file changed while hashing it
+        stat = path.stat()
+        if key == [stat.st_size, stat.st_mtime_ns, stat.st_ino]:
+            atomic_write(sidecar, json.dumps({"key": key, "sha": sha}).encode())
+        return sha
 
     def save(self, data: bytes, filename: str) -> None:
+        """Save the data to the given file, atomically."""
+        atomic_write(self.get_full_path(filename), data)
+
+    def writer(self, filename: str) -> ContextManager[IO[bytes]]:
+        """Opens the file for writing, saved atomically when the block exits."""
+        return atomic_writer(self.get_full_path(filename))
+
+
+class AsyncCacheStorage(Protocol):
+    """Storage cache interface, with non-blocking I/O."""
+
+    def get_full_path(self, filename: str) -> Path:
+        """Returns the full path of the given filename."""
+
+    async def exists(self, filename: str) -> bool:
+        """Returns True if the given filename exists."""
+
+    async def read(self, filename: str) -> bytes:
+        """Reads the contents of the file."""
+
+    async def get_sha(self, filename: str) -> str:
+        """Returns the SHA of the given file."""
+
+    async def save(self, data: bytes, filename: str) -> None:
+        """Save the data to the given file."""
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        filename: str,
+        sha: str | None = None,
+        size: int | None = None,
+    ) -> None:
+        """
+        Save the chunks to the given file, if their git blob SHA matches.
+
+        Args:
+            chunks: contents of the file
+            filename: name of the file
+            sha: expected git blob SHA of the contents; not verified if None
+            size: size of the contents, if known, to verify the SHA while
+                writing instead of reading the file again
+
+        Raises:
+            ValueError: if the SHA doesn't match; the file is left unchanged.
+        """
+
+
+AnyCacheStorage = Union[CacheStorage, AsyncCacheStorage]
+
+
+class ThreadedCacheStorage:
+    """Async adapter of a storage cache, running its I/O in a worker thread."""
+
+    def __init__(self, storage: CacheStorage) -> None:
+        """Wraps the given synchronous storage."""
+        self.storage = storage
+
+    def get_full_path(self, filename: str) -> Path:
+        """Returns the full path of the given filename."""
+        return self.storage.get_full_path(filename)
+
+    async def exists(self, filename: str) -> bool:
+        """Returns True if the given filename exists."""
+        return await asyncio.to_thread(self.storage.exists, filename)
+
+    async def read(self, filename: str) -> bytes:
+        """Reads the contents of the file."""
+        return await asyncio.to_thread(self.storage.read, filename)
+
+    async def get_sha(self, filename: str) -> str:
+        """Returns the SHA of the given file."""
+        return await asyncio.to_thread(self.storage.get_sha, filename)
+
+    async def save(self, data: bytes, filename: str) -> None:
         """Save the data to the given file."""
-        full_path = self.get_full_path(filename)
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-        full_path.write_bytes(data)
+        await asyncio.to_thread(self.storage.save, data, filename)
+
+    async def save_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        filename: str,
+        sha: str | None = None,
+        size: int | None = None,
+    ) -> None:
+        """Save the chunks to the given file, if their git blob SHA matches."""
+        # opening, syncing and moving the file block too, like the writes
+        writer = open_writer(self.storage, filename)
+        file = await asyncio.to_thread(writer.__enter__)
+        try:
+            digest = None if size is None else _blob_digest(size)
+            written = 0
+            async for chunk in chunks:
+                await asyncio.to_thread(_write, file, chunk, digest)
+                written += len(chunk)
+            if sha is not None:
+                if digest is not None and written == size:
+                    actual = str(digest.hexdigest())
+                else:
+                    actual = await asyncio.to_thread(_read_back_sha, file, written)
+                if actual != sha:
+                    raise ValueError(f"SHA mismatch for {filename}: {actual} != {sha}")
+        except BaseException as err:
+            exc_info = (type(err), err, err.__traceback__)
+            if not await asyncio.to_thread(writer.__exit__, *exc_info):
+                raise
+        else:
+            await asyncio.to_thread(writer.__exit__, None, None, None)
+
+
+def _write(file: IO[bytes], chunk: bytes, digest: Any) -> None:
+    file.write(chunk)
+    if digest is not None:
+        digest.update(chunk)
+
+
+def _read_back_sha(file: IO[bytes], size: int) -> str:
+    file.flush()
+    file.seek(0)
+    return _read_blob_sha(file, size)
+
+
+def ensure_async_storage(storage: AnyCacheStorage) -> AsyncCacheStorage:
+    """
+    Returns an async storage cache, wrapping a synchronous one if needed.
+
+    Args:
+        storage: synchronous or asynchronous storage cache
+
+    Returns:
+        The storage itself if asynchronous, a `ThreadedCacheStorage` otherwise.
+    """
+    if inspect.iscoroutinefunction(storage.read):
+        return cast(AsyncCacheStorage, storage)
+    return ThreadedCacheStorage(cast(CacheStorage, storage))
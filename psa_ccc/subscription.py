@@ -0,0 +1,256 @@
+"""Streaming of the vehicle status to many consumers."""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+from enum import Enum
+from types import TracebackType
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+
+import psa_ccc.models as mdl
+from psa_ccc.client import FleetStatusResult
+from psa_ccc.scheduler import DEFAULT_INTERVALS
+from psa_ccc.scheduler import PollIntervals
+from psa_ccc.scheduler import PollScheduler
+
+
+class BackpressurePolicy(str, Enum):
+    """What to do when a subscriber doesn't keep up with the updates."""
+
+    DROP_OLDEST = "drop_oldest"
+    COALESCE_LATEST = "coalesce_latest"
+    BLOCK = "block"
+
+
+@dataclass
+class SubscriptionStats:
+    """Subscription counters."""
+
+    received: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+
+
+class Subscription:
+    """
+    Updates of some vehicles, consumed as an async iterator.
+
+    At most `maxsize` updates are queued; when the queue is full:
+
+    - `DROP_OLDEST` drops the oldest update;
+    - `COALESCE_LATEST` keeps only the latest update of each vehicle,
+      so an update replaces the one of the same vehicle still queued;
+    - `BLOCK` makes the poller wait until there is room, slowing down the
+      updates of these vehicles for every subscriber.
+    """
+
+    def __init__(
+        self,
+        hub: StatusHub,
+        vehicle_ids: frozenset[str],
+        maxsize: int,
+        policy: BackpressurePolicy,
+        initial: Iterable[FleetStatusResult] = (),
+    ) -> None:
+        """
+        Initialize the subscription; use `StatusHub.subscribe` instead.
+
+        Args:
+            hub: the hub sending the updates
+            vehicle_ids: IDs of the subscribed vehicles
+            maxsize: maximum number of queued updates
+            policy: what to do when the queue is full
+            initial: updates queued right away
+        """
+        self.hub = hub
+        self.vehicle_ids = vehicle_ids
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = SubscriptionStats()
+        self.closed = False
+        # with COALESCE_LATEST, the latest update of each vehicle, in order
+        self._items: deque[FleetStatusResult] | OrderedDict[str, FleetStatusResult]
+        if policy == BackpressurePolicy.COALESCE_LATEST:
+            self._items = OrderedDict()
+        else:
+            self._items = deque()
+        self._condition = asyncio.Condition()
+        for result in initial:
+            if len(self._items) < maxsize:
+                self._append(result)
+
+    def __aiter__(self) -> AsyncIterator[FleetStatusResult]:
+        """Returns the iterator over the updates."""
+        return self
+
+    async def __anext__(self) -> FleetStatusResult:
+        """Waits for the next update."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._items or self.closed)
+            if not self._items:
+                raise StopAsyncIteration
+            if isinstance(self._items, OrderedDict):
+                _, result = self._items.popitem(last=False)
+            else:
+                result = self._items.popleft()
+            self._condition.notify_all()
+        return result
+
+    async def __aenter__(self) -> Subscription:
+        """Returns the subscription itself."""
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Closes the subscription."""
+        await self.aclose()
+
+    @property
+    def pending(self) -> int:
+        """Number of queued updates."""
+        return len(self._items)
+
+    async def put(self, result: FleetStatusResult) -> None:
+        """Queues an update, following the backpressure policy."""
+        async with self._condition:
+            if self.policy == BackpressurePolicy.BLOCK:
+                await self._condition.wait_for(
+                    lambda: len(self._items) < self.maxsize or self.closed
+                )
+            if self.closed:
+                return
+            self.stats.received += 1
+            if (
+                isinstance(self._items, OrderedDict)
+                and result.vehicle_id in self._items
+            ):
+                self._items[result.vehicle_id] = result
+                self.stats.coalesced += 1
+                return
+            if len(self._items) >= self.maxsize:
+                self._drop_oldest()
+            self._append(result)
+            self._condition.notify_all()
+
+    async def aclose(self) -> None:
+        """Stops the updates; the queued ones can still be consumed."""
+        if self.closed:
+            return
+        self.closed = True
+        self.hub.unsubscribe(self)
+        async with self._condition:
+            self._condition.notify_all()
+
+    def _append(self, result: FleetStatusResult) -> None:
+        if isinstance(self._items, OrderedDict):
+            self._items[result.vehicle_id] = result
+        else:
+            self._items.append(result)
+
+    def _drop_oldest(self) -> None:
+        if isinstance(self._items, OrderedDict):
+            self._items.popitem(last=False)
+        else:
+            self._items.popleft()
+        self.stats.dropped += 1
+
+
+class StatusHub:
+    """
+    Shared poller of the vehicle status, streaming it to many subscribers.
+
+    Each vehicle is polled once, by a `PollScheduler`, however many
+    subscribers want it, and only while at least one of them does; a new
+    subscriber immediately gets the last known status of its vehicles,
+    so adding a consumer doesn't add API traffic.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[mdl.VehicleStatus]],
+        intervals: PollIntervals = DEFAULT_INTERVALS,
+        concurrency: int = 10,
+    ) -> None:
+        """
+        Initialize the hub.
+
+        Args:
+            fetch: returns the status of the vehicle with the given ID,
+                e.g. `PSAClient.get_vehicle_status`
+            intervals: seconds between two polls, by vehicle activity
+            concurrency: maximum number of polls in flight
+        """
+        self.scheduler = PollScheduler(fetch, self._dispatch, intervals, concurrency)
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._latest: dict[str, FleetStatusResult] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def subscribe(
+        self,
+        vehicle_ids: Iterable[str],
+        maxsize: int = 100,
+        policy: BackpressurePolicy = BackpressurePolicy.DROP_OLDEST,
+    ) -> Subscription:
+        """
+        Subscribes to the updates of the vehicles.
+
+        Args:
+            vehicle_ids: IDs of the vehicles
+            maxsize: maximum number of queued updates
+            policy: what to do when the queue is full
+
+        Returns:
+            The updates of the vehicles, as an async iterator.
+        """
+        ids = frozenset(vehicle_ids)
+        latest = [
+            self._latest[vehicle_id] for vehicle_id in ids if vehicle_id in self._latest
+        ]
+        subscription = Subscription(self, ids, maxsize, policy, latest)
+        for vehicle_id in ids:
+            self._subscribers.setdefault(vehicle_id, set()).add(subscription)
+        self.scheduler.add(subscription.vehicle_ids)
+        if self._task is None:
+            self._task = asyncio.create_task(self.scheduler.run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Removes the subscription, stopping the polls nobody wants."""
+        for vehicle_id in subscription.vehicle_ids:
+            subscribers = self._subscribers.get(vehicle_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[vehicle_id]
+                self._latest.pop(vehicle_id, None)
+                self.scheduler.remove(vehicle_id)
+
+    async def aclose(self) -> None:
+        """Closes all the subscriptions and stops polling."""
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                await subscription.aclose()
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _dispatch(self, result: FleetStatusResult) -> None:
+        subscribers = self._subscribers.get(result.vehicle_id)
+        if not subscribers:
+            return
+        if result.status is not None:
+            self._latest[result.vehicle_id] = result
+        await asyncio.gather(*(sub.put(result) for sub in list(subscribers)))
@@ -0,0 +1,229 @@
+"""Trips rebuilt from the vehicle status history."""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Iterable
+from typing import List
+from typing import NamedTuple
+
+import psa_ccc.models as mdl
+from psa_ccc.history import COLUMNS
+from psa_ccc.history import HistoryFrame
+from psa_ccc.history import get_sample
+from psa_ccc.scheduler import is_started
+
+
+class TripPoint(NamedTuple):
+    """Where and when a trip starts or ends."""
+
+    timestamp: float
+    mileage: float
+    level: float
+    latitude: float
+    longitude: float
+
+
+@dataclass(slots=True)
+class Trip:
+    """Trip of a vehicle, between two points."""
+
+    vehicle_id: str
+    start: TripPoint
+    end: TripPoint
+
+    @property
+    def distance(self) -> float:
+        """Kilometers driven, according to the odometer."""
+        return self.end.mileage - self.start.mileage
+
+    @property
+    def duration(self) -> float:
+        """Duration of the trip, in seconds."""
+        return self.end.timestamp - self.start.timestamp
+
+    @property
+    def energy_used(self) -> float:
+        """Drop of the energy level, in percentage points."""
+        return self.start.level - self.end.level
+
+
+def is_driving(status: mdl.VehicleStatus) -> bool:
+    """Returns True if the vehicle is moving or its ignition is on."""
+    return status.kinetic.moving or is_started(status)
+
+
+def get_point(status: mdl.VehicleStatus, timestamp: float | None = None) -> TripPoint:
+    """Returns the trip point of a status, timed as in the history."""
+    sample = dict(zip(COLUMNS, get_sample(status, timestamp), strict=True))
+    return TripPoint(
+        sample["timestamp"],
+        sample["mileage"],
+        sample["level"],
+        sample["latitude"],
+        sample["longitude"],
+    )
+
+
+class TripDetector:
+    """
+    Splits the status samples of a vehicle into trips, one sample at a time.
+
+    A trip starts at the first sample with the vehicle driving (moving, or
+    with the ignition on), or at the sample before if it already moved by
+    then, and ends at the first parked
+    sample after it, or at the last sample before a gap longer than
+    `max_gap` seconds; two parked samples with different mileage make a
+    trip too, since the vehicle was driven between them.
+    Each sample takes constant time and memory, so the detector can follow
+    a live stream as well as backfill years of history.
+    """
+
+    def __init__(
+        self,
+        vehicle_id: str,
+        max_gap: float = 1800.0,
+        min_distance: float = 0.1,
+    ) -> None:
+        """
+        Initialize the detector.
+
+        Args:
+            vehicle_id: ID of the vehicle
+            max_gap: seconds without samples after which a trip is ended
+            min_distance: kilometers below which a trip is discarded,
+                e.g. when the engine is started without driving
+        """
+        self.vehicle_id = vehicle_id
+        self.max_gap = max_gap
+        self.min_distance = min_distance
+        self.current: Trip | None = None
+        self._last: TripPoint | None = None
+
+    def update(
+        self, status: mdl.VehicleStatus, timestamp: float | None = None
+    ) -> Trip | None:
+        """
+        Adds a status sample.
+
+        Args:
+            status: the vehicle status
+            timestamp: time of the sample; the update time of the status if None
+
+        Returns:
+            The trip ended by this sample, if any.
+        """
+        return self.add_point(get_point(status, timestamp), is_driving(status))
+
+    def add_point(self, point: TripPoint, driving: bool) -> Trip | None:
+        """
+        Adds a sample.
+
+        Args:
+            point: time, mileage, energy level and position of the sample
+            driving: whether the vehicle was driving
+
+        Returns:
+            The trip ended by this sample, if any; samples not newer than
+            the last one are ignored.
+        """
+        last = self._last
+        if last is not None and point.timestamp <= last.timestamp:
+            return None
+        self._last = point
+        ended = None
+        trip = self.current
+        if trip is not None and point.timestamp - trip.end.timestamp > self.max_gap:
+            ended = self.flush()
+            trip = None
+        if driving:
+            if trip is None:
+                start = point
+                # left from the last sample, if it already moved since
+                if (
+                    last is not None
+                    and last.mileage != point.mileage
+                    and point.timestamp - last.timestamp <= self.max_gap
+                ):
+                    start = last
+                self.current = Trip(self.vehicle_id, start, point)
+            else:
+                trip.end = point
+        elif trip is not None:
+            # parked since the last sample, unless it moved in the meantime
+            if point.mileage != trip.end.mileage:
+                trip.end = point
+            ended = self.flush()
+        elif (
+            last is not None
+            and point.mileage != last.mileage
+            and point.timestamp - last.timestamp <= self.max_gap
+        ):
+            # a whole trip between two samples
+            self.current = Trip(self.vehicle_id, last, point)
+            ended = self.flush()
+        return ended
+
+    def flush(self) -> Trip | None:
+        """Ends the current trip, returning it unless too short."""
+        trip, self.current = self.current, None
+        if trip is None or not trip.distance >= self.min_distance:
+            return None
+        return trip
+
+
+def detect_trips(
+    vehicle_id: str,
+    statuses: Iterable[mdl.VehicleStatus],
+    max_gap: float = 1800.0,
+    min_distance: float = 0.1,
+) -> List[Trip]:
+    """Returns the trips of a vehicle, from its status samples in time order."""
+    detector = TripDetector(vehicle_id, max_gap, min_distance)
+    trips = [trip for status in statuses if (trip := detector.update(status))]
+    last = detector.flush()
+    return trips + [last] if last else trips
+
+
+def trips_from_history(
+    vehicle_id: str,
+    frame: HistoryFrame,
+    max_gap: float = 1800.0,
+    min_distance: float = 0.1,
+) -> List[Trip]:
+    """
+    Returns the trips of a vehicle from its telemetry history.
+
+    The history has no ignition state: a sample is driving if the vehicle
+    has a speed, or if its mileage grew since the previous sample.
+
+    Args:
+        vehicle_id: ID of the vehicle
+        frame: samples of the vehicle, e.g. from `HistoryStore.query`
+        max_gap: seconds without samples after which a trip is ended
+        min_distance: kilometers below which a trip is discarded
+
+    Returns:
+        The trips, in time order.
+    """
+    detector = TripDetector(vehicle_id, max_gap, min_distance)
+    trips = []
+    previous = math.inf
+    columns = zip(
+        frame["timestamp"],
+        frame["mileage"],
+        frame["level"],
+        frame["latitude"],
+        frame["longitude"],
+        frame["speed"],
+        strict=True,
+    )
+    for timestamp, mileage, level, latitude, longitude, speed in columns:
+        driving = speed > 0 or mileage > previous
+        previous = mileage
+        point = TripPoint(timestamp, mileage, level, latitude, longitude)
+        trip = detector.add_point(point, driving)
+        if trip is not None:
+            trips.append(trip)
+    last = detector.flush()
+    return trips + [last] if last else trips
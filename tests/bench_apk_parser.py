@@ -0,0 +1,64 @@
+"""Benchmark of the APK configuration extraction.
+
+Compares the full pyaxmlparser APK load against the lightweight reader
+that only reads the entries holding the configuration.
+Each run happens in a fresh subprocess, to measure its peak memory usage.
+
+Run with ``python tests/bench_apk_parser.py path/to/app.apk IT``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from psa_ccc.apk_parser import get_config_from_apk
+from psa_ccc.apk_reader import ApkReader
+from pyaxmlparser.core import APK
+
+
+def _run(parser: str, apk_path: Path, country_code: str) -> None:
+    start = time.perf_counter()
+    if parser == "pyaxmlparser":
+        get_config_from_apk(APK(apk_path.read_bytes(), raw=True), country_code, "")
+    else:
+        with ApkReader.open(apk_path) as apk:
+            get_config_from_apk(apk, country_code, "")
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"elapsed": elapsed, "peak_kb": peak}))
+
+
+def main() -> None:
+    """Run the benchmark and print the timings and peak memory."""
+    parser = argparse.ArgumentParser("APK parser benchmark")
+    parser.add_argument("apk", type=Path)
+    parser.add_argument("country_code")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--run", choices=["pyaxmlparser", "reader"])
+    args = parser.parse_args()
+
+    if args.run:
+        _run(args.run, args.apk, args.country_code)
+        return
+    for name in ("pyaxmlparser", "reader"):
+        results = [
+            json.loads(
+                subprocess.check_output(  # noqa S603
+                    [sys.executable, __file__, str(args.apk), args.country_code]
+                    + ["--run", name]
+                )
+            )
+            for _ in range(args.repeat)
+        ]
+        elapsed = min(result["elapsed"] for result in results)
+        peak = max(result["peak_kb"] for result in results)
+        print(f"{name:>12}: {elapsed * 1e3:8.1f} ms, peak RSS {peak / 1024:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
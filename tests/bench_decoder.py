@@ -0,0 +1,92 @@
+"""Micro-benchmark of the response decoding path.
+
+Compares the ``decode(response.text, type=...)`` call used before the decoder
+registry with the cached ``Decoder`` reading ``response.content`` directly.
+
+Run with ``python tests/bench_decoder.py``.
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from httpx import Response
+from msgspec.json import decode
+from psa_ccc import models
+from psa_ccc.client import _handle_response
+
+STATUS_PAYLOAD = b"""{
+  "createdAt": "2023-04-29T22:17:20Z",
+  "updatedAt": "2023-04-29T22:17:20Z",
+  "lastPosition": {
+    "type": "Feature",
+    "geometry": {"type": "Point", "coordinates": [11.12524, 46.0059, 192]},
+    "properties": {"createdAt": "2023-03-10T07:45:53Z", "heading": 278, "type": "Acquire"}
+  },
+  "ignition": {"createdAt": "2023-04-29T22:17:20Z", "type": "Stop"},
+  "battery": {"voltage": 82, "createdAt": "2023-04-29T22:17:20Z"},
+  "privacy": {"createdAt": "2023-04-29T22:17:20Z", "state": "None"},
+  "service": {"createdAt": "2022-10-20T16:55:16Z", "type": "Electric"},
+  "environment": {
+    "air": {"createdAt": "2023-04-29T22:17:20Z", "temp": 15},
+    "luminosity": {"createdAt": "2023-04-29T22:17:20Z", "day": false}
+  },
+  "odometer": {"createdAt": "2023-04-29T22:17:20Z", "mileage": 14529.9},
+  "kinetic": {"createdAt": "2023-04-29T22:17:20Z", "moving": false},
+  "preconditioning": {
+    "airConditioning": {
+      "createdAt": "2023-04-29T22:17:20Z",
+      "updatedAt": "2023-04-29T22:17:20Z",
+      "status": "Disabled",
+      "programs": [
+        {"enabled": false, "slot": 1, "recurrence": "Daily", "start": "PT0S"},
+        {"enabled": false, "slot": 2, "recurrence": "Daily", "start": "PT0S"}
+      ]
+    }
+  },
+  "energies": [
+    {"createdAt": "2023-04-29T22:17:20Z", "type": "Electric", "subType": "ElectricEnergy",
+     "level": 43, "autonomy": 128,
+     "extension": {"electric": {
+       "battery": {"load": {"createdAt": "2023-04-29T22:17:20Z", "capacity": 33280, "residual": 4096}},
+       "charging": {"plugged": false, "status": "Disconnected", "chargingRate": 0,
+                    "chargingMode": "No", "nextDelayedTime": "PT0S"}}}}
+  ]
+}"""
+
+
+def _uncached(response: Response) -> models.VehicleStatus:
+    return decode(response.text, type=models.VehicleStatus)
+
+
+def _cached(response: Response) -> models.VehicleStatus:
+    return _handle_response(response, model=models.VehicleStatus)
+
+
+def main() -> None:
+    """Run the benchmark and print the per-call timings."""
+    parser = argparse.ArgumentParser("Decoder benchmark")
+    parser.add_argument("-n", "--number", type=int, default=20_000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in (("decode(text)", _uncached), ("Decoder(content)", _cached)):
+        # a fresh response each round, so the cached ``text`` property of
+        # httpx doesn't hide the bytes -> str conversion cost
+        timings = timeit.repeat(
+            "func(Response(200, content=STATUS_PAYLOAD))",
+            globals={"func": func, "Response": Response, **globals()},
+            number=args.number,
+            repeat=args.repeat,
+        )
+        results[name] = min(timings) / args.number * 1e6
+        print(f"{name:>18}: {results[name]:.2f} us/call")
+    saving = results["decode(text)"] - results["Decoder(content)"]
+    print(f"{'saving':>18}: {saving:.2f} us/call")
+    for polls in (1_000, 10_000, 100_000):
+        print(f"{polls:>9} polls: {saving * polls / 1e3:.1f} ms saved")
+
+
+if __name__ == "__main__":
+    main()
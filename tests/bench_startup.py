@@ -0,0 +1,91 @@
+"""Startup benchmark of the OAuth session creation.
+
+Compares the time needed by ``oauth_factory`` to get a usable session
+with an empty token storage (password grant), an expired stored token
+(refresh grant) and a valid stored token (no request at all).
+The token endpoint is simulated with the given latency.
+
+Run with ``python tests/bench_startup.py``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+import httpx
+from psa_ccc.auth import oauth_factory
+from psa_ccc.memory_token_storage import MemoryTokenStorage
+
+TOKEN_URL = "https://idpcvs.peugeot.com/am/oauth2/access_token"  # noqa S105
+
+
+def _transport(password_latency: float, refresh_latency: float) -> httpx.MockTransport:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        grant_type = parse_qs(request.content.decode())["grant_type"][0]
+        if grant_type == "password":
+            await asyncio.sleep(password_latency)
+        else:
+            await asyncio.sleep(refresh_latency)
+        return httpx.Response(
+            200,
+            json={
+                "access_token": grant_type,
+                "refresh_token": "refresh",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            },
+        )
+
+    return httpx.MockTransport(handler)
+
+
+async def _startup(
+    transport: httpx.MockTransport, stored_expires_in: int | None
+) -> float:
+    storage = MemoryTokenStorage()
+    if stored_expires_in is not None:
+        await storage.save(
+            {
+                "access_token": "stored",
+                "refresh_token": "refresh",
+                "token_type": "Bearer",
+                "expires_at": int(time.time()) + stored_expires_in,
+            }
+        )
+    start = time.perf_counter()
+    client = await oauth_factory(
+        "clientId",
+        "secret",
+        "me@mail.com",
+        "password",
+        TOKEN_URL,
+        "clientsB2CPeugeot",
+        storage,
+        transport=transport,
+    )
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return elapsed
+
+
+async def main() -> None:
+    """Run the benchmark and print the startup timings."""
+    parser = argparse.ArgumentParser("Startup benchmark")
+    parser.add_argument("--password-latency", type=float, default=1.5)
+    parser.add_argument("--refresh-latency", type=float, default=0.3)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    transport = _transport(args.password_latency, args.refresh_latency)
+    scenarios = {"cold": None, "refresh": -10, "warm": 3600}
+    for name, stored_expires_in in scenarios.items():
+        timings = [
+            await _startup(transport, stored_expires_in) for _ in range(args.repeat)
+        ]
+        print(f"{name:>8}: {min(timings) * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
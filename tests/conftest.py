@@ -1,13 +1,26 @@
 """Fixtures for tests."""
 from __future__ import annotations
 
+import io
+import json
+import random
+import zipfile
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import Callable
 
 import httpx
 import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 from psa_ccc import PSAClient
 from psa_ccc import SimpleCacheStorage
+from psa_ccc.apk_parser import PFX_PASSWORD
+
+from tests.helpers import CULTURES
+from tests.helpers import STRINGS
+from tests.helpers import build_arsc
+from tests.helpers import fake_cert
 
 
 @pytest.fixture
@@ -22,3 +35,101 @@ def client() -> PSAClient:
 def temp_storage() -> SimpleCacheStorage:
     with TemporaryDirectory() as temp_directory:
         yield SimpleCacheStorage(Path(temp_directory))
+
+
+def _status_text(
+    mileage: float = 14529.9,
+    level: float = 43,
+    coordinates: tuple[float, ...] = (11.12524, 46.0059, 192),
+    ignition: str = "Stop",
+    moving: bool = False,
+    charging: str = "Disconnected",
+    updated_at: str = "2023-04-29T22:17:20Z",
+) -> str:
+    return json.dumps(
+        {
+            "createdAt": updated_at,
+            "updatedAt": updated_at,
+            "lastPosition": {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": list(coordinates)},
+                "properties": {
+                    "createdAt": updated_at,
+                    "heading": 278,
+                    "type": "Acquire",
+                },
+            },
+            "ignition": {"createdAt": updated_at, "type": ignition},
+            "battery": {"voltage": 82, "createdAt": updated_at},
+            "privacy": {"createdAt": updated_at, "state": "None"},
+            "service": {"createdAt": updated_at, "type": "Electric"},
+            "environment": {
+                "air": {"createdAt": updated_at, "temp": 15},
+                "luminosity": {"createdAt": updated_at, "day": False},
+            },
+            "odometer": {"createdAt": updated_at, "mileage": mileage},
+            "kinetic": {"createdAt": updated_at, "moving": moving, "speed": 0},
+            "preconditioning": {
+                "airConditioning": {
+                    "createdAt": updated_at,
+                    "status": "Disabled",
+                    "programs": [],
+                }
+            },
+            "energies": [
+                {
+                    "createdAt": updated_at,
+                    "type": "Electric",
+                    "subType": "ElectricEnergy",
+                    "level": level,
+                    "autonomy": 128,
+                    "extension": {
+                        "electric": {
+                            "battery": {"load": {"capacity": 33280, "residual": 4096}},
+                            "charging": {
+                                "plugged": charging != "Disconnected",
+                                "status": charging,
+                                "chargingRate": 0,
+                                "chargingMode": "No",
+                                "nextDelayedTime": "PT0S",
+                            },
+                        }
+                    },
+                }
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def status_text() -> Callable[..., str]:
+    """Factory of vehicle status responses."""
+    return _status_text
+
+
+@pytest.fixture(scope="session")
+def apk_data() -> bytes:
+    """Minimal APK with the configuration of the app, and a big filler entry."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pfx = serialization.pkcs12.serialize_key_and_certificates(
+        b"test",
+        key,
+        fake_cert(key),
+        None,
+        serialization.BestAvailableEncryption(PFX_PASSWORD),
+    )
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("AndroidManifest.xml", b"\x00" * 64)
+        filler = random.Random(0).randbytes(1 << 20)  # noqa S311
+        archive.writestr("classes.dex", filler)
+        archive.writestr("resources.arsc", build_arsc(STRINGS))
+        archive.writestr("res/raw/cultures.json", json.dumps(CULTURES))
+        for culture in ("it_IT", "fr_FR"):
+            language, country = culture.split("_")
+            archive.writestr(
+                f"res/raw-{language}-r{country}/parameters.json",
+                json.dumps({"cvsClientId": f"{culture}Id", "cvsSecret": "TOPSECRET"}),
+            )
+        archive.writestr("assets/MWPMYMA1.pfx", pfx, zipfile.ZIP_STORED)
+    return data.getvalue()
@@ -0,0 +1,138 @@
+"""Test data shared by the test modules."""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import math
+import struct
+
+from cryptography import x509
+from cryptography.hazmat._oid import NameOID
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+PACKAGE = "com.psa.mym.mypeugeot"
+# Germany has no parameters
+CULTURES = {
+    "IT": {"languages": ["it_IT"]},
+    "FR": {"languages": ["fr_FR"]},
+    "BE": {"languages": ["fr_FR", "nl_NL"]},
+    "DE": {"languages": ["de_DE"]},
+}
+STRINGS = {
+    "app_name": "MyPeugeot",
+    "HOST_BRANDID_PROD": "https://id-dcr.peugeot.com/mobile-services",
+}
+
+
+def _string_pool(strings: list[str], utf8: bool) -> bytes:
+    offsets = []
+    data = b""
+    for string in strings:
+        offsets.append(len(data))
+        if utf8:
+            encoded = string.encode("utf-8")
+            data += bytes([len(string), len(encoded)]) + encoded + b"\x00"
+        else:
+            data += struct.pack("<H", len(string))
+            data += string.encode("utf-16-le") + b"\x00\x00"
+    data += b"\x00" * (-len(data) % 4)
+    strings_start = 28 + 4 * len(strings)
+    header = struct.pack(
+        "<HHI5I",
+        0x0001,
+        28,
+        strings_start + len(data),
+        len(strings),
+        0,
+        0x100 if utf8 else 0,
+        strings_start,
+        0,
+    )
+    return header + struct.pack(f"<{len(strings)}I", *offsets) + data
+
+
+def build_arsc(strings: dict[str, str], utf8: bool = True) -> bytes:
+    """Builds a resource table with the given string resources."""
+    values = _string_pool(list(strings.values()), utf8)
+    type_strings = _string_pool(["attr", "string"], utf8)
+    key_strings = _string_pool(list(strings), utf8)
+    count = len(strings)
+    type_spec = struct.pack("<HHIBBHI", 0x0202, 16, 16 + 4 * count, 2, 0, 0, count)
+    type_spec += b"\x00" * 4 * count
+    config = struct.pack("<I", 64) + b"\x00" * 60
+    header_size = 20 + len(config)
+    entries_start = header_size + 4 * count
+    type_chunk = struct.pack(
+        "<HHIBBHII",
+        0x0201,
+        header_size,
+        entries_start + 16 * count,
+        2,
+        0,
+        0,
+        count,
+        entries_start,
+    )
+    type_chunk += config + struct.pack(f"<{count}I", *(16 * i for i in range(count)))
+    for index in range(count):
+        type_chunk += struct.pack("<HHIHBBI", 8, 0, index, 8, 0, 0x03, index)
+    body = type_strings + key_strings + type_spec + type_chunk
+    name = PACKAGE.encode("utf-16-le").ljust(256, b"\x00")
+    package = struct.pack("<HHII", 0x0200, 288, 288 + len(body), 0x7F) + name
+    package += struct.pack("<5I", 288, 2, 288 + len(type_strings), len(strings), 0)
+    package += body
+    table = values + package
+    return struct.pack("<HHII", 0x0002, 12, 12 + len(table), 1) + table
+
+
+def fake_cert(key: rsa.RSAPrivateKey) -> x509.Certificate:
+    """Self signed certificate of the given key."""
+    subject = issuer = x509.Name(
+        [
+            x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "California"),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, "San Francisco"),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, "My Company"),
+            x509.NameAttribute(NameOID.COMMON_NAME, "mysite.com"),
+        ]
+    )
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.datetime.utcnow())
+        .not_valid_after(datetime.datetime.utcnow() + datetime.timedelta(days=10))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost")]),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
+
+
+class FakeTime:
+    """Clock advanced only by the fake sleep, up to an optional limit."""
+
+    def __init__(self, limit: float = math.inf) -> None:
+        self.now = 0.0
+        self.limit = limit
+        self.sleeps: list[float] = []
+        self.reached = asyncio.Event()
+
+    def clock(self) -> float:
+        """Returns the current fake time."""
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        """Records the delay and advances the clock; waits forever past the limit."""
+        self.sleeps.append(delay)
+        # let the other tasks run first, as if the time was passing
+        for _ in range(10):
+            await asyncio.sleep(0)
+        if self.now + delay > self.limit:
+            self.reached.set()
+            await asyncio.Future()
+        self.now += delay
@@ -1,20 +1,29 @@
 """APK parser tests."""
 from __future__ import annotations
 
-import datetime
+import asyncio
 import json
+import re
+import time
 from dataclasses import dataclass
+from hashlib import sha1
+from typing import Any
+from typing import Callable
 
-from cryptography import x509
-from cryptography.hazmat._oid import NameOID
-from cryptography.hazmat.primitives import hashes
+import httpx
+import pytest
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 from cryptography.x509 import Certificate
+from psa_ccc import apk_parser
 from psa_ccc.apk_parser import PFX_PASSWORD
 from psa_ccc.apk_parser import ConfigInfo
+from psa_ccc.apk_parser import first_launch
 from psa_ccc.apk_parser import get_config_from_apk
+from psa_ccc.apk_parser import precompute_configs
+
+from tests.helpers import fake_cert
 
 
 @dataclass
@@ -70,7 +79,7 @@ def test_get_config_from_apk() -> None:
         public_exponent=65537,
         key_size=2048,
     )
-    cert = _fake_cert(key)
+    cert = fake_cert(key)
     apk = FakeAPK(key, cert)
 
     config = get_config_from_apk(apk, "IT", "AP_IT_ESP")
@@ -89,27 +98,118 @@ def test_get_config_from_apk() -> None:
     )
 
 
-def _fake_cert(key):
-    subject = issuer = x509.Name(
-        [
-            x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
-            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "California"),
-            x509.NameAttribute(NameOID.LOCALITY_NAME, "San Francisco"),
-            x509.NameAttribute(NameOID.ORGANIZATION_NAME, "My Company"),
-            x509.NameAttribute(NameOID.COMMON_NAME, "mysite.com"),
-        ]
-    )
-    return (
-        x509.CertificateBuilder()
-        .subject_name(subject)
-        .issuer_name(issuer)
-        .public_key(key.public_key())
-        .serial_number(x509.random_serial_number())
-        .not_valid_before(datetime.datetime.utcnow())
-        .not_valid_after(datetime.datetime.utcnow() + datetime.timedelta(days=10))
-        .add_extension(
-            x509.SubjectAlternativeName([x509.DNSName("localhost")]),
-            critical=False,
+@pytest.fixture
+def app_server(apk_data: bytes, httpx_mock) -> list[str]:
+    """Fake GitHub and PSA servers, returning the paths of the requests."""
+    sha = sha1(f"blob {len(apk_data)}\x00".encode() + apk_data).hexdigest()  # noqa S324
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.host == "api.github.com":
+            return httpx.Response(
+                200, json={"tree": [{"path": "mypeugeot.apk", "sha": sha}]}
+            )
+        if request.url.host == "github.com":
+            return httpx.Response(200, content=apk_data)
+        if request.url.path.endswith("GetAccessToken"):
+            return httpx.Response(200, json={"accessToken": "token"})
+        return httpx.Response(200, json={"success": {"id": "userId"}})
+
+    httpx_mock.add_callback(respond, url=re.compile(".*"))
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_first_launch_caches_the_config(app_server, temp_storage) -> None:
+    """The APK is parsed once per country, an account is set up once."""
+    async with httpx.AsyncClient() as client:
+        config = await first_launch(
+            client, "Peugeot", "a@mail.com", "pwd", "IT", temp_storage
         )
-        .sign(key, hashes.SHA256())
-    )
+        assert config.client_id == "it_ITId"
+        assert config.site_code == "AP_IT_ESP"
+        assert config.user_id == "userId"
+        assert config.public_certificate is not None
+        assert app_server.count("/flobz/psa_apk/raw/main//mypeugeot.apk") == 1
+        requests = len(app_server)
+        assert (
+            await first_launch(
+                client, "Peugeot", "a@mail.com", "pwd", "IT", temp_storage
+            )
+            == config
+        )
+        assert len(app_server) == requests
+        other = await first_launch(
+            client, "Peugeot", "b@mail.com", "pwd", "FR", temp_storage
+        )
+        assert other.client_id == "fr_FRId"
+    # the APK is parsed again, but not downloaded
+    assert app_server.count("/flobz/psa_apk/raw/main//mypeugeot.apk") == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("remote_apk", [False, True])
+async def test_first_launch_doesnt_block_the_loop(
+    app_server, temp_storage, monkeypatch, remote_apk
+) -> None:
+    """The event loop keeps running while the APK is parsed."""
+
+    def slow(parse: Callable[..., Any]) -> Callable[..., Any]:
+        def parse_slowly(*args: Any) -> Any:
+            time.sleep(0.3)
+            return parse(*args)
+
+        return parse_slowly
+
+    for name in ("parse_apk_configs", "get_configs_from_apk"):
+        monkeypatch.setattr(
+            f"psa_ccc.apk_parser.{name}", slow(getattr(apk_parser, name))
+        )
+    lags = []
+
+    async def ticker() -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - start - 0.01)
+
+    ticks = asyncio.ensure_future(ticker())
+    async with httpx.AsyncClient() as client:
+        config = await first_launch(
+            client,
+            "Peugeot",
+            "a@mail.com",
+            "pwd",
+            "IT",
+            temp_storage,
+            remote_apk=remote_apk,
+        )
+    ticks.cancel()
+    assert config.client_id == "it_ITId"
+    assert len(lags) > 10
+    assert max(lags) < 0.1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("remote_apk", [False, True])
+async def test_precompute_configs(app_server, temp_storage, monkeypatch, remote_apk):
+    """Accounts of any country are set up without parsing the APK again."""
+    async with httpx.AsyncClient() as client:
+        configs = await precompute_configs(
+            client, "Peugeot", temp_storage, remote_apk=remote_apk
+        )
+        # Germany has no parameters in the APK
+        assert sorted(configs) == ["BE", "FR", "IT"]
+        assert configs["BE"].client_id == configs["FR"].client_id == "fr_FRId"
+        assert configs["BE"].site_code == "AP_BE_ESP"
+
+        def fail(*args) -> None:
+            raise AssertionError("APK parsed again")
+
+        monkeypatch.setattr("psa_ccc.apk_parser._extract_configs", fail)
+        config = await first_launch(
+            client, "Peugeot", "a@mail.com", "pwd", "BE", temp_storage
+        )
+    assert config.client_id == "fr_FRId"
+    assert config.user_id == "userId"
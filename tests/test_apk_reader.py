@@ -0,0 +1,50 @@
+"""Lightweight APK reader tests."""
+from __future__ import annotations
+
+import zipfile
+
+import pytest
+from psa_ccc.apk_reader import ApkReader
+from psa_ccc.apk_reader import ResourceTable
+from pyaxmlparser.arscparser import ARSCParser
+
+from tests.helpers import PACKAGE
+from tests.helpers import STRINGS
+from tests.helpers import build_arsc
+
+
+@pytest.mark.parametrize("utf8", [True, False])
+def test_resource_table_get_string(utf8: bool) -> None:
+    arsc = build_arsc(STRINGS, utf8)
+    table = ResourceTable(arsc)
+    assert table.get_packages_names() == [PACKAGE]
+    expected = ["HOST_BRANDID_PROD", STRINGS["HOST_BRANDID_PROD"]]
+    assert table.get_string(PACKAGE, "HOST_BRANDID_PROD") == expected
+    # same result of the full parser
+    assert ARSCParser(arsc).get_string(PACKAGE, "HOST_BRANDID_PROD") == expected
+
+
+def test_resource_table_missing_string() -> None:
+    table = ResourceTable(build_arsc(STRINGS))
+    assert table._find_string(PACKAGE, "missing") is None
+    assert table._find_string("other.package", "app_name") is None
+
+
+def test_resource_table_rejects_other_files() -> None:
+    with pytest.raises(ValueError):
+        ResourceTable(b'{"not": "a table"}')
+
+
+def test_apk_reader(tmp_path) -> None:
+    path = tmp_path / "test.apk"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("resources.arsc", build_arsc(STRINGS))
+        archive.writestr("res/raw/cultures.json", '{"IT": {"languages": ["it_IT"]}}')
+        archive.writestr("classes.dex", b"\x00" * 1024)
+    with ApkReader.open(path) as apk:
+        assert apk.get_package() == PACKAGE
+        assert apk.get_file("res/raw/cultures.json").startswith(b'{"IT"')
+        resources = apk.get_android_resources()
+        assert resources.get_string(PACKAGE, "app_name") == ["app_name", "MyPeugeot"]
+        with pytest.raises(KeyError):
+            apk.get_file("missing.json")
@@ -0,0 +1,86 @@
+"""Response cache tests."""
+from __future__ import annotations
+
+import pytest
+from psa_ccc.cache import CachedPSAClient
+from psa_ccc.cache import TTLCache
+
+MAINTENANCE = '{"daysBeforeMaintenance": 610, "mileageBeforeMaintenance": 22920.0}'
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Current time."""
+        return self.now
+
+
+def test_ttl_cache_expires() -> None:
+    clock = FakeClock()
+    cache = TTLCache(clock=clock)
+    cache.set("key", "value", ttl=10)
+    assert cache.get("key") == "value"
+    clock.now = 10
+    assert cache.get("key") is None
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1, ttl=10)
+    cache.set("b", 2, ttl=10)
+    cache.get("a")
+    cache.set("c", 3, ttl=10)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_client_hits(httpx_mock, client) -> None:
+    httpx_mock.add_response(text=MAINTENANCE)
+    cached = CachedPSAClient(client)
+    first = await cached.get_vehicle_maintenance("myId")
+    second = await cached.get_vehicle_maintenance("myId")
+    assert first is second
+    assert len(httpx_mock.get_requests()) == 1
+    assert (cached.stats.hits, cached.stats.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_cached_client_expires(httpx_mock, client) -> None:
+    httpx_mock.add_response(text=MAINTENANCE)
+    clock = FakeClock()
+    cached = CachedPSAClient(client, ttls={"get_vehicle_maintenance": 5}, clock=clock)
+    await cached.get_vehicle_maintenance("myId")
+    clock.now = 5
+    await cached.get_vehicle_maintenance("myId")
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_client_passes_through_uncached(httpx_mock, client) -> None:
+    httpx_mock.add_response(text=MAINTENANCE)
+    cached = CachedPSAClient(client, ttls={})
+    await cached.get_vehicle_maintenance("myId")
+    await cached.get_vehicle_maintenance("myId")
+    assert len(httpx_mock.get_requests()) == 2
+    assert cached.stats.misses == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_client_invalidate(httpx_mock, client) -> None:
+    httpx_mock.add_response(text=MAINTENANCE)
+    cached = CachedPSAClient(client)
+    await cached.get_vehicle_maintenance("myId")
+    await cached.get_vehicle_maintenance("otherId")
+    assert cached.invalidate("get_vehicle_maintenance", "otherId") == 1
+    assert cached.invalidate_vehicle("myId") == 1
+    await cached.get_vehicle_maintenance(vehicle_id="myId")
+    assert cached.invalidate_vehicle("myId") == 1
+    assert cached.invalidate() == 0
@@ -0,0 +1,96 @@
+"""Change detection tests."""
+from __future__ import annotations
+
+import json
+
+import pytest
+from psa_ccc.changes import FieldChange
+from psa_ccc.changes import StatusChangeDetector
+from psa_ccc.changes import StatusField
+from psa_ccc.models import DoorsState
+from psa_ccc.models import Opening
+
+
+def _with_doors(text: str, locked: str) -> bytes:
+    status = json.loads(text)
+    status["doorsState"] = {
+        "lockedState": [locked],
+        "opening": [{"identifier": "Driver", "state": "Closed"}],
+    }
+    return json.dumps(status).encode()
+
+
+def test_first_update_reports_every_field(status_text) -> None:
+    detector = StatusChangeDetector()
+    delta = detector.update("myId", status_text().encode())
+    assert [change.field for change in delta.changes] == list(StatusField)
+    assert delta.get(StatusField.ODOMETER) == FieldChange(
+        StatusField.ODOMETER, None, 14529.9
+    )
+    assert delta.get(StatusField.DOORS).new is None
+    assert detector.get_status("myId") is delta.status
+
+
+def test_same_body_is_not_decoded(status_text) -> None:
+    detector = StatusChangeDetector()
+    first = detector.update("myId", status_text().encode())
+    second = detector.update("myId", status_text().encode())
+    assert second.changes == []
+    assert second.status is first.status
+    assert detector.stats.unchanged == 1
+    assert detector.stats.decoded == 1
+
+
+def test_field_deltas(status_text) -> None:
+    detector = StatusChangeDetector()
+    detector.update("myId", _with_doors(status_text(), "Locked"))
+    body = status_text(
+        mileage=14540.2,
+        level=40,
+        coordinates=(11.2, 46.1, 190),
+        ignition="Start",
+        moving=True,
+        updated_at="2023-04-30T08:00:00Z",
+    )
+    delta = detector.update("myId", _with_doors(body, "Unlocked"))
+    opening = [Opening(identifier="Driver", state="Closed")]
+    assert delta.changes == [
+        FieldChange(StatusField.ODOMETER, 14529.9, 14540.2),
+        FieldChange(
+            StatusField.ENERGY_LEVEL, (("Electric", 43.0),), (("Electric", 40.0),)
+        ),
+        FieldChange(
+            StatusField.POSITION, (11.12524, 46.0059, 192.0), (11.2, 46.1, 190.0)
+        ),
+        FieldChange(
+            StatusField.DOORS,
+            DoorsState(locked_state=["Locked"], opening=opening),
+            DoorsState(locked_state=["Unlocked"], opening=opening),
+        ),
+        FieldChange(StatusField.IGNITION, "Stop", "Start"),
+    ]
+    assert detector.stats.changed == 2
+
+
+def test_untracked_changes_have_no_deltas(status_text) -> None:
+    detector = StatusChangeDetector()
+    detector.update("myId", status_text().encode())
+    delta = detector.update(
+        "myId", status_text(updated_at="2023-04-30T08:00:00Z").encode()
+    )
+    assert delta.changes == []
+    assert detector.stats.decoded == 2
+    assert detector.stats.changed == 1
+
+
+@pytest.mark.asyncio
+async def test_fetch(httpx_mock, client, status_text) -> None:
+    httpx_mock.add_response(text=status_text())
+    detector = StatusChangeDetector()
+    first = await detector.fetch(client, "myId")
+    second = await detector.fetch(client, "myId")
+    assert len(first.changes) == len(StatusField)
+    assert second.changes == []
+    assert len(httpx_mock.get_requests()) == 2
+    detector.forget("myId")
+    assert len(detector) == 0
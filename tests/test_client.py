@@ -1,11 +1,16 @@
 """PSAClient tests."""
 from __future__ import annotations
 
+import asyncio
 import datetime
+import json
 
+import httpx
 import pytest
 from psa_ccc import models
 from psa_ccc.client import ApiError
+from psa_ccc.client import PSAClient
+from psa_ccc.client import get_decoder
 
 
 @pytest.mark.asyncio
@@ -42,6 +47,12 @@ async def test_get_user_raises_api_error(httpx_mock, client) -> None:
         await client.get_user()
 
 
+def test_get_decoder_is_cached() -> None:
+    decoder = get_decoder(models.VehicleStatus)
+    assert get_decoder(models.VehicleStatus) is decoder
+    assert get_decoder(models.User) is not decoder
+
+
 @pytest.mark.asyncio
 async def test_get_vehicles(httpx_mock, client) -> None:
     text = '{"total":1, "currentPage":1, "totalPage":1, "_embedded":{"vehicles":[{"id":"myId","vin":"myVin","vehicleExtension":{"vehicleBranding":{"brand":"C", "label":"myLabel"}, "vehiclePictures":{"pictures":[]}},"_links":{"alerts":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/alerts"},"collisions":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/collisions"},"trips":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/trips"},"self":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId"},"lastPosition":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/lastPosition"},"callbacks":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/callbacks"},"remotes":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/callbacks/{cbid}/remotes","templated":true},"telemetry":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/telemetry"},"user":{"href":"https://api.groupe-psa.com/connectedcar/v4/user"},"maintenance":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/maintenance"},"status":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/status"},"monitors":{"href":"https://api.groupe-psa.com/connectedcar/v4/user/vehicles/myId/callbacks/{cbid}/monitors","templated":true}}}]}}'
@@ -404,3 +415,191 @@ async def test_get_last_position(httpx_mock, client) -> None:
         type="Feature",
     )
     assert returned == expected
+
+
+@pytest.mark.asyncio
+async def test_get_fleet_status(httpx_mock, client, status_text) -> None:
+    async def respond(request: httpx.Request) -> httpx.Response:
+        vehicle_id = request.url.path.split("/")[-2]
+        if vehicle_id == "slow":
+            await asyncio.sleep(1)
+        if vehicle_id == "broken":
+            return httpx.Response(500, text="Internal server error")
+        return httpx.Response(200, text=status_text(mileage=float(vehicle_id)))
+
+    httpx_mock.add_callback(respond)
+    vehicle_ids = ["slow", "1", "broken", "2", "3"]
+    results = [
+        result
+        async for result in client.get_fleet_status(
+            vehicle_ids, concurrency=2, timeout=0.1
+        )
+    ]
+    by_id = {result.vehicle_id: result for result in results}
+    assert sorted(by_id) == sorted(vehicle_ids)
+    assert [by_id[vid].status.odometer.mileage for vid in "123"] == [1, 2, 3]
+    assert isinstance(by_id["broken"].error, ApiError)
+    assert isinstance(by_id["slow"].error, asyncio.TimeoutError)
+    assert results[-1].vehicle_id == "slow"
+
+
+@pytest.mark.asyncio
+async def test_get_fleet_status_raises_unexpected_errors(
+    httpx_mock, client, monkeypatch
+) -> None:
+    httpx_mock.add_exception(httpx.ConnectError("unreachable"))
+    results = [result async for result in client.get_fleet_status(["car"])]
+    assert isinstance(results[0].error, httpx.ConnectError)
+
+    async def get_vehicle_status(self, vehicle_id: str, extension: list[str] | None):
+        raise KeyError(vehicle_id)
+
+    monkeypatch.setattr(PSAClient, "get_vehicle_status", get_vehicle_status)
+    with pytest.raises(KeyError):
+        [result async for result in client.get_fleet_status(["car"])]
+
+
+def _vehicles_page(page: int, total_page: int, next_href: str | None = None) -> str:
+    vehicle = {
+        "id": f"id{page}",
+        "vin": f"vin{page}",
+        "vehicleExtension": {
+            "vehicleBranding": {"brand": "C", "label": "myLabel"},
+            "vehiclePictures": {"pictures": []},
+        },
+    }
+    data = {
+        "total": total_page,
+        "currentPage": page,
+        "totalPage": total_page,
+        "_embedded": {"vehicles": [vehicle]},
+    }
+    if next_href:
+        data["_links"] = {"next": {"href": next_href}}
+    return json.dumps(data)
+
+
+@pytest.mark.asyncio
+async def test_iter_vehicles_follows_next_link(httpx_mock, client) -> None:
+    base_url = "https://api.groupe-psa.com/connectedcar/v4/user/vehicles"
+    httpx_mock.add_response(
+        url=base_url, text=_vehicles_page(1, 2, f"{base_url}?pageToken=abc")
+    )
+    httpx_mock.add_response(url=f"{base_url}?pageToken=abc", text=_vehicles_page(2, 2))
+    vehicles = [vehicle.id async for vehicle in client.iter_vehicles()]
+    assert vehicles == ["id1", "id2"]
+
+
+@pytest.mark.asyncio
+async def test_iter_vehicles_fails_without_next_link(httpx_mock, client) -> None:
+    base_url = "https://api.groupe-psa.com/connectedcar/v4/user/vehicles"
+    httpx_mock.add_response(
+        url=base_url, text=_vehicles_page(1, 3, f"{base_url}?pageToken=abc")
+    )
+    httpx_mock.add_response(url=f"{base_url}?pageToken=abc", text=_vehicles_page(2, 3))
+    vehicles = []
+    # no page number to guess after an opaque token, but a page is missing
+    with pytest.raises(ApiError, match="page 2 of 3"):
+        async for vehicle in client.iter_vehicles():
+            vehicles.append(vehicle.id)
+    assert vehicles == ["id1"]
+
+
+@pytest.mark.asyncio
+async def test_iter_vehicles_prefetches_next_page(httpx_mock, client) -> None:
+    requested = {page: asyncio.Event() for page in (1, 2, 3)}
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("pageToken", 1))
+        requested[page].set()
+        return httpx.Response(200, text=_vehicles_page(page, 3))
+
+    httpx_mock.add_callback(respond)
+    seen = []
+    async for vehicle in client.iter_vehicles():
+        seen.append(vehicle.id)
+        # the next page is requested while we process this one
+        if len(seen) < 3:
+            await asyncio.wait_for(requested[len(seen) + 1].wait(), 1)
+        assert len(httpx_mock.get_requests()) == min(len(seen) + 1, 3)
+    assert seen == ["id1", "id2", "id3"]
+
+
+@pytest.mark.asyncio
+async def test_iter_vehicles_without_prefetch(httpx_mock, client) -> None:
+    def respond(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params.get("pageToken", 1))
+        return httpx.Response(200, text=_vehicles_page(page, 2))
+
+    httpx_mock.add_callback(respond)
+    async for _vehicle in client.iter_vehicles(prefetch=False):
+        # nothing else is running, so no request is pending
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        assert len(httpx_mock.get_requests()) == 1
+        break
+
+
+@pytest.mark.asyncio
+async def test_iter_alerts_not_found(httpx_mock, client) -> None:
+    httpx_mock.add_response(status_code=404)
+    assert [alert async for alert in client.iter_alerts("myId")] == []
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(
+    httpx_mock, client, status_text
+) -> None:
+    arrived: list[httpx.Request] = []
+    both_arrived = asyncio.Event()
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        # hold the requests until both of them are in flight
+        arrived.append(request)
+        if len(arrived) == 2:
+            both_arrived.set()
+        await both_arrived.wait()
+        return httpx.Response(200, text=status_text())
+
+    httpx_mock.add_callback(respond)
+    results = await asyncio.gather(
+        *(client.get_vehicle_status("myId") for _ in range(5)),
+        client.get_vehicle_status("otherId"),
+    )
+    assert len(httpx_mock.get_requests()) == 2
+    assert all(result is results[0] for result in results[:5])
+    assert results[5] is not results[0]
+    await client.get_vehicle_status("myId")
+    assert len(httpx_mock.get_requests()) == 3
+
+
+@pytest.mark.asyncio
+async def test_coalesced_requests_share_errors(httpx_mock, client) -> None:
+    httpx_mock.add_response(status_code=500, text="error")
+    results = await asyncio.gather(
+        client.get_user(), client.get_user(), return_exceptions=True
+    )
+    assert len(httpx_mock.get_requests()) == 1
+    assert all(isinstance(result, ApiError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_doesnt_cancel_others(
+    httpx_mock, client, status_text
+) -> None:
+    arrived = asyncio.Event()
+    release = asyncio.Event()
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        arrived.set()
+        await release.wait()
+        return httpx.Response(200, text=status_text())
+
+    httpx_mock.add_callback(respond)
+    first = asyncio.ensure_future(client.get_vehicle_status("myId"))
+    second = asyncio.ensure_future(client.get_vehicle_status("myId"))
+    await arrived.wait()
+    first.cancel()
+    release.set()
+    status = await second
+    assert status.odometer.mileage == 14529.9
+    assert first.cancelled()
@@ -1,14 +1,23 @@
 """GitHub related tests."""
 from __future__ import annotations
 
+import io
+import os
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
 from dataclasses import field
+from hashlib import sha1
 from pathlib import Path
+from typing import IO
 from typing import Any
+from typing import Iterator
 
+import httpx
 import pytest
 from psa_ccc.github import GitHubUrlsBuilder
 from psa_ccc.github import download_github_file
+from psa_ccc.github import get_github_sha
 from psa_ccc.github import needs_download
 
 
@@ -43,12 +52,25 @@ class FakeCacheStorage:
         self.files[filename] = {"content": data, "sha": "sha"}
 
 
+class FakeStreamingStorage(FakeCacheStorage):
+    """Dictionary based cache storage, written in chunks."""
+
+    @contextmanager
+    def writer(self, filename: str) -> Iterator[IO[bytes]]:
+        """Saves the written data when the block exits without errors."""
+        with io.BytesIO() as file:
+            yield file
+            self.save(file.getvalue(), filename)
+
+
 @dataclass
 class FakeResponse:
     """Fake HTTP response."""
 
     data: dict[str, Any] | None
     content: bytes | None
+    status_code: int = 200
+    headers: dict[str, str] = field(default_factory=dict)
 
     def json(self) -> dict[str, Any]:
         """Fake response JSON data."""
@@ -68,17 +90,121 @@ class FakeClient:
         return FakeResponse({"tree": [{"path": self.file, "sha": "sha"}]}, None)
 
 
+def _git_sha(data: bytes) -> str:
+    return sha1(f"blob {len(data)}\u0000".encode() + data).hexdigest()  # noqa S324
+
+
+@pytest.fixture
+def url_builder() -> GitHubUrlsBuilder:
+    """URLs of the test file."""
+    return GitHubUrlsBuilder("sanzoghenzo", "psa_connected_car_client", "", "test.apk")
+
+
 @pytest.mark.asyncio
-async def test_download_github_file() -> None:
+async def test_download_github_file(httpx_mock, temp_storage, url_builder) -> None:
     """File is downloaded if it doesn't exist yet."""
-    url_builder = GitHubUrlsBuilder(
-        "sanzoghenzo", "psa_connected_car_client", "", "test.apk"
+    content = bytes(range(256)) * 10_000
+    httpx_mock.add_response(
+        url=url_builder.dir_sha_url,
+        json={
+            "tree": [
+                {"path": "test.apk", "sha": _git_sha(content), "size": len(content)}
+            ]
+        },
     )
-    storage = FakeCacheStorage()
-    client = FakeClient()
-    await download_github_file(client, storage, url_builder)  # type: ignore
-    assert "test.apk" in storage.files
-    assert storage.files["test.apk"]["content"] == b"Test content"
+    httpx_mock.add_response(url=url_builder.raw_url, content=content)
+    async with httpx.AsyncClient() as client:
+        await download_github_file(client, temp_storage, url_builder)
+    assert temp_storage.read("test.apk") == content
+
+
+@pytest.mark.asyncio
+async def test_download_github_file_size_from_headers(
+    httpx_mock, temp_storage, url_builder
+) -> None:
+    """The SHA is verified with the Content-Length if the tree has no size."""
+    content = b"Test content"
+    httpx_mock.add_response(
+        url=url_builder.dir_sha_url,
+        json={"tree": [{"path": "test.apk", "sha": _git_sha(content)}]},
+    )
+    httpx_mock.add_response(url=url_builder.raw_url, content=content)
+    async with httpx.AsyncClient() as client:
+        await download_github_file(client, temp_storage, url_builder)
+    assert temp_storage.read("test.apk") == content
+
+
+@pytest.mark.asyncio
+async def test_download_github_file_wrong_sha(
+    httpx_mock, temp_storage, url_builder
+) -> None:
+    """A corrupted download doesn't replace the existing file."""
+    temp_storage.save(b"Old content", "test.apk")
+    httpx_mock.add_response(
+        url=url_builder.dir_sha_url,
+        json={"tree": [{"path": "test.apk", "sha": _git_sha(b"New content")}]},
+    )
+    httpx_mock.add_response(url=url_builder.raw_url, content=b"Broken content")
+    async with httpx.AsyncClient() as client:
+        with pytest.raises(ValueError):
+            await download_github_file(client, temp_storage, url_builder)
+    assert temp_storage.read("test.apk") == b"Old content"
+    assert not list(temp_storage.cache_directory.glob(".test.apk*"))
+
+
+@pytest.mark.asyncio
+async def test_download_github_file_io_off_the_loop(
+    httpx_mock, temp_storage, url_builder, monkeypatch
+) -> None:
+    """The file is synced and moved in a worker thread."""
+    threads = []
+
+    def record(function):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return function(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(os, "fsync", record(os.fsync))
+    monkeypatch.setattr(os, "replace", record(os.replace))
+    content = b"Test content"
+    httpx_mock.add_response(
+        url=url_builder.dir_sha_url,
+        json={"tree": [{"path": "test.apk", "sha": _git_sha(content)}]},
+    )
+    httpx_mock.add_response(url=url_builder.raw_url, content=content)
+    async with httpx.AsyncClient() as client:
+        await download_github_file(client, temp_storage, url_builder)
+    assert temp_storage.read("test.apk") == content
+    # the file and the cached tree
+    assert len(threads) == 4
+    assert threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage_class", [FakeCacheStorage, FakeStreamingStorage])
+async def test_download_github_file_through_the_storage(
+    httpx_mock, url_builder, storage_class: type[FakeCacheStorage]
+) -> None:
+    """The download is saved by the storage, even without a writer."""
+    storage = storage_class()
+    content = b"Test content"
+    httpx_mock.add_response(
+        url=url_builder.dir_sha_url,
+        json={"tree": [{"path": "test.apk", "sha": _git_sha(content)}]},
+    )
+
+    # without a size, the SHA is checked on what the storage wrote
+    async def chunks():
+        yield content
+
+    httpx_mock.add_callback(
+        lambda request: httpx.Response(200, content=chunks()), url=url_builder.raw_url
+    )
+    async with httpx.AsyncClient() as client:
+        await download_github_file(client, storage, url_builder)
+    assert storage.read("test.apk") == content
 
 
 @pytest.mark.asyncio
@@ -121,3 +247,71 @@ async def test_needs_download_doesnt_exist() -> None:
     client = FakeClient()
     needs = await needs_download(client, storage, "fake_url", "missing.apk")  # type: ignore
     assert needs
+
+
+def _tree_server(httpx_mock, url_builder, sha: str) -> list[httpx.Request]:
+    """GitHub tree endpoint, honoring If-None-Match."""
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        etag = f'"{sha}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        tree = {"tree": [{"path": url_builder.filename, "sha": sha}]}
+        return httpx.Response(200, json=tree, headers={"ETag": etag})
+
+    httpx_mock.add_callback(respond, url=url_builder.dir_sha_url)
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_get_github_sha_conditional(httpx_mock, temp_storage, url_builder):
+    """The tree is requested again with its ETag."""
+    requests = _tree_server(httpx_mock, url_builder, "sha")
+    async with httpx.AsyncClient() as client:
+        for _ in range(2):
+            sha = await get_github_sha(client, temp_storage, url_builder, 0)
+            assert sha == "sha"
+    assert "If-None-Match" not in requests[0].headers
+    assert requests[1].headers["If-None-Match"] == '"sha"'
+
+
+@pytest.mark.asyncio
+async def test_get_github_sha_min_interval(httpx_mock, temp_storage, url_builder):
+    """The tree is not checked again before the minimum interval."""
+    requests = _tree_server(httpx_mock, url_builder, "sha")
+    async with httpx.AsyncClient() as client:
+        await get_github_sha(client, temp_storage, url_builder, 60)
+        # another process sharing the same storage
+        assert await get_github_sha(client, temp_storage, url_builder, 60) == "sha"
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_github_sha_unreachable(httpx_mock, temp_storage, url_builder):
+    """The last known tree is used when GitHub refuses the request."""
+    _tree_server(httpx_mock, url_builder, "sha")
+    async with httpx.AsyncClient() as client:
+        await get_github_sha(client, temp_storage, url_builder, 0)
+    httpx_mock.reset(assert_all_responses_were_requested=True)
+    httpx_mock.add_response(url=url_builder.dir_sha_url, status_code=403, json={})
+    async with httpx.AsyncClient() as client:
+        assert await get_github_sha(client, temp_storage, url_builder, 0) == "sha"
+        temp_storage.cache_directory.joinpath("github").rename(
+            temp_storage.cache_directory / "old"
+        )
+        with pytest.raises(ValueError):
+            await get_github_sha(client, temp_storage, url_builder, 0)
+
+
+@pytest.mark.asyncio
+async def test_get_github_sha_offline(httpx_mock, temp_storage, url_builder):
+    """The last known tree is used when GitHub can't be reached."""
+    _tree_server(httpx_mock, url_builder, "sha")
+    async with httpx.AsyncClient() as client:
+        await get_github_sha(client, temp_storage, url_builder, 0)
+    httpx_mock.reset(assert_all_responses_were_requested=True)
+    httpx_mock.add_exception(httpx.ConnectError("no DNS"), url=url_builder.dir_sha_url)
+    async with httpx.AsyncClient() as client:
+        assert await get_github_sha(client, temp_storage, url_builder, 0) == "sha"
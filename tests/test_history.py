@@ -0,0 +1,108 @@
+"""Telemetry history tests."""
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import pytest
+from psa_ccc import models
+from psa_ccc.client import get_decoder
+from psa_ccc.history import COLUMNS
+from psa_ccc.history import HistoryStore
+from psa_ccc.history import get_sample
+
+
+def _sample(timestamp: float, mileage: float, level: float) -> tuple[float, ...]:
+    return (timestamp, 46.0, 11.1, math.nan, mileage, level, 100.0, 0.0, 12.0)
+
+
+def _raw(frame) -> dict[str, bytes]:
+    # compares the NaN too
+    return {name: column.tobytes() for name, column in frame.columns.items()}
+
+
+def _fill(store: HistoryStore, vehicle_id: str = "myId") -> None:
+    # drives 1 km and uses 1% every minute, then charges
+    for minute in range(100):
+        store.append_sample(
+            vehicle_id, _sample(minute * 60, 1000 + minute, 90 - minute)
+        )
+    store.append_sample(vehicle_id, _sample(100 * 60, 1100, 80))
+
+
+def test_get_sample(status_text) -> None:
+    status = get_decoder(models.VehicleStatus).decode(status_text(moving=True))
+    sample = dict(zip(COLUMNS, get_sample(status), strict=True))
+    assert sample == {
+        "timestamp": status.updated_at.timestamp(),
+        "latitude": 46.0059,
+        "longitude": 11.12524,
+        "altitude": 192,
+        "mileage": 14529.9,
+        "level": 43,
+        "autonomy": 128,
+        "speed": 0,
+        "voltage": 82,
+    }
+
+
+def test_append_skips_old_samples(status_text) -> None:
+    status = get_decoder(models.VehicleStatus).decode(status_text())
+    store = HistoryStore()
+    assert store.append("myId", status)
+    assert not store.append("myId", status)
+    assert len(store.query("myId")) == 1
+
+
+def test_range_queries_and_aggregations() -> None:
+    store = HistoryStore()
+    _fill(store)
+    frame = store.query("myId", start=10 * 60, end=20 * 60)
+    assert len(frame) == 10
+    assert frame["timestamp"][0] == 600
+    assert frame.min("mileage") == 1010
+    assert frame.max("mileage") == 1019
+    assert frame.mean("level") == 75.5
+    assert frame.distance() == 9
+    assert frame.energy_used() == 9
+    assert frame.duration() == 540
+    assert math.isnan(frame.mean("altitude"))
+    whole = store.query("myId")
+    assert len(whole) == 101
+    # the final charge isn't energy used
+    assert whole.energy_used() == 99
+    assert len(store.query("otherId")) == 0
+
+
+@pytest.mark.parametrize("segment_size", [7, 1000])
+def test_segments_on_disk(tmp_path: Path, segment_size: int) -> None:
+    store = HistoryStore(tmp_path, segment_size=segment_size)
+    _fill(store)
+    expected = HistoryStore()
+    _fill(expected)
+    for start, end in [(None, None), (0, 1), (400, 3000), (5999, None)]:
+        assert _raw(store.query("myId", start, end)) == _raw(
+            expected.query("myId", start, end)
+        )
+    store.close()
+    reopened = HistoryStore(tmp_path, segment_size=segment_size)
+    assert len(list((tmp_path / "myId").glob("*.seg"))) == -(-101 // segment_size)
+    assert _raw(reopened.query("myId")) == _raw(expected.query("myId"))
+    assert not reopened.append_sample("myId", _sample(0, 0, 0))
+    reopened.close()
+
+
+@pytest.mark.skipif(not Path("/proc/self/maps").exists(), reason="needs procfs")
+def test_segments_are_unmapped_after_queries(tmp_path: Path) -> None:
+    store = HistoryStore(tmp_path, segment_size=7)
+    _fill(store)
+    assert len(store.query("myId")) == 101
+    assert str(tmp_path) not in Path("/proc/self/maps").read_text()
+    store.close()
+
+
+def test_query_unknown_vehicle(tmp_path: Path) -> None:
+    store = HistoryStore(tmp_path)
+    assert len(store.query("otherId")) == 0
+    assert "otherId" not in store._vehicles
+    assert not (tmp_path / "otherId").exists()
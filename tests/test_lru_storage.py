@@ -0,0 +1,81 @@
+"""In-memory storage cache tests."""
+from __future__ import annotations
+
+import os
+
+import pytest
+from psa_ccc.lru_storage import LRUCacheStorage
+from psa_ccc.storage import SimpleCacheStorage
+
+
+@pytest.fixture
+def storage(temp_storage: SimpleCacheStorage) -> LRUCacheStorage:
+    """Cache of the files smaller than 1 KiB, up to 100 bytes."""
+    return LRUCacheStorage(temp_storage, max_bytes=100, max_file_bytes=1024)
+
+
+def test_read_hits_memory(storage: LRUCacheStorage, monkeypatch) -> None:
+    storage.storage.save(b"config", "config.json")
+    assert storage.read("config.json") == b"config"
+    monkeypatch.setattr(storage.storage, "read", None)
+    assert storage.read("config.json") == b"config"
+    assert (storage.stats.hits, storage.stats.misses) == (1, 1)
+
+
+def test_save_writes_through(storage: LRUCacheStorage) -> None:
+    storage.save(b"config", "config.json")
+    assert storage.storage.read("config.json") == b"config"
+    assert storage.read("config.json") == b"config"
+    assert (storage.stats.hits, storage.stats.misses) == (1, 0)
+
+
+def test_writer_drops_the_cached_file(storage: LRUCacheStorage) -> None:
+    storage.save(b"old", "config.json")
+    with storage.writer("config.json") as file:
+        file.write(b"new")
+    assert storage.size == 0
+    assert storage.read("config.json") == b"new"
+    assert storage.stats.misses == 1
+
+
+def test_changed_file_is_read_again(storage: LRUCacheStorage) -> None:
+    storage.save(b"old", "config.json")
+    # another process replaces the file
+    path = storage.get_full_path("config.json")
+    path.write_bytes(b"new content")
+    assert storage.read("config.json") == b"new content"
+    assert storage.stats.misses == 1
+
+
+def test_least_recently_used_files_are_evicted(storage: LRUCacheStorage) -> None:
+    for name in "abc":
+        storage.save(bytes(40), name)
+    assert storage.size == 80
+    assert storage.stats.evictions == 1
+    storage.read("b")
+    storage.read("a")
+    assert (storage.stats.hits, storage.stats.misses) == (1, 1)
+
+
+def test_big_files_are_not_kept(storage: LRUCacheStorage) -> None:
+    storage.save(bytes(500), "big")
+    storage.read("big")
+    storage.read("big")
+    assert storage.size == 0
+    assert storage.stats.misses == 2
+
+
+def test_huge_files_are_read_through(storage: LRUCacheStorage) -> None:
+    storage.save(bytes(50), "config.json")
+    data = os.urandom(4096)
+    storage.save(data, "app.apk")
+    assert storage.read("app.apk") == data
+    assert storage.read("config.json") == bytes(50)
+    assert (storage.stats.hits, storage.stats.misses) == (1, 1)
+    assert storage.stats.evictions == 0
+
+
+def test_missing_file(storage: LRUCacheStorage) -> None:
+    assert not storage.exists("missing")
+    with pytest.raises(FileNotFoundError):
+        storage.read("missing")
@@ -1,9 +1,16 @@
 """OAuth2 client tests."""
 from __future__ import annotations
 
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+import httpx
 import pytest
 from httpx import URL
+from psa_ccc.auth import PSAOAuth2Client
 from psa_ccc.auth import create_client
+from psa_ccc.auth import oauth_factory
 from psa_ccc.memory_token_storage import MemoryTokenStorage
 
 
@@ -17,3 +24,228 @@ async def test_create_client() -> None:
     assert client.metadata["token_endpoint"] == "myTokenUrl"
     assert client.scope == "openid profile"
     assert client.base_url == URL("https://api.groupe-psa.com/connectedcar/v4/")
+
+
+TOKEN_URL = "https://idpcvs.peugeot.com/am/oauth2/access_token"  # noqa S105
+API_URL = "https://api.groupe-psa.com/connectedcar/v4/user"
+
+
+def _token_endpoint(httpx_mock, expires_in: int = 3600) -> list[httpx.Request]:
+    calls = []
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(
+            200,
+            json={
+                "access_token": f"new{len(calls)}",
+                "refresh_token": "newRefresh",
+                "token_type": "Bearer",
+                "expires_in": expires_in,
+            },
+        )
+
+    httpx_mock.add_callback(respond, url=TOKEN_URL)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_expiring_requests_refresh_once(httpx_mock) -> None:
+    """Many requests with an expired token trigger a single refresh."""
+    token_calls = _token_endpoint(httpx_mock)
+    httpx_mock.add_response(url=f"{API_URL}?client_id=myId", json={})
+    storage = MemoryTokenStorage()
+    client = await create_client("myId", "mySecret", TOKEN_URL, "myRealm", storage)
+    client.token = {
+        "access_token": "old",
+        "refresh_token": "oldRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) - 10,
+    }
+
+    responses = await asyncio.gather(*(client.get("/user") for _ in range(100)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(token_calls) == 1
+    api_requests = [
+        request for request in httpx_mock.get_requests() if request.url != TOKEN_URL
+    ]
+    assert len(api_requests) == 100
+    assert {request.headers["Authorization"] for request in api_requests} == {
+        "Bearer new1"
+    }
+    assert (await storage.load())["access_token"] == "new1"
+
+
+@pytest.mark.asyncio
+async def test_token_is_refreshed_before_expiration(httpx_mock) -> None:
+    """Requests in the leeway window refresh the token ahead of time."""
+    token_calls = _token_endpoint(httpx_mock)
+    httpx_mock.add_response(url=f"{API_URL}?client_id=myId", json={})
+    client = await create_client(
+        "myId", "mySecret", TOKEN_URL, "myRealm", MemoryTokenStorage(), leeway=60
+    )
+    client.token = {
+        "access_token": "old",
+        "refresh_token": "oldRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) + 30,
+    }
+    await client.get("/user")
+    assert len(token_calls) == 1
+    await client.get("/user")
+    assert len(token_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_background_refresh(httpx_mock) -> None:
+    """The token is renewed in the background, without any request."""
+    token_calls = _token_endpoint(httpx_mock)
+    storage = MemoryTokenStorage()
+    client = await create_client(
+        "myId", "mySecret", TOKEN_URL, "myRealm", storage, leeway=60
+    )
+    client.token = {
+        "access_token": "old",
+        "refresh_token": "oldRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) + 60,
+    }
+    client.refresher.start()
+    await asyncio.sleep(0.1)
+    await client.aclose()
+    assert len(token_calls) == 1
+    assert client.token["access_token"] == "new1"
+    assert (await storage.load())["access_token"] == "new1"
+
+
+@pytest.mark.asyncio
+async def test_refresh_reuses_token_saved_by_another_worker(httpx_mock) -> None:
+    """A fresh token in the shared storage is adopted instead of refreshing."""
+    httpx_mock.add_response(url=f"{API_URL}?client_id=myId", json={})
+    storage = MemoryTokenStorage()
+    await storage.save(
+        {
+            "access_token": "fromOtherWorker",
+            "refresh_token": "newRefresh",
+            "token_type": "Bearer",
+            "expires_at": int(time.time()) + 3600,
+        }
+    )
+    client = await create_client("myId", "mySecret", TOKEN_URL, "myRealm", storage)
+    client.token = {
+        "access_token": "old",
+        "refresh_token": "oldRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) - 10,
+    }
+    await client.get("/user")
+    assert httpx_mock.get_request().headers["Authorization"] == "Bearer fromOtherWorker"
+
+
+def _grant_endpoint(httpx_mock, reject_refresh: bool = False) -> list[str]:
+    grants = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        grant_type = parse_qs(request.content.decode())["grant_type"][0]
+        grants.append(grant_type)
+        if reject_refresh and grant_type == "refresh_token":
+            return httpx.Response(400, json={"error": "invalid_grant"})
+        return httpx.Response(
+            200,
+            json={
+                "access_token": grant_type,
+                "refresh_token": "newRefresh",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            },
+        )
+
+    httpx_mock.add_callback(respond, url=TOKEN_URL)
+    return grants
+
+
+async def _factory(storage: MemoryTokenStorage) -> PSAOAuth2Client:
+    client = await oauth_factory(
+        "myId", "mySecret", "me", "secret", TOKEN_URL, "myRealm", storage
+    )
+    await client.aclose()
+    return client
+
+
+def _stored_token(expires_in: int) -> dict[str, str | int]:
+    return {
+        "access_token": "stored",
+        "refresh_token": "storedRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) + expires_in,
+    }
+
+
+@pytest.mark.asyncio
+async def test_oauth_factory_cold_start(httpx_mock) -> None:
+    """Without a stored token the user logs in with the password."""
+    grants = _grant_endpoint(httpx_mock)
+    storage = MemoryTokenStorage()
+    client = await _factory(storage)
+    assert grants == ["password"]
+    assert client.token["access_token"] == "password"
+    assert (await storage.load())["access_token"] == "password"
+
+
+@pytest.mark.asyncio
+async def test_oauth_factory_warm_start(httpx_mock) -> None:
+    """A valid stored token is used as is."""
+    storage = MemoryTokenStorage()
+    await storage.save(_stored_token(3600))
+    client = await _factory(storage)
+    assert client.token["access_token"] == "stored"
+    assert httpx_mock.get_requests() == []
+
+
+@pytest.mark.asyncio
+async def test_oauth_factory_refreshes_stored_token(httpx_mock) -> None:
+    """An expired stored token is refreshed instead of logging in."""
+    grants = _grant_endpoint(httpx_mock)
+    storage = MemoryTokenStorage()
+    await storage.save(_stored_token(-10))
+    client = await _factory(storage)
+    assert grants == ["refresh_token"]
+    assert client.token["access_token"] == "refresh_token"
+
+
+@pytest.mark.asyncio
+async def test_oauth_factory_falls_back_to_password(httpx_mock) -> None:
+    """The user logs in again if the stored token can't be refreshed."""
+    grants = _grant_endpoint(httpx_mock, reject_refresh=True)
+    storage = MemoryTokenStorage()
+    await storage.save(_stored_token(-10))
+    client = await _factory(storage)
+    assert grants == ["refresh_token", "password"]
+    assert client.token["access_token"] == "password"
+
+
+@pytest.mark.asyncio
+async def test_older_stored_token_is_not_adopted(httpx_mock) -> None:
+    """A stored token expiring before the current one is ignored."""
+    token_calls = _token_endpoint(httpx_mock)
+    storage = MemoryTokenStorage()
+    await storage.save(
+        {
+            "access_token": "older",
+            "refresh_token": "olderRefresh",
+            "token_type": "Bearer",
+            "expires_at": int(time.time()) - 100,
+        }
+    )
+    client = await create_client("myId", "mySecret", TOKEN_URL, "myRealm", storage)
+    client.token = {
+        "access_token": "old",
+        "refresh_token": "oldRefresh",
+        "token_type": "Bearer",
+        "expires_at": int(time.time()) - 10,
+    }
+    await client.refresher.refresh()
+    assert len(token_calls) == 1
+    assert parse_qs(token_calls[0].content.decode())["refresh_token"] == ["oldRefresh"]
@@ -0,0 +1,143 @@
+"""Client pool tests."""
+from __future__ import annotations
+
+import asyncio
+import re
+from urllib.parse import parse_qs
+
+import httpx
+import psa_ccc
+import pytest
+from psa_ccc.apk_parser import ConfigInfo
+from psa_ccc.pool import Account
+from psa_ccc.pool import PSAClientPool
+from psa_ccc.rate_limit import RateLimitedTransport
+from psa_ccc.rate_limit import RateLimiter
+
+USER = '{"email":"me","firstName":"Me","lastName":"Me","_embedded":{"vehicles":[]}}'
+
+
+@pytest.fixture
+def grants(httpx_mock, monkeypatch) -> list[str]:
+    """Fake configuration and token endpoint, returning the requested grants."""
+
+    async def get_config(
+        brand, email, password, country_code, storage, executor, remote_apk
+    ):
+        return ConfigInfo(
+            client_id=f"{brand}Id",
+            client_secret="secret",  # noqa S106
+            site_code="",
+            brand_id="",
+            culture="",
+            public_certificate=None,
+            private_key=None,
+        )
+
+    monkeypatch.setattr(psa_ccc, "get_config", get_config)
+    grants = []
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        form = parse_qs(request.content.decode())
+        grants.append(f"{form['grant_type'][0]}:{form.get('username', [''])[0]}")
+        await asyncio.sleep(0.01)
+        return httpx.Response(
+            200,
+            json={
+                "access_token": "token",
+                "refresh_token": "refresh",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            },
+        )
+
+    httpx_mock.add_callback(respond, url=re.compile(r"https://idpcvs\..*"))
+    return grants
+
+
+@pytest.mark.asyncio
+async def test_clients_share_the_transport(grants, temp_storage) -> None:
+    pool = PSAClientPool(temp_storage)
+    peugeot = pool.add_account(Account("Peugeot", "IT", "a@mail.com", "pwd"))
+    opel = pool.add_account(Account("Opel", "DE", "b@mail.com", "pwd"))
+    first = await pool.get(peugeot)
+    second = await pool.get(opel)
+    assert first is not second
+    assert first.client._transport is pool.transport
+    assert second.client._transport is pool.transport
+    assert await pool.get(peugeot) is first
+    assert sorted(grants) == ["password:a@mail.com", "password:b@mail.com"]
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_clients_share_the_rate_limiter(grants, temp_storage) -> None:
+    limiter = RateLimiter()
+    pool = PSAClientPool(temp_storage, rate_limiter=limiter)
+    key = pool.add_account(Account("Peugeot", "IT", "a@mail.com", "pwd"))
+    client = await pool.get(key)
+    transport = client.client._transport
+    assert isinstance(transport, RateLimitedTransport)
+    assert transport.transport is pool.transport
+    assert transport.limiter is limiter
+    assert transport.account == key
+    # the token request went through the limiter too
+    assert limiter.stats.requests == 2
+    await pool.remove_account(key)
+    assert limiter.account_bucket(key).stats.requests == 0
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_creates_one_client(grants, temp_storage) -> None:
+    pool = PSAClientPool(temp_storage)
+    key = pool.add_account(Account("Peugeot", "IT", "a@mail.com", "pwd"))
+    clients = await asyncio.gather(*(pool.get(key) for _ in range(10)))
+    assert all(client is clients[0] for client in clients)
+    assert grants == ["password:a@mail.com"]
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_client_is_dropped(grants, temp_storage) -> None:
+    pool = PSAClientPool(temp_storage, max_sessions=2)
+    keys = [
+        pool.add_account(Account("Peugeot", "IT", f"{user}@mail.com", "pwd"))
+        for user in "abc"
+    ]
+    first = await pool.get(keys[0])
+    await pool.get(keys[1])
+    await pool.get(keys[0])
+    await pool.get(keys[2])
+    assert len(pool) == 2
+    assert await pool.get(keys[0]) is first
+    # the token of the dropped account is reused, no new login
+    await pool.get(keys[1])
+    assert len(grants) == 3
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_idle_client_is_dropped(grants, temp_storage) -> None:
+    now = [0.0]
+    pool = PSAClientPool(temp_storage, max_idle=60, clock=lambda: now[0])
+    key = pool.add_account(Account("Peugeot", "IT", "a@mail.com", "pwd"))
+    first = await pool.get(key)
+    now[0] = 61
+    await pool.evict_idle()
+    assert len(pool) == 0
+    assert await pool.get(key) is not first
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pooled_client_requests(grants, httpx_mock, temp_storage) -> None:
+    httpx_mock.add_response(
+        url=re.compile(r"https://api\.groupe-psa\.com/.*"), text=USER
+    )
+    pool = PSAClientPool(temp_storage)
+    key = pool.add_account(Account("Peugeot", "IT", "a@mail.com", "pwd"))
+    client = await pool.get(key)
+    user = await client.get_user()
+    assert user.email == "me"
+    await pool.aclose()
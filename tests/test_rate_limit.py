@@ -0,0 +1,121 @@
+"""Rate limiter tests."""
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+from psa_ccc.client import PSAClient
+from psa_ccc.rate_limit import Rate
+from psa_ccc.rate_limit import RateLimiter
+from psa_ccc.rate_limit import TokenBucket
+
+URL = "https://api.groupe-psa.com/connectedcar/v4"
+USER = '{"email":"me","firstName":"Me","lastName":"Me","_embedded":{"vehicles":[]}}'
+
+
+class FakeTime:
+    """Clock advanced only by the fake sleep."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def clock(self) -> float:
+        """Returns the current fake time."""
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        """Records the delay, without advancing the clock."""
+        self.sleeps.append(delay)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_bursts() -> None:
+    fake_time = FakeTime()
+    bucket = TokenBucket(Rate(2.0, 3), fake_time.clock, fake_time.sleep)
+    assert [await bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await bucket.acquire() == 0.5
+    fake_time.now = 10.0
+    assert await bucket.acquire() == 0.0
+    assert bucket.stats.requests == 5
+    assert bucket.stats.delayed == 1
+
+
+@pytest.mark.asyncio
+async def test_bucket_queues_in_order() -> None:
+    fake_time = FakeTime()
+    bucket = TokenBucket(Rate(2.0, 1), fake_time.clock, fake_time.sleep)
+    delays = await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+    assert delays == [0.0, 0.5, 1.0, 1.5, 2.0]
+    assert bucket.stats.max_wait == 2.0
+    assert bucket.stats.waited == 5.0
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_and_cancellation() -> None:
+    release = asyncio.Event()
+
+    async def sleep(delay: float) -> None:
+        await release.wait()
+
+    limiter = RateLimiter(
+        account_rate=Rate(1.0, 1), host_rates={}, clock=lambda: 0.0, sleep=sleep
+    )
+    await limiter.acquire("account", "example.com")
+    waiting = [
+        asyncio.ensure_future(limiter.acquire("account", "example.com"))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 3
+    waiting[0].cancel()
+    await asyncio.sleep(0)
+    assert limiter.queue_depth == 2
+    release.set()
+    assert await asyncio.gather(*waiting[1:]) == [2.0, 3.0]
+    assert limiter.queue_depth == 0
+    # the token booked by the cancelled request was given back
+    assert limiter.account_bucket("account").reserve() == 3.0
+
+
+@pytest.mark.asyncio
+async def test_buckets_per_account_and_host() -> None:
+    fake_time = FakeTime()
+    limiter = RateLimiter(
+        account_rate=Rate(1.0, 1),
+        host_rates={"idpcvs.*": Rate(1.0, 2)},
+        clock=fake_time.clock,
+        sleep=fake_time.sleep,
+    )
+    assert await limiter.acquire("first", "idpcvs.peugeot.com") == 0.0
+    assert await limiter.acquire("second", "idpcvs.peugeot.com") == 0.0
+    # the host is out of tokens
+    assert await limiter.acquire("third", "idpcvs.peugeot.com") == 1.0
+    # the account is out of tokens, the other host is not
+    assert await limiter.acquire("first", "idpcvs.opel.com") == 1.0
+    assert limiter.host_bucket("github.com") is None
+    assert limiter.host_bucket("idpcvs.peugeot.com") is not None
+    assert limiter.stats.requests == 8
+    limiter.forget("first")
+    assert await limiter.acquire("first", "github.com") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_client_requests_are_rate_limited(httpx_mock) -> None:
+    fake_time = FakeTime()
+    limiter = RateLimiter(
+        account_rate=Rate(1.0, 1),
+        host_rates={"api.groupe-psa.com": Rate(10.0, 1)},
+        clock=fake_time.clock,
+        sleep=fake_time.sleep,
+    )
+    httpx_mock.add_response(url=f"{URL}/user", text=USER)
+    transport = limiter.wrap(httpx.AsyncHTTPTransport(), account="Peugeot:me")
+    async with httpx.AsyncClient(base_url=URL, transport=transport) as http_client:
+        client = PSAClient(client=http_client)
+        await client.get_user()
+        await client.get_user()
+    assert fake_time.sleeps == [1.0, 0.1]
+    assert len(httpx_mock.get_requests()) == 2
@@ -0,0 +1,116 @@
+"""Remote ZIP reader tests."""
+from __future__ import annotations
+
+import io
+import json
+import re
+import zipfile
+from typing import Callable
+
+import httpx
+import pytest
+from psa_ccc.apk_parser import ConfigInfo
+from psa_ccc.apk_parser import _extract_configs
+from psa_ccc.brand_config import BRAND_CONFIG_MAP
+from psa_ccc.remote_zip import RemoteZip
+
+from tests.helpers import CULTURES
+
+URL = "https://github.com/flobz/psa_apk/raw/main/mypeugeot.apk"
+
+
+def _range_server(data: bytes, requests: list[str]) -> Callable:
+    """HTTP server honoring the Range header over the given file."""
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        byte_range = request.headers["Range"].removeprefix("bytes=")
+        requests.append(byte_range)
+        start, _, end = byte_range.partition("-")
+        if not start:
+            first, last = max(len(data) - int(end), 0), len(data) - 1
+        else:
+            first, last = int(start), min(int(end), len(data) - 1)
+        return httpx.Response(
+            206,
+            content=data[first : last + 1],
+            headers={"Content-Range": f"bytes {first}-{last}/{len(data)}"},
+        )
+
+    return respond
+
+
+@pytest.mark.asyncio
+async def test_read_only_the_requested_entries(apk_data: bytes, httpx_mock) -> None:
+    requests: list[str] = []
+    httpx_mock.add_callback(_range_server(apk_data, requests), url=URL)
+    async with httpx.AsyncClient() as client:
+        remote_zip = await RemoteZip.open(client, URL)
+        contents = await remote_zip.read_many(
+            ["res/raw/cultures.json", "assets/MWPMYMA1.pfx"]
+        )
+    archive = zipfile.ZipFile(io.BytesIO(apk_data))
+    assert remote_zip.namelist() == archive.namelist()
+    assert contents == {name: archive.read(name) for name in contents}
+    assert len(requests) == 3
+    assert remote_zip.downloaded < len(apk_data) / 10
+
+
+@pytest.mark.asyncio
+async def test_central_directory_out_of_the_tail(httpx_mock) -> None:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        for index in range(1000):
+            archive.writestr(f"res/drawable/image_with_long_name_{index}.png", b"")
+        archive.writestr("res/raw/cultures.json", "{}")
+    requests: list[str] = []
+    httpx_mock.add_callback(_range_server(data.getvalue(), requests), url=URL)
+    async with httpx.AsyncClient() as client:
+        remote_zip = await RemoteZip.open(client, URL)
+        assert await remote_zip.read("res/raw/cultures.json") == b"{}"
+    assert len(remote_zip.namelist()) == 1001
+    assert len(requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_unsupported_compression(httpx_mock) -> None:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", compression=zipfile.ZIP_BZIP2) as archive:
+        archive.writestr("res/raw/cultures.json", "{}")
+    httpx_mock.add_callback(_range_server(data.getvalue(), []), url=URL)
+    async with httpx.AsyncClient() as client:
+        remote_zip = await RemoteZip.open(client, URL)
+        with pytest.raises(zipfile.BadZipFile, match="compression method 12"):
+            await remote_zip.read("res/raw/cultures.json")
+
+
+@pytest.mark.asyncio
+async def test_full_download_if_range_is_ignored(apk_data: bytes, httpx_mock) -> None:
+    httpx_mock.add_response(url=URL, content=apk_data)
+    async with httpx.AsyncClient() as client:
+        remote_zip = await RemoteZip.open(client, URL)
+        cultures = await remote_zip.read("res/raw/cultures.json")
+    assert json.loads(cultures) == CULTURES
+    assert remote_zip.downloaded == len(apk_data)
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_extract_remote_configs(
+    apk_data: bytes, httpx_mock, temp_storage
+) -> None:
+    requests: list[str] = []
+    httpx_mock.add_callback(
+        _range_server(apk_data, requests), url=re.compile(r"https://github\.com/.*")
+    )
+    async with httpx.AsyncClient() as client:
+        configs = await _extract_configs(
+            client, BRAND_CONFIG_MAP["Peugeot"], temp_storage, ["IT"], None, True
+        )
+    config = configs["IT"]
+    assert isinstance(config, ConfigInfo)
+    assert config.client_id == "it_ITId"
+    assert config.brand_id == "https://id-dcr.peugeot.com/mobile-services"
+    assert config.culture == "it_IT"
+    assert config.private_key is not None
+    # tail with the central directory, cultures, then the other three entries
+    assert len(requests) == 5
@@ -0,0 +1,132 @@
+"""Retry policy tests."""
+from __future__ import annotations
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+from psa_ccc.client import ApiError
+from psa_ccc.client import PSAClient
+from psa_ccc.retry import RetryPolicy
+from psa_ccc.retry import parse_retry_after
+
+from tests.helpers import FakeTime
+
+URL = "https://api.groupe-psa.com/connectedcar/v4"
+
+
+def _policy(fake_time: FakeTime, **kwargs) -> RetryPolicy:
+    return RetryPolicy(
+        jitter=lambda: 1.0,
+        clock=fake_time.clock,
+        sleep=fake_time.sleep,
+        **kwargs,
+    )
+
+
+def _responses(*statuses: int, headers: dict[str, str] | None = None):
+    responses = iter(statuses)
+
+    async def request() -> httpx.Response:
+        return httpx.Response(next(responses), headers=headers)
+
+    return request
+
+
+@pytest.mark.asyncio
+async def test_retries_with_exponential_backoff() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time, base_delay=1.0)
+    response = await policy.send(_responses(500, 502, 503, 200))
+    assert response.status_code == 200
+    assert fake_time.sleeps == [1.0, 2.0, 4.0]
+    assert policy.stats.requests == 4
+    assert policy.stats.retries == 3
+    assert policy.stats.failures == 0
+    assert policy.stats.waited == 7.0
+
+
+@pytest.mark.asyncio
+async def test_full_jitter() -> None:
+    fake_time = FakeTime()
+    policy = RetryPolicy(
+        jitter=lambda: 0.25, clock=fake_time.clock, sleep=fake_time.sleep
+    )
+    await policy.send(_responses(500, 500, 200))
+    assert fake_time.sleeps == [0.125, 0.25]
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time, max_attempts=2)
+    response = await policy.send(_responses(500, 500))
+    assert response.status_code == 500
+    assert policy.stats.requests == 2
+    assert policy.stats.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time)
+    response = await policy.send(_responses(404))
+    assert response.status_code == 404
+    assert policy.stats.retries == 0
+    assert policy.stats.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_honours_retry_after() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time, base_delay=0.5)
+    await policy.send(_responses(429, 200, headers={"Retry-After": "7"}))
+    assert fake_time.sleeps == [7.5]
+
+
+@pytest.mark.asyncio
+async def test_stops_at_the_deadline() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time, deadline=10.0)
+    response = await policy.send(_responses(429, headers={"Retry-After": "60"}))
+    assert response.status_code == 429
+    assert fake_time.sleeps == []
+    assert policy.stats.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_transport_errors() -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time, max_attempts=3)
+
+    async def request() -> httpx.Response:
+        raise httpx.ConnectError("unreachable")
+
+    with pytest.raises(httpx.ConnectError):
+        await policy.send(request)
+    assert policy.stats.requests == 3
+    assert policy.stats.failures == 1
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < parse_retry_after(format_datetime(later, usegmt=True)) <= 30
+
+
+@pytest.mark.asyncio
+async def test_client_retries_get_requests(httpx_mock) -> None:
+    fake_time = FakeTime()
+    policy = _policy(fake_time)
+    httpx_mock.add_response(url=f"{URL}/user", status_code=502)
+    async with httpx.AsyncClient(base_url=URL) as http_client:
+        client = PSAClient(client=http_client, retry=policy)
+        with pytest.raises(ApiError):
+            await client.get_user()
+    assert len(httpx_mock.get_requests()) == policy.max_attempts
+    assert policy.stats.failures == 1
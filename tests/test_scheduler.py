@@ -0,0 +1,209 @@
+"""Polling scheduler tests."""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from contextlib import suppress
+
+import pytest
+from psa_ccc import models
+from psa_ccc.client import ApiError
+from psa_ccc.client import FleetStatusResult
+from psa_ccc.client import get_decoder
+from psa_ccc.scheduler import PollIntervals
+from psa_ccc.scheduler import PollScheduler
+from psa_ccc.scheduler import VehicleActivity
+from psa_ccc.scheduler import get_activity
+
+from tests.helpers import FakeTime
+
+INTERVALS = PollIntervals(
+    driving=0.01, charging=0.02, started=0.02, parked=10, error=0.05
+)
+
+
+async def _stop(task: asyncio.Task) -> None:
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+def _scheduler(fetch, on_result, fake_time: FakeTime, **kwargs) -> PollScheduler:
+    kwargs = {"spread": 0, "jitter": 0, **kwargs}
+    return PollScheduler(
+        fetch,
+        on_result,
+        INTERVALS,
+        clock=fake_time.clock,
+        sleep=fake_time.sleep,
+        **kwargs,
+    )
+
+
+async def _run_until_limit(scheduler: PollScheduler, fake_time: FakeTime) -> None:
+    """Runs the scheduler until it waits for a poll past the time limit."""
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.wait_for(fake_time.reached.wait(), 5)
+    await _stop(task)
+
+
+def _status(status_text, **kwargs) -> models.VehicleStatus:
+    return get_decoder(models.VehicleStatus).decode(status_text(**kwargs))
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "activity"),
+    [
+        ({}, VehicleActivity.PARKED),
+        ({"ignition": "Start"}, VehicleActivity.STARTED),
+        ({"ignition": "Start", "moving": True}, VehicleActivity.DRIVING),
+        ({"charging": "InProgress"}, VehicleActivity.CHARGING),
+        ({"charging": "Finished"}, VehicleActivity.PARKED),
+    ],
+)
+def test_get_activity(status_text, kwargs, activity) -> None:
+    assert get_activity(_status(status_text, **kwargs)) == activity
+    assert PollIntervals().get(activity) > 0
+
+
+@pytest.mark.asyncio
+async def test_intervals_follow_the_activity(status_text) -> None:
+    statuses = {
+        "parked": _status(status_text),
+        "driving": _status(status_text, moving=True),
+        "charging": _status(status_text, charging="InProgress"),
+    }
+    polls: Counter[str] = Counter()
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        polls[vehicle_id] += 1
+        return statuses[vehicle_id]
+
+    async def on_result(result: FleetStatusResult) -> None:
+        assert result.status is statuses[result.vehicle_id]
+
+    fake_time = FakeTime(limit=0.205)
+    scheduler = _scheduler(fetch, on_result, fake_time)
+    scheduler.add(statuses)
+    await _run_until_limit(scheduler, fake_time)
+    assert polls == {"parked": 1, "charging": 11, "driving": 21}
+    assert scheduler.activities == {
+        "parked": VehicleActivity.PARKED,
+        "driving": VehicleActivity.DRIVING,
+        "charging": VehicleActivity.CHARGING,
+    }
+    assert scheduler.next_poll("parked") == 10
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [ValueError, ApiError])
+async def test_errors_are_reported_and_retried_later(
+    error: type[BaseException],
+) -> None:
+    results: list[FleetStatusResult] = []
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        raise error(vehicle_id)
+
+    async def on_result(result: FleetStatusResult) -> None:
+        results.append(result)
+
+    fake_time = FakeTime(limit=0.08)
+    scheduler = _scheduler(fetch, on_result, fake_time)
+    scheduler.add(["broken"])
+    await _run_until_limit(scheduler, fake_time)
+    assert len(results) == 2
+    assert all(isinstance(result.error, error) for result in results)
+    assert scheduler.next_poll("broken") == pytest.approx(0.1)
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_delays_the_next_poll(status_text) -> None:
+    status = _status(status_text, moving=True)
+    polls = 0
+    release = asyncio.Event()
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        nonlocal polls
+        polls += 1
+        return status
+
+    async def on_result(result: FleetStatusResult) -> None:
+        await release.wait()
+
+    fake_time = FakeTime(limit=0.995)
+    scheduler = _scheduler(fetch, on_result, fake_time)
+    scheduler.add(["car"])
+    task = asyncio.create_task(scheduler.run())
+    for _ in range(100):
+        await asyncio.sleep(0)
+    # nothing is scheduled until the result is consumed
+    assert polls == 1
+    assert scheduler.next_poll("car") is None
+    release.set()
+    await asyncio.wait_for(fake_time.reached.wait(), 5)
+    await _stop(task)
+    assert polls == 100
+
+
+@pytest.mark.asyncio
+async def test_many_vehicles_are_spread_and_bounded(status_text) -> None:
+    status = _status(status_text)
+    in_flight = 0
+    max_in_flight = 0
+    polled: list[str] = []
+    # the first polls wait for each other
+    all_in_flight = asyncio.Event()
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        if in_flight == 20:
+            all_in_flight.set()
+        await all_in_flight.wait()
+        in_flight -= 1
+        polled.append(vehicle_id)
+        return status
+
+    async def on_result(result: FleetStatusResult) -> None:
+        pass
+
+    fake_time = FakeTime(limit=1)
+    scheduler = _scheduler(fetch, on_result, fake_time, concurrency=20, spread=0.05)
+    scheduler.add(f"car{index}" for index in range(2000))
+    scheduler.remove("car0")
+    assert len(scheduler) == 1999
+    slots = Counter(
+        int(scheduler.next_poll(f"car{index}") / 0.005) for index in range(1, 2000)
+    )
+    # the first polls are spread evenly over the ten slots
+    assert sorted(slots) == list(range(10))
+    assert all(100 < count < 300 for count in slots.values())
+    await _run_until_limit(scheduler, fake_time)
+    assert sorted(polled) == sorted(f"car{index}" for index in range(1, 2000))
+    assert max_in_flight == 20
+
+
+@pytest.mark.asyncio
+async def test_poll_now(status_text) -> None:
+    status = _status(status_text)
+    polled = asyncio.Event()
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        polled.set()
+        return status
+
+    async def on_result(result: FleetStatusResult) -> None:
+        pass
+
+    # the clock never reaches the first poll
+    fake_time = FakeTime(limit=0)
+    scheduler = _scheduler(fetch, on_result, fake_time, spread=100)
+    scheduler.add(["car"])
+    task = asyncio.create_task(scheduler.run())
+    await asyncio.wait_for(fake_time.reached.wait(), 5)
+    assert not polled.is_set()
+    scheduler.poll_now("car")
+    await asyncio.wait_for(polled.wait(), 5)
+    await _stop(task)
@@ -1,8 +1,11 @@
 """Simple Cache Storage tests."""
 from __future__ import annotations
 
+import threading
+
 import pytest
 from psa_ccc.storage import SimpleCacheStorage
+from psa_ccc.storage import ensure_async_storage
 
 
 def test_file_doesnt_exist(temp_storage: SimpleCacheStorage) -> None:
@@ -28,3 +31,71 @@ def test_sha(temp_storage: SimpleCacheStorage) -> None:
     temp_storage.save(b"test", filename)
     actual = temp_storage.get_sha(filename)
     assert actual == "30d74d258442c7c65512eafab474568dd706c430"
+
+
+def test_sha_is_remembered(temp_storage: SimpleCacheStorage, monkeypatch) -> None:
+    filename = "test.txt"
+    temp_storage.save(b"test", filename)
+    expected = temp_storage.get_sha(filename)
+    hashes = []
+    monkeypatch.setattr(
+        "psa_ccc.storage.git_blob_sha", lambda path: hashes.append(path) or "new"
+    )
+    assert temp_storage.get_sha(filename) == expected
+    assert hashes == []
+    temp_storage.save(b"changed", filename)
+    assert temp_storage.get_sha(filename) == "new"
+    assert len(hashes) == 1
+
+
+def test_sha_ignores_broken_sidecar(temp_storage: SimpleCacheStorage) -> None:
+    filename = "test.txt"
+    temp_storage.save(b"test", filename)
+    temp_storage.save(b"{not json", f".sha/{filename}.json")
+    assert temp_storage.get_sha(filename) == "30d74d258442c7c65512eafab474568dd706c430"
+
+
+def test_sha_not_existing_file_raises(temp_storage: SimpleCacheStorage) -> None:
+    with pytest.raises(FileNotFoundError):
+        temp_storage.get_sha("test")
+
+
+@pytest.mark.asyncio
+async def test_async_adapter(temp_storage: SimpleCacheStorage) -> None:
+    storage = ensure_async_storage(temp_storage)
+    assert ensure_async_storage(storage) is storage
+    assert not await storage.exists("test.txt")
+    await storage.save(b"test", "test.txt")
+    assert await storage.read("test.txt") == b"test"
+    assert await storage.get_sha("test.txt") == temp_storage.get_sha("test.txt")
+    assert storage.get_full_path("test.txt") == temp_storage.get_full_path("test.txt")
+
+
+@pytest.mark.asyncio
+async def test_async_adapter_runs_off_loop(temp_storage: SimpleCacheStorage) -> None:
+    threads = []
+
+    class RecordingStorage(SimpleCacheStorage):
+        def read(self, filename: str) -> bytes:
+            threads.append(threading.get_ident())
+            return super().read(filename)
+
+    temp_storage.save(b"test", "test.txt")
+    storage = ensure_async_storage(RecordingStorage(temp_storage.cache_directory))
+    assert await storage.read("test.txt") == b"test"
+    assert threads != [threading.get_ident()]
+
+
+def test_save_is_atomic(temp_storage: SimpleCacheStorage, monkeypatch) -> None:
+    temp_storage.save(b"old", "test.txt")
+
+    def fail(*args) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr("psa_ccc.storage.os.replace", fail)
+    with pytest.raises(OSError):
+        temp_storage.save(b"new", "test.txt")
+    assert temp_storage.read("test.txt") == b"old"
+    assert [path.name for path in temp_storage.cache_directory.iterdir()] == [
+        "test.txt"
+    ]
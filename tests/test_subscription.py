@@ -0,0 +1,165 @@
+"""Subscription API tests."""
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from dataclasses import replace
+
+import pytest
+from psa_ccc import models
+from psa_ccc.client import ApiError
+from psa_ccc.client import FleetStatusResult
+from psa_ccc.client import get_decoder
+from psa_ccc.scheduler import PollIntervals
+from psa_ccc.subscription import BackpressurePolicy
+from psa_ccc.subscription import StatusHub
+
+FAST = PollIntervals(driving=0.01, charging=0.01, started=0.01, parked=0.01)
+SLOW = PollIntervals(driving=100, charging=100, started=100, parked=100)
+
+
+async def _never(vehicle_id: str) -> models.VehicleStatus:
+    raise AssertionError("unexpected poll")
+
+
+def _result(vehicle_id: str, mileage: float) -> FleetStatusResult:
+    return FleetStatusResult(vehicle_id, error=ValueError(mileage))
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_the_polls(status_text) -> None:
+    status = get_decoder(models.VehicleStatus).decode(status_text())
+    polls: Counter[str] = Counter()
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        polls[vehicle_id] += 1
+        return status
+
+    hub = StatusHub(fetch, FAST)
+    first = hub.subscribe(["a"])
+    second = hub.subscribe(["a"])
+    received = [await anext(first) for _ in range(3)]
+    received += [await anext(second) for _ in range(3)]
+    assert all(result.status is status for result in received)
+    # every poll reached both subscribers
+    assert 3 <= polls["a"] <= 4
+    # a late subscriber gets the last status right away
+    async with hub.subscribe(["a"]) as late:
+        before = polls["a"]
+        assert (await anext(late)).status is status
+        assert polls["a"] == before
+    await hub.aclose()
+    assert first.closed
+    assert all([result.status is status async for result in first])
+
+
+@pytest.mark.asyncio
+async def test_api_errors_reach_the_subscribers(status_text) -> None:
+    status = get_decoder(models.VehicleStatus).decode(status_text())
+    polls = 0
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        nonlocal polls
+        polls += 1
+        if polls == 1:
+            raise ApiError("Internal Server Error")
+        return status
+
+    hub = StatusHub(fetch, replace(FAST, error=0.01))
+    async with hub.subscribe(["a"]) as subscription:
+        failed = await asyncio.wait_for(anext(subscription), 5)
+        assert isinstance(failed.error, ApiError)
+        assert failed.status is None
+        # the vehicle is still polled after the error
+        recovered = await asyncio.wait_for(anext(subscription), 5)
+        assert recovered.status is status
+    await hub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest() -> None:
+    hub = StatusHub(_never, SLOW)
+    subscription = hub.subscribe(["a"], maxsize=2)
+    for mileage in range(3):
+        await subscription.put(_result("a", mileage))
+    assert subscription.stats.dropped == 1
+    await subscription.aclose()
+    results = [result async for result in subscription]
+    assert [result.error.args[0] for result in results] == [1, 2]
+    await hub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_latest() -> None:
+    hub = StatusHub(_never, SLOW)
+    subscription = hub.subscribe(
+        ["a", "b"], maxsize=10, policy=BackpressurePolicy.COALESCE_LATEST
+    )
+    await subscription.put(_result("a", 1))
+    await subscription.put(_result("b", 1))
+    await subscription.put(_result("a", 2))
+    assert subscription.pending == 2
+    assert subscription.stats.coalesced == 1
+    await subscription.aclose()
+    results = [(r.vehicle_id, r.error.args[0]) async for r in subscription]
+    assert results == [("a", 2), ("b", 1)]
+    await hub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_block_waits_for_the_consumer() -> None:
+    hub = StatusHub(_never, SLOW)
+    subscription = hub.subscribe(["a"], maxsize=1, policy=BackpressurePolicy.BLOCK)
+    await subscription.put(_result("a", 1))
+    blocked = asyncio.ensure_future(subscription.put(_result("a", 2)))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+    assert (await anext(subscription)).error.args[0] == 1
+    await asyncio.wait_for(blocked, 1)
+    # closing releases the producers still waiting
+    blocked = asyncio.ensure_future(subscription.put(_result("a", 3)))
+    await asyncio.sleep(0)
+    await subscription.aclose()
+    await asyncio.wait_for(blocked, 1)
+    assert [r.error.args[0] async for r in subscription] == [2]
+    await hub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_blocked_subscriber_stops_the_polls(status_text) -> None:
+    status = get_decoder(models.VehicleStatus).decode(status_text())
+    polls = 0
+    polled = {count: asyncio.Event() for count in (2, 3)}
+
+    async def fetch(vehicle_id: str) -> models.VehicleStatus:
+        nonlocal polls
+        polls += 1
+        if polls in polled:
+            polled[polls].set()
+        return status
+
+    hub = StatusHub(fetch, FAST)
+    subscription = hub.subscribe(["a"], maxsize=1, policy=BackpressurePolicy.BLOCK)
+    # the first update fills the queue, the second one waits for room
+    await asyncio.wait_for(polled[2].wait(), 5)
+    for _ in range(100):
+        await asyncio.sleep(0)
+    assert polls == 2
+    assert subscription.pending == 1
+    assert hub.scheduler.next_poll("a") is None
+    await anext(subscription)
+    await asyncio.wait_for(polled[3].wait(), 5)
+    await hub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_unsubscribed_vehicles_are_not_polled() -> None:
+    hub = StatusHub(_never, SLOW)
+    first = hub.subscribe(["a", "b"])
+    second = hub.subscribe(["b"])
+    await first.aclose()
+    assert "a" not in hub.scheduler
+    assert "b" in hub.scheduler
+    await second.aclose()
+    assert len(hub.scheduler) == 0
+    await hub.aclose()
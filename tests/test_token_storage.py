@@ -0,0 +1,127 @@
+"""Persistent token storage tests."""
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import time
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from psa_ccc.auth import create_client
+from psa_ccc.file_token_storage import FileTokenStorage
+from psa_ccc.sqlite_token_storage import SQLiteTokenStorage
+
+STORAGES = {
+    "file": lambda directory, account: FileTokenStorage(
+        directory / "tokens.json", account
+    ),
+    "sqlite": lambda directory, account: SQLiteTokenStorage(
+        directory / "tokens.db", account
+    ),
+}
+
+
+def _token(account: str, index: int = 0) -> dict[str, str | int]:
+    return {
+        "access_token": f"{account}-access-{index}",
+        "refresh_token": f"{account}-refresh",
+        "token_type": "Bearer",
+        "expires_at": 1700000000 + index,
+    }
+
+
+def _save_many(kind: str, directory: str, account: str, count: int) -> None:
+    storage = STORAGES[kind](Path(directory), account)
+    for index in range(count):
+        asyncio.run(storage.save(_token(account, index)))
+
+
+@pytest.fixture(params=list(STORAGES))
+def kind(request) -> str:
+    return request.param
+
+
+@pytest.mark.asyncio
+async def test_load_missing_token(kind, tmp_path) -> None:
+    storage = STORAGES[kind](tmp_path, "me@mail.com")
+    assert await storage.load() is None
+
+
+@pytest.mark.asyncio
+async def test_roundtrip_by_account(kind, tmp_path) -> None:
+    first = STORAGES[kind](tmp_path, "first@mail.com")
+    second = STORAGES[kind](tmp_path, "second@mail.com")
+    await first.save(_token("first"))
+    await second.save(_token("second"))
+    await first.save(_token("first", 1))
+    assert await first.load() == _token("first", 1)
+    assert await second.load() == _token("second")
+    # a new instance, like in another worker process, sees the same token
+    assert await STORAGES[kind](tmp_path, "first@mail.com").load() == _token("first", 1)
+
+
+def test_concurrent_processes(kind, tmp_path) -> None:
+    accounts = [f"account{index}" for index in range(4)]
+    processes = [
+        multiprocessing.Process(
+            target=_save_many, args=(kind, str(tmp_path), account, 20)
+        )
+        for account in accounts
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    for account in accounts:
+        storage = STORAGES[kind](tmp_path, account)
+        assert asyncio.run(storage.load()) == _token(account, 19)
+
+
+def test_file_is_replaced_atomically(tmp_path) -> None:
+    storage = FileTokenStorage(tmp_path / "tokens.json", "me")
+    asyncio.run(storage.save(_token("me")))
+    assert json.loads((tmp_path / "tokens.json").read_text()) == {"me": _token("me")}
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "tokens.json",
+        "tokens.json.lock",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_workers_refresh_the_shared_token_once(
+    kind, tmp_path, httpx_mock
+) -> None:
+    token_url = "https://idpcvs.peugeot.com/am/oauth2/access_token"  # noqa S105
+    refresh_tokens = []
+
+    async def respond(request: httpx.Request) -> httpx.Response:
+        refresh_tokens.append(parse_qs(request.content.decode())["refresh_token"])
+        await asyncio.sleep(0)
+        return httpx.Response(
+            200,
+            json={
+                "access_token": f"new{len(refresh_tokens)}",
+                "refresh_token": f"rotated{len(refresh_tokens)}",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            },
+        )
+
+    httpx_mock.add_callback(respond, url=token_url)
+    expired = {**_token("me"), "expires_at": int(time.time()) - 10}
+    await STORAGES[kind](tmp_path, "me").save(expired)
+    # one storage instance per worker, as in separate processes
+    clients = []
+    for _ in range(3):
+        storage = STORAGES[kind](tmp_path, "me")
+        client = await create_client("id", "secret", token_url, "realm", storage)
+        client.token = expired
+        clients.append(client)
+    tokens = await asyncio.gather(*(client.refresher.refresh() for client in clients))
+    assert refresh_tokens == [["me-refresh"]]
+    assert {token["access_token"] for token in tokens} == {"new1"}
+    assert (await STORAGES[kind](tmp_path, "me").load())["refresh_token"] == "rotated1"
@@ -0,0 +1,84 @@
+"""Trip detection tests."""
+from __future__ import annotations
+
+import pytest
+from psa_ccc import models
+from psa_ccc.client import get_decoder
+from psa_ccc.history import HistoryStore
+from psa_ccc.trips import TripDetector
+from psa_ccc.trips import TripPoint
+from psa_ccc.trips import detect_trips
+from psa_ccc.trips import trips_from_history
+
+# minute, ignition, moving, mileage, level
+DAY = [
+    (0, "Stop", False, 1000, 80),
+    (10, "Start", False, 1000, 80),
+    (15, "Start", True, 1005, 78),
+    (20, "Start", True, 1012, 75),
+    (25, "Stop", False, 1015, 74),
+    (30, "Stop", False, 1015, 74),
+    # engine started without driving
+    (40, "Start", False, 1015, 74),
+    (45, "Stop", False, 1015, 74),
+    # back home, the polls missed the whole trip
+    (90, "Stop", False, 1030, 70),
+]
+
+
+@pytest.fixture
+def day_statuses(status_text) -> list[models.VehicleStatus]:
+    decoder = get_decoder(models.VehicleStatus)
+    return [
+        decoder.decode(
+            status_text(
+                mileage=mileage,
+                level=level,
+                ignition=ignition,
+                moving=moving,
+                updated_at=f"2023-04-29T{10 + minute // 60}:{minute % 60:02}:00Z",
+            )
+        )
+        for minute, ignition, moving, mileage, level in DAY
+    ]
+
+
+def test_detect_trips(day_statuses) -> None:
+    trips = detect_trips("myId", day_statuses, max_gap=3600)
+    assert [(trip.distance, trip.duration, trip.energy_used) for trip in trips] == [
+        (15, 15 * 60, 6),
+        (15, 45 * 60, 4),
+    ]
+    assert trips[0].start.timestamp == day_statuses[1].updated_at.timestamp()
+    assert trips[0].start.latitude == 46.0059
+
+
+def test_incremental_updates(day_statuses) -> None:
+    detector = TripDetector("myId", max_gap=3600)
+    ended = [detector.update(status) for status in day_statuses[:4]]
+    assert ended == [None] * 4
+    assert detector.current.distance == 12
+    # repeated samples are ignored
+    assert detector.update(day_statuses[3]) is None
+    assert detector.update(day_statuses[4]).distance == 15
+    assert detector.current is None
+
+
+def test_gaps_end_the_trip() -> None:
+    detector = TripDetector("myId", max_gap=600)
+    assert detector.add_point(TripPoint(0, 100, 50, 0, 0), True) is None
+    assert detector.add_point(TripPoint(300, 105, 49, 0, 0), True) is None
+    trip = detector.add_point(TripPoint(3600, 150, 40, 0, 0), True)
+    assert (trip.start.timestamp, trip.end.timestamp) == (0, 300)
+    assert detector.current.start.timestamp == 3600
+    assert detector.flush() is None  # too short
+
+
+def test_trips_from_history(day_statuses) -> None:
+    store = HistoryStore()
+    for status in day_statuses:
+        store.append("myId", status)
+    # the history knows only the speed, always zero here, and the mileage
+    trips = trips_from_history("myId", store.query("myId"), max_gap=3600)
+    assert [(trip.distance, trip.energy_used) for trip in trips] == [(15, 6), (15, 4)]
+    assert trips[0].start.timestamp == day_statuses[1].updated_at.timestamp()